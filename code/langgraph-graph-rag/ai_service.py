@@ -5,12 +5,29 @@ def deployable_ai_service(
     embedding_model_id,
     knowledge_graph_description,
     service_manager_service_url,
-    secret_id
+    secret_id,
+    async_mode=False,
 ):
+    """Build the AI service functions.
+
+    With `async_mode=True` the returned `generate` and `generate_stream` are coroutine
+    functions built on `agent.ainvoke` and `agent.astream`, one process can serve many
+    concurrent requests from one event loop.
+
+    With `CONVERSATION_MEMORY=true` the conversation state is kept by the graph
+    checkpointer under the `conversation_id` of the payload, a client sends only the
+    new messages of a turn. A request without a `conversation_id` starts a new
+    conversation, its id is returned in the response body (`generate`) or in the
+    first chunk (`generate_stream`).
+    """
     import urllib
-    from typing import Generator
+    import uuid
+    from typing import AsyncGenerator, Generator
+
+    import time
 
     from langgraph_graph_rag.agent import get_graph_closure
+    from langgraph_graph_rag.instrumentation import record_time_to_first_token
     from ibm_watsonx_ai import APIClient, Credentials
     from langchain_core.messages import (
         BaseMessage,
@@ -21,37 +38,48 @@ def deployable_ai_service(
 
     #########################################
     # Langfuse only for local!
-    # doesn't work in the deployment
+    # doesn't work in the deployment, it is used
+    # with LANGFUSE_TRACING=true only. The per-node
+    # metrics of `langgraph_graph_rag.instrumentation`
+    # are recorded in both cases.
     #########################################
 
-    from langfuse import Langfuse
-    from langfuse.langchain import CallbackHandler
     from dotenv import load_dotenv
     enviornment_path="./.env"
     load_dotenv(dotenv_path= enviornment_path)
     import os
 
-    # 1. Load configuration
-    LANGFUSE_PUBLIC_KEY= os.getenv('LANGFUSE_PUBLIC_KEY')
-    LANGFUSE_SECRET_KEY= os.getenv('LANGFUSE_SECRET_KEY')
-    LANGFUSE_HOST= os.getenv('LANGFUSE_HOST')
-    langfuse = Langfuse(
-        public_key=LANGFUSE_PUBLIC_KEY,
-        secret_key=LANGFUSE_SECRET_KEY,
-        host=LANGFUSE_HOST
-    )
-    # 2. Verify connection
-    from langfuse import get_client
-    langfuse = get_client()
-    if langfuse.auth_check():
-        print("Langfuse client is authenticated and ready!")
-    else:
-        print("Authentication failed. Please check your credentials and host.")
-
-    langfuse_handler = CallbackHandler()
+    callbacks = []
+    if os.getenv('LANGFUSE_TRACING', 'false').lower() == 'true':
+        from langfuse import Langfuse
+        from langfuse.langchain import CallbackHandler
+
+        # 1. Load configuration
+        LANGFUSE_PUBLIC_KEY= os.getenv('LANGFUSE_PUBLIC_KEY')
+        LANGFUSE_SECRET_KEY= os.getenv('LANGFUSE_SECRET_KEY')
+        LANGFUSE_HOST= os.getenv('LANGFUSE_HOST')
+        langfuse = Langfuse(
+            public_key=LANGFUSE_PUBLIC_KEY,
+            secret_key=LANGFUSE_SECRET_KEY,
+            host=LANGFUSE_HOST
+        )
+        # 2. Verify connection
+        from langfuse import get_client
+        langfuse = get_client()
+        if langfuse.auth_check():
+            print("Langfuse client is authenticated and ready!")
+        else:
+            print("Authentication failed. Please check your credentials and host.")
+
+        callbacks.append(CallbackHandler())
     
     #########################################
 
+    # Progress events of the retrieval nodes before the first answer token
+    stream_progress_events = os.getenv('STREAM_PROGRESS_EVENTS', 'true').lower() == 'true'
+    # Checkpointed conversation state, keyed by the conversation id of the payload
+    conversation_memory = os.getenv('CONVERSATION_MEMORY', 'false').lower() == 'true'
+
     hostname = urllib.parse.urlparse(url).hostname or ""
     is_cloud_url = hostname.lower().endswith("cloud.ibm.com")
     instance_id = None if is_cloud_url else "openshift"
@@ -72,6 +100,7 @@ def deployable_ai_service(
         knowledge_graph_description=knowledge_graph_description,
         service_manager_service_url=service_manager_service_url,
         secret_id=secret_id,
+        async_mode=async_mode,
     )
 
     def get_formatted_message(
@@ -144,6 +173,110 @@ def deployable_ai_service(
         else:
             return HumanMessage(content=_dict["content"])
 
+    def prepare_request(context) -> tuple:
+        """Set the request token and select the agent.
+
+        Returns:
+            tuple: The agent, the input messages, the conversation id (None without conversation
+                memory) and the run config with the conversation id as `thread_id`
+        """
+        client.set_token(context.get_token())
+
+        payload = context.get_json()
+        conversation_id, run_config = None, {}
+        if conversation_memory:
+            conversation_id = payload.get("conversation_id") or uuid.uuid4().hex
+            run_config = {"configurable": {"thread_id": conversation_id}}
+        raw_messages = payload.get("messages", [])
+        messages = [convert_dict_to_message(_dict) for _dict in raw_messages]
+
+        if messages and messages[0].type == "system":
+            agent = graph(messages[0])
+            del messages[0]
+        else:
+            agent = graph()
+        return agent, messages, conversation_id, run_config
+
+    def format_response(generated_response: dict, conversation_id: str | None) -> dict:
+        choices = []
+        execute_response = {
+            "headers": {"Content-Type": "application/json"},
+            "body": {"choices": choices},
+        }
+        if conversation_id is not None:
+            execute_response["body"]["conversation_id"] = conversation_id
+
+        choices.append(
+            {
+                "index": 0,
+                "message": get_formatted_message(generated_response["messages"][-1]),
+            }
+        )
+
+        return execute_response
+
+    def token_chunk(content: str, finish_reason: str | None) -> dict:
+        # Built directly, the answer tokens are the hot path of the stream
+        return {
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason,
+                }
+            ]
+        }
+
+    def progress_chunk(node: str, **details) -> dict:
+        return {
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {
+                        "role": "assistant",
+                        "step_details": {"type": "progress", "node": node, **details},
+                    },
+                    "finish_reason": None,
+                }
+            ]
+        }
+
+    def progress_details(update: dict) -> dict:
+        details = {}
+        if "route" in update:
+            details["route"] = update["route"]
+        if "entities" in update:
+            details["entities"] = update["entities"]
+        if "unstructured_data" in update:
+            details["documents"] = len(update["unstructured_data"])
+        return details
+
+    def update_chunks(data: dict, is_assistant: bool) -> list[dict]:
+        """Convert one `updates` chunk: the router tool call and the progress events of the nodes."""
+        chunks = []
+        for node, update in data.items():
+            if not update:
+                continue
+            if node == "agent" and (messages := update.get("messages")):
+                msg_obj = messages[0]
+                if msg_obj.response_metadata.get("finish_reason") != "stop" and (
+                    message := get_formatted_message(msg_obj, is_assistant=is_assistant)
+                ) is not None:
+                    chunks.append(
+                        {
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "delta": message,
+                                    "finish_reason": msg_obj.response_metadata.get("finish_reason"),
+                                }
+                            ]
+                        }
+                    )
+            if stream_progress_events and (details := progress_details(update)):
+                chunks.append(progress_chunk(node, **details))
+        return chunks
+
     def generate(context) -> dict:
         """
         The `generate` function handles the REST call to the inference endpoint
@@ -165,41 +298,19 @@ def deployable_ai_service(
             ]
         }
         Please note that the `system message` MUST be placed first in the list of messages!
+        With conversation memory, an optional "conversation_id" continues a conversation.
         """
 
-        client.set_token(context.get_token())
-
-        payload = context.get_json()
-        raw_messages = payload.get("messages", [])
-        messages = [convert_dict_to_message(_dict) for _dict in raw_messages]
-
-        if messages and messages[0].type == "system":
-            agent = graph(messages[0])
-            del messages[0]
-        else:
-            agent = graph()
+        agent, messages, conversation_id, run_config = prepare_request(context)
 
         # Invoke agent
         # generated_response = agent.invoke({"messages": messages})
 
         ################ Langfuse ##############
-        generated_response = agent.invoke({"messages": messages}, config={"callbacks": [langfuse_handler]})
+        generated_response = agent.invoke({"messages": messages}, config={"callbacks": callbacks, **run_config})
         ####################################
 
-        choices = []
-        execute_response = {
-            "headers": {"Content-Type": "application/json"},
-            "body": {"choices": choices},
-        }
-
-        choices.append(
-            {
-                "index": 0,
-                "message": get_formatted_message(generated_response["messages"][-1]),
-            }
-        )
-
-        return execute_response
+        return format_response(generated_response, conversation_id)
 
     def generate_stream(context) -> Generator[dict, ..., ...]:
         """
@@ -223,58 +334,69 @@ def deployable_ai_service(
         }
         Please note that the `system message` MUST be placed first in the list of messages!
         """
+        start = time.perf_counter()
         headers = context.get_headers()
         is_assistant = headers.get("X-Ai-Interface") == "assistant"
 
-        client.set_token(context.get_token())
-
-        payload = context.get_json()
-        raw_messages = payload.get("messages", [])
-        messages = [convert_dict_to_message(_dict) for _dict in raw_messages]
-
-        if messages and messages[0].type == "system":
-            agent = graph(messages[0])
-            del messages[0]
-        else:
-            agent = graph()
+        agent, messages, conversation_id, run_config = prepare_request(context)
+        if conversation_id is not None:
+            yield progress_chunk("conversation", conversation_id=conversation_id)
 
         response_stream = agent.stream(
-            {"messages": messages}, stream_mode=["updates", "messages"]
+            {"messages": messages}, config=run_config, stream_mode=["updates", "messages"]
         )
 
+        first_token = True
         for chunk_type, data in response_stream:
             if chunk_type == "messages":
-                msg_obj = data[0]
+                # Only the answer tokens of the generate node are sent, the router and the
+                # entity extraction calls are reported by their node updates
+                msg_obj, metadata = data
+                if msg_obj.content and metadata.get("langgraph_node") == "generate":
+                    if first_token:
+                        first_token = False
+                        record_time_to_first_token("generate_stream", time.perf_counter() - start)
+                    yield token_chunk(msg_obj.content, msg_obj.response_metadata.get("finish_reason"))
             elif chunk_type == "updates":
-                if agent := data.get("agent"):
-                    messages = agent.get("messages")
-                    if messages is not None:
-                        msg_obj = messages[0]
-                    else:
-                        continue
-                    if msg_obj.response_metadata.get("finish_reason") == "stop":
-                        continue
-                elif tool := data.get("tools"):
-                    msg_obj = tool["messages"][0]
-                else:
-                    continue
-            else:
-                continue
+                yield from update_chunks(data, is_assistant)
 
-            if (
-                message := get_formatted_message(msg_obj, is_assistant=is_assistant)
-            ) is not None:
-                chunk_response = {
-                    "choices": [
-                        {
-                            "index": 0,
-                            "delta": message,
-                            "finish_reason": msg_obj.response_metadata.get(
-                                "finish_reason"
-                            ),
-                        }
-                    ]
-                }
-                yield chunk_response
+    async def agenerate(context) -> dict:
+        """Async `generate`, the graph runs with `agent.ainvoke` on the event loop of the caller."""
+        agent, messages, conversation_id, run_config = prepare_request(context)
+
+        ################ Langfuse ##############
+        generated_response = await agent.ainvoke({"messages": messages}, config={"callbacks": callbacks, **run_config})
+        ####################################
+
+        return format_response(generated_response, conversation_id)
+
+    async def agenerate_stream(context) -> AsyncGenerator[dict, None]:
+        """Async `generate_stream`, the chunks of `agent.astream` are sent as they arrive."""
+        start = time.perf_counter()
+        headers = context.get_headers()
+        is_assistant = headers.get("X-Ai-Interface") == "assistant"
+
+        agent, messages, conversation_id, run_config = prepare_request(context)
+        if conversation_id is not None:
+            yield progress_chunk("conversation", conversation_id=conversation_id)
+
+        response_stream = agent.astream(
+            {"messages": messages}, config=run_config, stream_mode=["updates", "messages"]
+        )
+
+        first_token = True
+        async for chunk_type, data in response_stream:
+            if chunk_type == "messages":
+                msg_obj, metadata = data
+                if msg_obj.content and metadata.get("langgraph_node") == "generate":
+                    if first_token:
+                        first_token = False
+                        record_time_to_first_token("agenerate_stream", time.perf_counter() - start)
+                    yield token_chunk(msg_obj.content, msg_obj.response_metadata.get("finish_reason"))
+            elif chunk_type == "updates":
+                for chunk_response in update_chunks(data, is_assistant):
+                    yield chunk_response
 
+    if async_mode:
+        return agenerate, agenerate_stream
     return generate, generate_stream
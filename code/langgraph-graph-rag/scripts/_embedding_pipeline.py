@@ -0,0 +1,150 @@
+"""Batched, concurrent embedding of the `Document` nodes for `create_knowledge_graph.py`.
+
+Replaces `Neo4jVector.from_existing_graph`, which embeds the nodes with the default
+batching of the embedding model and writes the vectors back one batch after the
+other. Only nodes without an embedding or whose `text_hash` differs from the hash
+of their text are embedded. Nodes embedded before the hashes were written (no
+`text_hash`) get the hash of their text without being embedded again. The batches are embedded from a thread pool with retry
+and backoff, the vectors are written back with `db.create.setNodeVectorProperty`
+in `UNWIND` transactions. The `vector` and `keyword` indexes are the ones the
+hybrid `Neo4jVector` retriever of the agent reads.
+"""
+
+import hashlib
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from langchain_core.embeddings import Embeddings
+
+DOCUMENTS_TO_EMBED_QUERY = """
+MATCH (d:Document) WHERE d.text IS NOT NULL
+RETURN elementId(d) AS id, d.text AS text, d.text_hash AS text_hash, d.embedding IS NULL AS missing
+"""
+
+WRITE_EMBEDDINGS_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document) WHERE elementId(d) = row.id
+CALL db.create.setNodeVectorProperty(d, 'embedding', row.embedding)
+SET d.text_hash = row.text_hash
+"""
+
+BACKFILL_TEXT_HASH_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document) WHERE elementId(d) = row.id
+SET d.text_hash = row.text_hash
+"""
+
+VECTOR_INDEX_QUERY = """
+CREATE VECTOR INDEX vector IF NOT EXISTS FOR (d:Document) ON d.embedding
+OPTIONS {indexConfig: {`vector.dimensions`: toInteger($dimensions), `vector.similarity_function`: 'cosine'}}
+"""
+
+KEYWORD_INDEX_QUERY = """
+CREATE FULLTEXT INDEX keyword IF NOT EXISTS FOR (d:Document) ON EACH [d.text]
+"""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embedding_text(text: str) -> str:
+    # The text format of `Neo4jVector.from_existing_graph(text_node_properties=["text"])`,
+    # new vectors stay comparable with the vectors it wrote
+    return f"\ntext:{text}"
+
+
+@dataclass
+class EmbeddingStats:
+    documents: int = 0
+    embedded: int = 0
+    backfilled: int = 0
+    batches: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def embeddings_per_second(self) -> float:
+        return self.embedded / self.seconds if self.seconds else 0.0
+
+
+def _embed_batch(embeddings: Embeddings, texts: list[str], max_retries: int, backoff_s: float) -> tuple[list[list[float]], int]:
+    for attempt in range(1, max_retries + 2):
+        try:
+            return embeddings.embed_documents(texts), attempt - 1
+        except Exception as e:
+            if attempt > max_retries:
+                raise
+            delay = backoff_s * 2 ** (attempt - 1) * (1 + random.random())
+            print(f"***Log: - embedding batch attempt {attempt} failed ({e}), retry in {delay:.1f} sec")
+            time.sleep(delay)
+
+
+def embed_documents(
+    neo4j_pool,
+    embeddings: Embeddings,
+    batch_size: int = 32,
+    concurrency: int = 4,
+    max_retries: int = 3,
+    backoff_s: float = 1.0,
+) -> EmbeddingStats:
+    """Embed the new and changed `Document` nodes and create the retriever indexes.
+
+    Args:
+        neo4j_pool (Neo4jConnectionPool): The connection pool of the graph database
+        embeddings (Embeddings): The embedding model
+        batch_size (int): Texts per embedding request and rows per write transaction
+        concurrency (int): Embedding requests in flight at the same time
+        max_retries (int): Retries of a failed batch before the pipeline fails
+        backoff_s (float): Delay before the first retry, doubled for each further retry
+
+    Returns:
+        EmbeddingStats: Documents, embedded documents, backfilled hashes, batches, retries and the time
+    """
+    start = time.time()
+    stats = EmbeddingStats()
+    rows, backfill_rows = [], []
+    for el in neo4j_pool.query(DOCUMENTS_TO_EMBED_QUERY):
+        stats.documents += 1
+        current_hash = text_hash(el["text"])
+        if not el["missing"] and el["text_hash"] is None:
+            # Embedded before the hashes were written, the vector is kept like `from_existing_graph` did
+            backfill_rows.append({"id": el["id"], "text_hash": current_hash})
+        elif el["missing"] or el["text_hash"] != current_hash:
+            rows.append({"id": el["id"], "text": el["text"], "text_hash": current_hash})
+
+    for i in range(0, len(backfill_rows), batch_size):
+        neo4j_pool.query(BACKFILL_TEXT_HASH_QUERY, {"rows": backfill_rows[i:i + batch_size]})
+    stats.backfilled = len(backfill_rows)
+
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+    dimensions = None
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [
+            executor.submit(
+                _embed_batch, embeddings, [embedding_text(row["text"]) for row in batch], max_retries, backoff_s
+            )
+            for batch in batches
+        ]
+        # Vectors are written while the later batches are still embedded
+        with neo4j_pool.session() as session:
+            for batch, future in zip(batches, futures):
+                vectors, retries = future.result()
+                dimensions = dimensions or len(vectors[0])
+                write_rows = [
+                    {"id": row["id"], "text_hash": row["text_hash"], "embedding": vector}
+                    for row, vector in zip(batch, vectors)
+                ]
+                session.execute_write(lambda tx: tx.run(WRITE_EMBEDDINGS_QUERY, rows=write_rows).consume())
+                stats.embedded += len(batch)
+                stats.batches += 1
+                stats.retries += retries
+
+    # The vector index needs the dimensions, it already exists if nothing was embedded
+    if dimensions is not None:
+        neo4j_pool.query(VECTOR_INDEX_QUERY, {"dimensions": dimensions})
+    neo4j_pool.query(KEYWORD_INDEX_QUERY)
+    stats.seconds = time.time() - start
+    return stats
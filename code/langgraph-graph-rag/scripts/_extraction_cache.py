@@ -0,0 +1,125 @@
+"""Content-addressed on-disk cache of the LLM graph extraction results.
+
+A chunk is only sent to the LLM if its text, the model id or the graph transformer
+configuration (prompt, additional instructions, allowed nodes and relationships)
+changed since a previous run. The key is the sha256 of these inputs, the entry is
+the serialized `GraphDocument` in `<cache dir>/<key[:2]>/<key>.json`. The file
+modification time is updated on every hit, so stale entries can be pruned by age:
+
+    python _extraction_cache.py prune --max-age-days 30 [--cache-dir ./output_data/extraction_cache]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_neo4j.graphs.graph_document import GraphDocument
+
+DEFAULT_CACHE_DIR = "./output_data/extraction_cache"
+
+
+class ExtractionCache:
+    """Graph documents of already extracted chunks, keyed by the extraction inputs.
+
+    Args:
+        directory (str | Path): The cache directory
+        model_id (str): The LLM used for the extraction
+        transformer_config (dict): The JSON serializable graph transformer configuration
+    """
+
+    def __init__(self, directory: str | Path, model_id: str, transformer_config: dict) -> None:
+        self.directory = Path(directory)
+        self.model_id = model_id
+        self.transformer_config = transformer_config
+        self._config_digest = hashlib.sha256(
+            json.dumps({"model_id": model_id, "transformer": transformer_config}, sort_keys=True).encode()
+        ).hexdigest()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def key(self, chunk: Document) -> str:
+        return hashlib.sha256(f"{self._config_digest}\n{chunk.page_content}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, chunk: Document) -> GraphDocument | None:
+        """The cached graph document of `chunk`, with `chunk` as its source."""
+        path = self._path(self.key(chunk))
+        try:
+            entry = json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        os.utime(path)
+        with self._lock:
+            self.hits += 1
+        graph_document = GraphDocument.model_validate(entry["graph_document"])
+        # The cached source may come from another file with the same text
+        graph_document.source = chunk
+        return graph_document
+
+    def put(self, chunk: Document, graph_document: GraphDocument) -> None:
+        path = self._path(self.key(chunk))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "model_id": self.model_id,
+            "created_at": time.time(),
+            "graph_document": graph_document.model_dump(),
+        }
+        # Write and rename, a concurrent reader never sees a partial entry
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(entry))
+        tmp_path.replace(path)
+        with self._lock:
+            self.writes += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(1 for _ in self.directory.glob("*/*.json")),
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def prune_extraction_cache(directory: str | Path, max_age_days: float) -> tuple[int, int]:
+    """Delete the entries not used for `max_age_days` days.
+
+    Returns:
+        tuple: The number of deleted and of kept entries
+    """
+    deadline = time.time() - max_age_days * 24 * 3600
+    deleted, kept = 0, 0
+    for path in Path(directory).glob("*/*.json"):
+        if path.stat().st_mtime < deadline:
+            path.unlink()
+            deleted += 1
+        else:
+            kept += 1
+    for path in Path(directory).glob("*/*.tmp"):
+        path.unlink()
+    return deleted, kept
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the graph extraction cache.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prune_parser = subparsers.add_parser("prune", help="Delete entries not used for a number of days.")
+    prune_parser.add_argument("--cache-dir", default=os.environ.get("EXTRACTION_CACHE_DIR", DEFAULT_CACHE_DIR))
+    prune_parser.add_argument("--max-age-days", type=float, default=30)
+    args = parser.parse_args()
+
+    deleted, kept = prune_extraction_cache(args.cache_dir, args.max_age_days)
+    print(f"***Log: pruned extraction cache {args.cache_dir}: {deleted} deleted, {kept} kept")
@@ -0,0 +1,179 @@
+"""Concurrent chunk-to-graph extraction for `create_knowledge_graph.py`.
+
+`LLMGraphTransformer.convert_to_graph_documents` processes the chunks one after
+the other. `extract_graph_documents` sends them to the LLM from a thread pool,
+limited by a request and token rate, and retries failed chunks with exponential
+backoff. Chunks found in the extraction cache are not sent. The graph documents
+are returned in the order of the chunks.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+from langchain_neo4j.graphs.graph_document import GraphDocument
+from langgraph_graph_rag.text_utils import estimate_tokens
+
+from _extraction_cache import ExtractionCache
+
+
+class RateLimiter:
+    """Token bucket limiter for requests per second and LLM tokens per minute.
+
+    Args:
+        requests_per_second (float): Maximum request rate, 0 disables the limit
+        tokens_per_minute (float): Maximum rate of estimated prompt tokens, 0 disables the limit
+    """
+
+    def __init__(self, requests_per_second: float = 0.0, tokens_per_minute: float = 0.0) -> None:
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self.tokens_per_second = tokens_per_minute / 60
+        # The buckets start full: a burst of one second of requests and one minute of tokens
+        self._request_budget = max(requests_per_second, 1.0)
+        self._token_budget = tokens_per_minute
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.wait_time_total = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self.requests_per_second:
+            self._request_budget = min(
+                max(self.requests_per_second, 1.0),
+                self._request_budget + elapsed * self.requests_per_second,
+            )
+        if self.tokens_per_second:
+            self._token_budget = min(
+                self.tokens_per_minute, self._token_budget + elapsed * self.tokens_per_second
+            )
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Block until one request of `tokens` tokens is allowed, return the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                request_wait = 0.0
+                if self.requests_per_second and self._request_budget < 1:
+                    request_wait = (1 - self._request_budget) / self.requests_per_second
+                token_wait = 0.0
+                # A request larger than the bucket only waits for a full bucket
+                needed_tokens = min(tokens, self.tokens_per_minute)
+                if self.tokens_per_second and self._token_budget < needed_tokens:
+                    token_wait = (needed_tokens - self._token_budget) / self.tokens_per_second
+                wait = max(request_wait, token_wait)
+                if wait <= 0:
+                    if self.requests_per_second:
+                        self._request_budget -= 1
+                    if self.tokens_per_second:
+                        self._token_budget -= needed_tokens
+                    self.wait_time_total += waited
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+
+@dataclass
+class ChunkTiming:
+    chunk: int
+    characters: int
+    seconds: float
+    wait_seconds: float
+    attempts: int
+    nodes: int
+    relationships: int
+    cached: bool = False
+
+
+def _extract_chunk(
+    llm_transformer,
+    position: int,
+    chunk: Document,
+    rate_limiter: RateLimiter,
+    max_retries: int,
+    backoff_s: float,
+    cache: ExtractionCache | None,
+) -> tuple[GraphDocument, ChunkTiming]:
+    start = time.time()
+    if cache is not None and (graph_document := cache.get(chunk)) is not None:
+        return graph_document, ChunkTiming(
+            chunk=position + 1,
+            characters=len(chunk.page_content),
+            seconds=time.time() - start,
+            wait_seconds=0.0,
+            attempts=0,
+            nodes=len(graph_document.nodes),
+            relationships=len(graph_document.relationships),
+            cached=True,
+        )
+
+    wait_seconds = 0.0
+    for attempt in range(1, max_retries + 2):
+        wait_seconds += rate_limiter.acquire(estimate_tokens(chunk.page_content))
+        try:
+            graph_document = llm_transformer.process_response(chunk)
+        except Exception as e:
+            if attempt > max_retries:
+                raise
+            # Exponential backoff with jitter, the workers do not retry in lock-step
+            delay = backoff_s * 2 ** (attempt - 1) * (1 + random.random())
+            print(f"***Log: - chunk {position + 1} attempt {attempt} failed ({e}), retry in {delay:.1f} sec")
+            time.sleep(delay)
+            wait_seconds += delay
+            continue
+        if cache is not None:
+            cache.put(chunk, graph_document)
+        timing = ChunkTiming(
+            chunk=position + 1,
+            characters=len(chunk.page_content),
+            seconds=time.time() - start,
+            wait_seconds=wait_seconds,
+            attempts=attempt,
+            nodes=len(graph_document.nodes),
+            relationships=len(graph_document.relationships),
+        )
+        return graph_document, timing
+
+
+def extract_graph_documents(
+    llm_transformer,
+    chunks: list[Document],
+    max_workers: int = 4,
+    requests_per_second: float = 0.0,
+    tokens_per_minute: float = 0.0,
+    max_retries: int = 3,
+    backoff_s: float = 1.0,
+    cache: ExtractionCache | None = None,
+) -> tuple[list[GraphDocument], list[ChunkTiming]]:
+    """Convert the chunks to graph documents concurrently.
+
+    Args:
+        llm_transformer (LLMGraphTransformer): The transformer, `process_response` is called per chunk
+        chunks (list[Document]): The chunks to convert
+        max_workers (int): Number of chunks sent to the LLM at the same time
+        requests_per_second (float): Maximum LLM request rate, 0 disables the limit
+        tokens_per_minute (float): Maximum rate of estimated prompt tokens, 0 disables the limit
+        max_retries (int): Retries of a failed chunk before the extraction fails
+        backoff_s (float): Delay before the first retry, doubled for each further retry
+        cache (ExtractionCache | None): Reuse the graph documents of chunks extracted by a previous run
+
+    Returns:
+        tuple: The graph documents and the timings, both in the order of `chunks`
+    """
+    rate_limiter = RateLimiter(requests_per_second, tokens_per_minute)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [
+            executor.submit(
+                _extract_chunk, llm_transformer, position, chunk, rate_limiter, max_retries, backoff_s, cache
+            )
+            for position, chunk in enumerate(chunks)
+        ]
+        # Collecting the futures in submission order keeps the chunk order
+        results = [future.result() for future in futures]
+    return [graph_document for graph_document, _ in results], [timing for _, timing in results]
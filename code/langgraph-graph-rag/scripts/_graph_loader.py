@@ -0,0 +1,146 @@
+"""Bulk writer of graph documents for `create_knowledge_graph.py`.
+
+`Neo4jGraph.add_graph_documents` sends two queries per graph document. The bulk
+loader writes the same graph (`__Entity__` base label, source `Document` nodes
+with `MENTIONS` edges) with few round-trips: the nodes are grouped by label and
+the relationships by type and endpoint labels, each group is written in `UNWIND` batches of
+`batch_size` rows, one write transaction per batch. The constraint and the
+indexes are created before loading, so every `MERGE` is an index lookup.
+"""
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from hashlib import md5
+
+from langchain_neo4j.graphs.graph_document import GraphDocument
+
+SCHEMA_QUERIES = [
+    "CREATE CONSTRAINT IF NOT EXISTS FOR (b:__Entity__) REQUIRE b.id IS UNIQUE",
+    "CREATE INDEX document_id IF NOT EXISTS FOR (d:Document) ON (d.id)",
+    "CREATE FULLTEXT INDEX entity IF NOT EXISTS FOR (e:__Entity__) ON EACH [e.id]",
+]
+
+DOCUMENTS_QUERY = """
+UNWIND $rows AS row
+MERGE (d:Document {id: row.id})
+SET d.text = row.text
+SET d += row.metadata
+"""
+
+ENTITIES_QUERY = """
+UNWIND $rows AS row
+MERGE (e:__Entity__ {{id: row.id}})
+SET e:`{label}`
+SET e += row.properties
+"""
+
+MENTIONS_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document {id: row.document})
+MATCH (e:__Entity__ {id: row.entity})
+MERGE (d)-[:MENTIONS]->(e)
+"""
+
+# The endpoints get their type label also if they are not among the nodes of the
+# document, the properties are set on every load, so a reload updates them
+RELATIONSHIPS_QUERY = """
+UNWIND $rows AS row
+MERGE (source:__Entity__ {{id: row.source}})
+SET source:`{source_label}`
+MERGE (target:__Entity__ {{id: row.target}})
+SET target:`{target_label}`
+MERGE (source)-[r:`{type}`]->(target)
+SET r += row.properties
+"""
+
+
+def _remove_backticks(text: str) -> str:
+    return text.replace("`", "")
+
+
+@dataclass
+class LoadStats:
+    documents: int = 0
+    nodes: int = 0
+    mentions: int = 0
+    relationships: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def nodes_per_second(self) -> float:
+        return (self.documents + self.nodes) / self.seconds if self.seconds else 0.0
+
+    @property
+    def relationships_per_second(self) -> float:
+        return (self.mentions + self.relationships) / self.seconds if self.seconds else 0.0
+
+
+def _write_batches(neo4j_pool, query: str, rows: list[dict], batch_size: int, stats: LoadStats) -> None:
+    with neo4j_pool.session() as session:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            session.execute_write(lambda tx: tx.run(query, rows=batch).consume())
+            stats.batches += 1
+
+
+def load_graph_documents(
+    neo4j_pool, graph_documents: list[GraphDocument], batch_size: int = 1000
+) -> LoadStats:
+    """Write graph documents like `add_graph_documents(baseEntityLabel=True, include_source=True)`.
+
+    Args:
+        neo4j_pool (Neo4jConnectionPool): The connection pool of the target database
+        graph_documents (list[GraphDocument]): The extracted graph documents, each with a source
+        batch_size (int): Rows per `UNWIND` query and write transaction
+
+    Returns:
+        LoadStats: Written documents, nodes and relationships, batches and the load time
+    """
+    start = time.time()
+    stats = LoadStats()
+    for query in SCHEMA_QUERIES:
+        neo4j_pool.query(query)
+
+    documents: dict[str, dict] = {}
+    entities: dict[str, dict[str, dict]] = defaultdict(dict)
+    mentions: dict[tuple[str, str], dict] = {}
+    relationships: dict[tuple[str, str, str], dict[tuple[str, str], dict]] = defaultdict(dict)
+    for graph_document in graph_documents:
+        source = graph_document.source
+        if source is None:
+            raise TypeError("The bulk loader stores the sources, but at least one document has no `source`.")
+        if not source.metadata.get("id"):
+            source.metadata["id"] = md5(source.page_content.encode("utf-8")).hexdigest()
+        document_id = source.metadata["id"]
+        documents[document_id] = {"id": document_id, "text": source.page_content, "metadata": source.metadata}
+
+        for node in graph_document.nodes:
+            label = _remove_backticks(node.type)
+            row = entities[label].setdefault(node.id, {"id": node.id, "properties": {}})
+            row["properties"].update(node.properties)
+            mentions[(document_id, node.id)] = {"document": document_id, "entity": node.id}
+        for relationship in graph_document.relationships:
+            rel_type = _remove_backticks(relationship.type.replace(" ", "_").upper())
+            group = (rel_type, _remove_backticks(relationship.source.type), _remove_backticks(relationship.target.type))
+            key = (relationship.source.id, relationship.target.id)
+            row = relationships[group].setdefault(
+                key, {"source": key[0], "target": key[1], "properties": {}}
+            )
+            row["properties"].update(relationship.properties)
+
+    _write_batches(neo4j_pool, DOCUMENTS_QUERY, list(documents.values()), batch_size, stats)
+    stats.documents = len(documents)
+    for label, rows in entities.items():
+        _write_batches(neo4j_pool, ENTITIES_QUERY.format(label=label), list(rows.values()), batch_size, stats)
+        stats.nodes += len(rows)
+    _write_batches(neo4j_pool, MENTIONS_QUERY, list(mentions.values()), batch_size, stats)
+    stats.mentions = len(mentions)
+    for (rel_type, source_label, target_label), rows in relationships.items():
+        query = RELATIONSHIPS_QUERY.format(type=rel_type, source_label=source_label, target_label=target_label)
+        _write_batches(neo4j_pool, query, list(rows.values()), batch_size, stats)
+        stats.relationships += len(rows)
+
+    stats.seconds = time.time() - start
+    return stats
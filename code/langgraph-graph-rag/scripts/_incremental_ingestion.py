@@ -0,0 +1,91 @@
+"""Incremental re-ingestion for `create_knowledge_graph.py`.
+
+`Neo4jGraph.add_graph_documents(include_source=True)` merges a `Document` node per
+chunk with the md5 hash of the chunk text as `id`. The chunks of a new run are
+diffed against the `Document` ids stored for the same sources: only new chunks are
+extracted and written, the `Document` nodes of removed chunks are deleted together
+with their `MENTIONS` edges and those of their entities no other document mentions
+anymore; entities the removed chunks did not mention are never deleted.
+The embedding stage only embeds `Document` nodes without an embedding or with a
+changed text, so only the new chunks are embedded.
+"""
+
+from dataclasses import dataclass, field
+from hashlib import md5
+
+from langchain_core.documents import Document
+
+STORED_DOCUMENT_IDS_QUERY = """
+MATCH (d:Document) WHERE d.source IN $sources
+RETURN d.id AS id
+"""
+
+MENTIONED_ENTITY_IDS_QUERY = """
+MATCH (d:Document)-[:MENTIONS]->(e:__Entity__) WHERE d.id IN $ids
+RETURN DISTINCT e.id AS id
+"""
+
+DELETE_DOCUMENTS_QUERY = """
+MATCH (d:Document) WHERE d.id IN $ids
+DETACH DELETE d
+RETURN count(*) AS deleted
+"""
+
+# Entities of the deleted documents that lost their last mention, including their relationships
+DELETE_ORPHANED_ENTITIES_QUERY = """
+UNWIND $entity_ids AS id
+MATCH (e:__Entity__ {id: id}) WHERE NOT (e)<-[:MENTIONS]-(:Document)
+DETACH DELETE e
+RETURN count(*) AS deleted
+"""
+
+
+def document_id(chunk: Document) -> str:
+    """The `Document` node id `add_graph_documents` uses for a chunk."""
+    return chunk.metadata.get("id") or md5(chunk.page_content.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ChunkDiff:
+    new_chunks: list[Document] = field(default_factory=list)
+    unchanged_ids: list[str] = field(default_factory=list)
+    removed_ids: list[str] = field(default_factory=list)
+
+
+def diff_chunks(neo4j_pool, chunks: list[Document]) -> ChunkDiff:
+    """Compare the chunks with the `Document` nodes stored for their sources."""
+    sources = sorted({chunk.metadata.get("source") for chunk in chunks if chunk.metadata.get("source")})
+    stored_ids = {el["id"] for el in neo4j_pool.query(STORED_DOCUMENT_IDS_QUERY, {"sources": sources})}
+
+    diff = ChunkDiff()
+    chunk_ids = set()
+    for chunk in chunks:
+        chunk_id = document_id(chunk)
+        if chunk_id in chunk_ids:
+            continue
+        chunk_ids.add(chunk_id)
+        if chunk_id in stored_ids:
+            diff.unchanged_ids.append(chunk_id)
+        else:
+            diff.new_chunks.append(chunk)
+    diff.removed_ids = sorted(stored_ids - chunk_ids)
+    return diff
+
+
+def delete_removed_documents(neo4j_pool, removed_ids: list[str]) -> tuple[int, int]:
+    """Delete the `Document` nodes of removed chunks and their entities left without a mention.
+
+    Returns:
+        tuple: The number of deleted documents and of deleted entities
+    """
+    if not removed_ids:
+        return 0, 0
+    # Collected before the delete, the MENTIONS edges are removed with the documents
+    entity_ids = [el["id"] for el in neo4j_pool.query(MENTIONED_ENTITY_IDS_QUERY, {"ids": removed_ids})]
+    deleted_documents = neo4j_pool.query(DELETE_DOCUMENTS_QUERY, {"ids": removed_ids})[0]["deleted"]
+    deleted_entities = 0
+    if entity_ids:
+        deleted_entities = neo4j_pool.query(
+            DELETE_ORPHANED_ENTITIES_QUERY, {"entity_ids": entity_ids}
+        )[0]["deleted"]
+    return deleted_documents, deleted_entities
@@ -16,6 +16,8 @@ class InteractiveChat:
             f"\t{i}) {k}" for i, k in enumerate(seq_, 1)
         )
         self._delta_start = False
+        # Sent with the next question when the service keeps the conversation (CONVERSATION_MEMORY)
+        self.conversation_id = None
         self.verbose = verbose
         self.stream = stream
 
@@ -54,6 +56,14 @@ class InteractiveChat:
 
     def _print_message(self, choice: dict) -> None:
         if delta := choice.get("delta"):
+            if (step_details := delta.get("step_details")) and step_details.get("type") == "progress":
+                if "conversation_id" in step_details:
+                    self.conversation_id = step_details["conversation_id"]
+                details = ", ".join(
+                    f"{key}: {value}" for key, value in step_details.items() if key not in ("type", "node")
+                )
+                print(f"\n [{step_details['node']}] {details}", flush=True)
+                return
             if not self._delta_start:
                 header = f" {delta['role'].capitalize()} Message ".center(80, "=")
                 print("\n", header)
@@ -107,6 +117,8 @@ class InteractiveChat:
                         request_payload_json = {
                             "messages": [{"role": "user", **user_message}]
                         }
+                        if self.conversation_id is not None:
+                            request_payload_json["conversation_id"] = self.conversation_id
 
                         resp = self.ai_service_invoke(request_payload_json)
 
@@ -118,7 +130,9 @@ class InteractiveChat:
                                     self._print_message(c)
                             self._delta_start = False
                         else:
-                            resp_choices = resp.get("body", resp)["choices"]
+                            body = resp.get("body", resp)
+                            self.conversation_id = body.get("conversation_id", self.conversation_id)
+                            resp_choices = body["choices"]
                             choices = (
                                 resp_choices if self.verbose else resp_choices[-1:]
                             )
@@ -0,0 +1,513 @@
+"""Local stand-ins for watsonx.ai and Neo4j, used by the benchmark scripts.
+
+The stand-ins have configurable latencies, so that the request path of the agent
+graph can be measured without a watsonx.ai instance or a Neo4j container.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+FIXTURE_GRAPH = Path(__file__).parent / "benchmark_fixtures" / "galaxium_graph.json"
+
+
+def load_fixture_graph(path: Path = FIXTURE_GRAPH) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+def _sleep(seconds: float) -> None:
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+async def _asleep(seconds: float) -> None:
+    if seconds > 0:
+        await asyncio.sleep(seconds)
+
+
+def _edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance, stops early once `max_distance` is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model stand-in for `ChatWatsonx`.
+
+    Answers the `Router` and `Entities` tool calls of the agent graph and streams a
+    canned answer otherwise.
+    """
+
+    entity_ids: list[str] = []
+    latency_s: float = 0.0
+    tokens_per_s: float = 0.0
+    answer: str = (
+        "Galaxium Travels is a luxury space travel company founded in 2025, "
+        "headquartered at Spaceport Alpha in the Mojave Desert."
+    )
+    disable_streaming: bool | str = "tool_calling"
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat-model"
+
+    def bind_tools(self, tools: list, tool_choice: Any = None, **kwargs: Any):
+        formatted_tools = [convert_to_openai_tool(tool) for tool in tools]
+        return super().bind(tools=formatted_tools, tool_choice=tool_choice, **kwargs)
+
+    def _tool_call_args(self, tool_name: str, text: str) -> dict:
+        lowered = text.lower()
+        if tool_name == "Router":
+            known = ("galaxium", "mission", "vision", "ceo", "relation", "company")
+            route = (
+                "graph_knowledge_base"
+                if any(word in lowered for word in known)
+                else "final_answer"
+            )
+            return {"route": route}
+        if tool_name == "Entities":
+            names = [entity for entity in self.entity_ids if entity.lower() in lowered]
+            return {"names": names or ["Galaxium Travels"]}
+        return {}
+
+    def _build_message(self, messages: list[BaseMessage], **kwargs: Any) -> AIMessage:
+        text = " ".join(str(message.content) for message in messages)
+        if tools := kwargs.get("tools"):
+            tool_name = tools[0]["function"]["name"]
+            args = self._tool_call_args(tool_name, text)
+            call_id = f"call_{uuid.uuid4().hex[:12]}"
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": tool_name, "args": args, "id": call_id}],
+                additional_kwargs={
+                    "tool_calls": [
+                        {
+                            "id": call_id,
+                            "type": "function",
+                            "function": {"name": tool_name, "arguments": json.dumps(args)},
+                        }
+                    ]
+                },
+                response_metadata={"finish_reason": "tool_calls"},
+                usage_metadata={
+                    "input_tokens": len(text) // 4,
+                    "output_tokens": 10,
+                    "total_tokens": len(text) // 4 + 10,
+                },
+            )
+        return AIMessage(
+            content=self.answer,
+            response_metadata={"finish_reason": "stop"},
+            usage_metadata={
+                "input_tokens": len(text) // 4,
+                "output_tokens": len(self.answer.split()),
+                "total_tokens": len(text) // 4 + len(self.answer.split()),
+            },
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._build_message(messages, **kwargs)
+        _sleep(self.latency_s)
+        if not message.tool_calls and self.tokens_per_s > 0:
+            _sleep(len(message.content.split()) / self.tokens_per_s)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message = self._build_message(messages, **kwargs)
+        _sleep(self.latency_s)
+        for delay, chunk in self._stream_chunks(message):
+            _sleep(delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _stream_chunks(self, message: AIMessage) -> Iterator[tuple[float, ChatGenerationChunk]]:
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield (
+                1 / self.tokens_per_s if self.tokens_per_s > 0 else 0.0,
+                ChatGenerationChunk(
+                    message=AIMessageChunk(
+                        content=word if last else f"{word} ",
+                        response_metadata={"finish_reason": "stop"} if last else {},
+                    )
+                ),
+            )
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._build_message(messages, **kwargs)
+        await _asleep(self.latency_s)
+        if not message.tool_calls and self.tokens_per_s > 0:
+            await _asleep(len(message.content.split()) / self.tokens_per_s)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._build_message(messages, **kwargs)
+        await _asleep(self.latency_s)
+        for delay, chunk in self._stream_chunks(message):
+            await _asleep(delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class StubEmbeddings(Embeddings):
+    """Embedding stand-in for `WatsonxEmbeddings`, returns deterministic vectors."""
+
+    def __init__(self, dimensions: int = 64, latency_s: float = 0.0, **kwargs: Any) -> None:
+        self.dimensions = dimensions
+        self.latency_s = latency_s
+        self.model_id = kwargs.get("model_id", "stub-embedding-model")
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[digest[0] % self.dimensions] += 1.0
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        _sleep(self.latency_s)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        _sleep(self.latency_s)
+        return self._embed(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        await _asleep(self.latency_s)
+        return self._embed(text)
+
+
+class StubNeo4jGraph:
+    """In-memory stand-in for `Neo4jGraph`, seeded from a fixture graph.
+
+    Only the Cypher statements issued by `GraphNodes` are understood; they are
+    recognized by their parameters and emulated in Python.
+    """
+
+    def __init__(
+        self,
+        fixture: dict | None = None,
+        latency_s: float = 0.0,
+        setup_latency_s: float = 0.0,
+        **kwargs: Any,
+    ) -> None:
+        _sleep(setup_latency_s)
+        self.fixture = fixture or load_fixture_graph()
+        self.latency_s = latency_s
+        self.entity_ids = [entity["id"] for entity in self.fixture["entities"]]
+        self.relationships = [tuple(rel) for rel in self.fixture["relationships"]]
+        self.version = self.fixture.get("version", "fixture")
+        self.query_count = 0
+
+    def _fulltext_entities(self, full_text_query: str, limit: int = 2) -> list[str]:
+        """Emulates `db.index.fulltext.queryNodes('entity', ...)` for `word~2 AND ...` queries."""
+        words = [
+            word.removesuffix("~2").lower()
+            for word in full_text_query.split()
+            if word != "AND"
+        ]
+        matches = []
+        for entity_id in self.entity_ids:
+            tokens = re.findall(r"\w+", entity_id.lower())
+            distances = [
+                min(_edit_distance(word, token, 2) for token in tokens) for word in words
+            ]
+            if distances and max(distances) <= 2:
+                matches.append((sum(distances), entity_id))
+        return [entity_id for _, entity_id in sorted(matches)[:limit]]
+
+    def _neighbors(self, entity_id: str) -> list[str]:
+        return [
+            f"{source} - {rel_type} -> {target}"
+            for source, rel_type, target in self.relationships
+            if entity_id in (source, target)
+        ]
+
+    def _entity_outputs(self, full_text_query: str) -> list[str]:
+        outputs = []
+        for entity_id in self._fulltext_entities(full_text_query):
+            outputs.extend(self._neighbors(entity_id))
+        return outputs
+
+    def query(self, query: str, params: dict = {}, session_params: dict = {}) -> list[dict]:
+        _sleep(self.latency_s)
+        self.query_count += 1
+        if "__GraphVersion__" in query:
+            return [{"version": params.get("version", self.version)}]
+        if "entities" in params:
+            return [
+                {
+                    "entity": entity["entity"],
+                    "outputs": list(
+                        dict.fromkeys(
+                            output for entity_id in entity["ids"] for output in self._neighbors(entity_id)
+                        )
+                    )[:20],
+                }
+                for entity in params["entities"]
+            ]
+        if "AS source" in query:
+            return [
+                {"source": source, "type": rel_type, "target": target}
+                for source, rel_type, target in self.relationships
+            ]
+        if "RETURN e.id AS id" in query:
+            return [{"id": entity_id} for entity_id in self.entity_ids]
+        if "queries" in params:
+            return [
+                {
+                    "entity": entity_query["entity"],
+                    "outputs": list(dict.fromkeys(self._entity_outputs(entity_query["query"])))[:20],
+                }
+                for entity_query in params["queries"]
+            ]
+        if "query" in params:
+            return [{"output": output} for output in self._entity_outputs(params["query"])[:20]]
+        return []
+
+    def close(self) -> None:
+        return
+
+
+class _StubAsyncResult:
+    def __init__(self, records: list[dict]) -> None:
+        self.records = records
+
+    async def data(self) -> list[dict]:
+        return self.records
+
+
+class _StubAsyncSession:
+    def __init__(self, driver: "StubAsyncDriver") -> None:
+        self.driver = driver
+
+    async def __aenter__(self) -> "_StubAsyncSession":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        return None
+
+    async def run(self, query: str, params: dict | None = None) -> _StubAsyncResult:
+        await _asleep(self.driver.latency_s)
+        return _StubAsyncResult(self.driver.graph.query(query, params or {}))
+
+
+class StubAsyncDriver:
+    """Stand-in for `neo4j.AsyncDriver`, the queries are answered by a `StubNeo4jGraph`."""
+
+    def __init__(self, fixture: dict | None = None, latency_s: float = 0.0) -> None:
+        self.graph = StubNeo4jGraph(fixture=fixture)
+        self.latency_s = latency_s
+
+    def session(self, **kwargs: Any) -> _StubAsyncSession:
+        return _StubAsyncSession(self)
+
+    async def close(self) -> None:
+        return
+
+
+class StubNeo4jVector:
+    """Stand-in for the hybrid `Neo4jVector` index over the fixture `Document` nodes."""
+
+    def __init__(self, graph: StubNeo4jGraph, embedding: Embeddings, latency_s: float = 0.0) -> None:
+        self.graph = graph
+        self.embedding = embedding
+        self.latency_s = latency_s
+        self.documents = [document["text"] for document in graph.fixture["documents"]]
+        self.vectors = embedding.embed_documents(self.documents)
+
+    @classmethod
+    def from_existing_index(
+        cls, embedding: Embeddings, graph: StubNeo4jGraph, latency_s: float = 0.0, **kwargs: Any
+    ) -> "StubNeo4jVector":
+        return cls(graph=graph, embedding=embedding, latency_s=latency_s)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        query_vector = self.embedding.embed_query(query)
+        _sleep(self.latency_s)
+        scored = sorted(
+            zip(self.vectors, self.documents),
+            key=lambda item: -sum(a * b for a, b in zip(item[0], query_vector)),
+        )
+        return [Document(page_content=text) for _, text in scored[:k]]
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        query_vector = await self.embedding.aembed_query(query)
+        await _asleep(self.latency_s)
+        scored = sorted(
+            zip(self.vectors, self.documents),
+            key=lambda item: -sum(a * b for a, b in zip(item[0], query_vector)),
+        )
+        return [Document(page_content=text) for _, text in scored[:k]]
+
+
+class StubAPIClient:
+    """Stand-in for the `ibm_watsonx_ai.APIClient` created by `deployable_ai_service`."""
+
+    def __init__(self, credentials: Any = None, space_id: str | None = None, **kwargs: Any) -> None:
+        self.credentials = credentials
+        self.space_id = space_id
+        self.token = None
+
+    def set_token(self, token: str) -> None:
+        self.token = token
+
+
+class StubCredentials:
+    def __init__(self, **kwargs: Any) -> None:
+        self.__dict__.update(kwargs)
+
+
+class StubRuntimeContext:
+    """Stand-in for the `RuntimeContext` of a deployed AI service request.
+
+    Args:
+        payload (dict | None): The request JSON, `{"messages": [...]}`
+        headers (dict | None): The request headers, e.g. `{"X-Ai-Interface": "assistant"}`
+    """
+
+    def __init__(self, payload: dict | None = None, headers: dict | None = None) -> None:
+        self.payload = payload or {}
+        self.headers = headers or {}
+
+    def generate_token(self) -> str:
+        return "stub-token"
+
+    def get_token(self) -> str:
+        return "stub-token"
+
+    def get_space_id(self) -> str:
+        return "stub-space"
+
+    def get_json(self) -> dict:
+        return self.payload
+
+    def get_headers(self) -> dict:
+        return self.headers
+
+
+def install_stub_ai_service_client() -> None:
+    """Replace the `ibm_watsonx_ai` client classes `deployable_ai_service` imports with stand-ins."""
+    import ibm_watsonx_ai
+
+    ibm_watsonx_ai.APIClient = StubAPIClient
+    ibm_watsonx_ai.Credentials = StubCredentials
+
+
+def install_stub_backends(
+    llm_latency_s: float = 0.0,
+    tokens_per_s: float = 0.0,
+    embedding_latency_s: float = 0.0,
+    neo4j_latency_s: float = 0.0,
+    setup_latency_s: float = 0.0,
+    fixture: dict | None = None,
+) -> None:
+    """Replace the watsonx.ai and Neo4j classes used by `langgraph_graph_rag.nodes` with stand-ins.
+
+    `setup_latency_s` is paid for every client that is created, it simulates the
+    connection setup (token exchange, TLS handshake, index lookup) of the real backends.
+    """
+    fixture = fixture or load_fixture_graph()
+    entity_ids = [entity["id"] for entity in fixture["entities"]]
+
+    os.environ.setdefault("NEO4J_URI", "bolt://stub:7687")
+    os.environ.setdefault("NEO4J_USERNAME", "neo4j")
+    os.environ.setdefault("NEO4J_PASSWORD", "stub")
+    os.environ.setdefault("NEO4J_DATABASE", "neo4j")
+    os.environ.setdefault("FILENAME_AGENT_LOG_OUTPUT", tempfile.mkdtemp(prefix="agent_log_"))
+
+    from langgraph_graph_rag import neo4j_pool, nodes
+
+    def chat_model(**kwargs: Any) -> StubChatModel:
+        _sleep(setup_latency_s)
+        return StubChatModel(
+            entity_ids=entity_ids,
+            latency_s=llm_latency_s,
+            tokens_per_s=tokens_per_s,
+            callbacks=kwargs.get("callbacks"),
+        )
+
+    def embeddings(**kwargs: Any) -> StubEmbeddings:
+        _sleep(setup_latency_s)
+        return StubEmbeddings(latency_s=embedding_latency_s, **kwargs)
+
+    def neo4j_graph(**kwargs: Any) -> StubNeo4jGraph:
+        return StubNeo4jGraph(
+            fixture=fixture, latency_s=neo4j_latency_s, setup_latency_s=setup_latency_s
+        )
+
+    class neo4j_vector(StubNeo4jVector):
+        @classmethod
+        def from_existing_index(cls, embedding: Embeddings, graph: StubNeo4jGraph, **kwargs: Any):
+            _sleep(setup_latency_s)
+            return StubNeo4jVector(graph=graph, embedding=embedding, latency_s=neo4j_latency_s)
+
+    class async_graph_database:
+        @staticmethod
+        def driver(url: str, **kwargs: Any) -> StubAsyncDriver:
+            return StubAsyncDriver(fixture=fixture, latency_s=neo4j_latency_s)
+
+    neo4j_pool.close_neo4j_pool()
+    neo4j_pool.Neo4jGraph = neo4j_graph
+    neo4j_pool.AsyncGraphDatabase = async_graph_database
+    nodes.ChatWatsonx = chat_model
+    nodes.WatsonxEmbeddings = embeddings
+    nodes.Neo4jVector = neo4j_vector
@@ -0,0 +1,253 @@
+"""Offline end-to-end benchmark of the AI service functions of `ai_service.py`.
+
+Drives `generate` and `generate_stream` of `deployable_ai_service` with
+concurrent requests. The watsonx.ai client, the chat and embedding models and
+Neo4j are replaced with the stand-ins from `scripts/_stub_backends.py`, with
+configurable latencies and token rate; the Neo4j stand-in is seeded from a fixture
+graph. Reports the p50/p95/p99 latency, the time to first token (TTFT, the first
+streamed chunk with answer text), the time to the first streamed chunk of any kind
+(e.g. a progress event) and the requests per second, and saves the
+results as JSON. A saved result passed with `--baseline` is compared against.
+
+Run from the project root:
+    poetry run python -m scripts.benchmark_ai_service --requests 50 --concurrency 8
+    poetry run python -m scripts.benchmark_ai_service --async --baseline ./scripts/output_data/benchmark_ai_service_<timestamp>.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from scripts._stub_backends import (
+    FIXTURE_GRAPH,
+    StubRuntimeContext,
+    install_stub_ai_service_client,
+    install_stub_backends,
+    load_fixture_graph,
+)
+
+QUESTIONS = (
+    "Which relations does the Galaxium Travels company have?",
+    "Who is the CEO of Galaxium Travels?",
+    "What is the mission of Galaxium Travels?",
+    "Hi! How are you?",
+)
+
+SYSTEM_MESSAGE = {"role": "system", "content": "You are a benchmark assistant."}
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Percentile with linear interpolation between the closest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "max_ms": max(values) * 1000 if values else 0.0,
+    }
+
+
+def request_context(number: int) -> StubRuntimeContext:
+    payload = {
+        "messages": [
+            SYSTEM_MESSAGE,
+            {"role": "user", "content": QUESTIONS[number % len(QUESTIONS)]},
+        ]
+    }
+    return StubRuntimeContext(payload=payload)
+
+
+def is_first_token(chunk: dict) -> bool:
+    delta = chunk["choices"][0]["delta"]
+    return delta.get("role") == "assistant" and bool(delta.get("content"))
+
+
+def run_generate(generate, number: int) -> tuple[float, float, float]:
+    start = time.perf_counter()
+    generate(request_context(number))
+    latency = time.perf_counter() - start
+    # Without streaming the first token arrives with the response
+    return latency, latency, latency
+
+
+def run_generate_stream(generate_stream, number: int) -> tuple[float, float | None, float | None]:
+    start = time.perf_counter()
+    ttft, first_event = None, None
+    for chunk in generate_stream(request_context(number)):
+        if first_event is None:
+            first_event = time.perf_counter() - start
+        if ttft is None and is_first_token(chunk):
+            ttft = time.perf_counter() - start
+    return time.perf_counter() - start, ttft, first_event
+
+
+async def arun_generate(agenerate, number: int) -> tuple[float, float, float]:
+    start = time.perf_counter()
+    await agenerate(request_context(number))
+    latency = time.perf_counter() - start
+    return latency, latency, latency
+
+
+async def arun_generate_stream(agenerate_stream, number: int) -> tuple[float, float | None, float | None]:
+    start = time.perf_counter()
+    ttft, first_event = None, None
+    async for chunk in agenerate_stream(request_context(number)):
+        if first_event is None:
+            first_event = time.perf_counter() - start
+        if ttft is None and is_first_token(chunk):
+            ttft = time.perf_counter() - start
+    return time.perf_counter() - start, ttft, first_event
+
+
+def run_sync(function, run_request, requests: int, concurrency: int) -> tuple[list, float]:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda number: run_request(function, number), range(requests)))
+    return results, time.perf_counter() - start
+
+
+def run_async(function, run_request, requests: int, concurrency: int) -> tuple[list, float]:
+    from langgraph_graph_rag.neo4j_pool import aclose_neo4j_async_driver
+
+    async def run_all() -> list:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def bounded(number: int):
+            async with slots:
+                return await run_request(function, number)
+
+        try:
+            return await asyncio.gather(*(bounded(number) for number in range(requests)))
+        finally:
+            # Every run has its own event loop, its async Neo4j driver is closed with it
+            await aclose_neo4j_async_driver()
+
+    start = time.perf_counter()
+    results = asyncio.run(run_all())
+    return results, time.perf_counter() - start
+
+
+def compare(results: dict, baseline: dict) -> None:
+    print(f"\nComparison with the baseline of {baseline.get('timestamp')}:\n")
+    print("| mode | metric | baseline | current | change |")
+    print("| --- | --- | --- | --- | --- |")
+    for mode, current in results["modes"].items():
+        previous = baseline.get("modes", {}).get(mode)
+        if previous is None:
+            continue
+        rows = [("requests_per_second", previous["requests_per_second"], current["requests_per_second"])]
+        for group in ("latency", "ttft", "first_event"):
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                if group in previous:
+                    rows.append((f"{group} {key}", previous[group][key], current[group][key]))
+        for metric, before, after in rows:
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"| {mode} | {metric} | {before:.1f} | {after:.1f} | {change:+.1f}% |")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40, help="measured requests per mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at the same time")
+    parser.add_argument("--warmup", type=int, default=2, help="requests before the measurement, they build the graph")
+    parser.add_argument("--mode", choices=("generate", "generate_stream", "both"), default="both")
+    parser.add_argument("--async", dest="async_mode", action="store_true", help="use the async service functions")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per LLM call before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="streamed answer tokens per second")
+    parser.add_argument("--embedding-latency", type=float, default=0.01, help="seconds per embedding call")
+    parser.add_argument("--neo4j-latency", type=float, default=0.005, help="seconds per Neo4j query")
+    parser.add_argument("--fixture", default=str(FIXTURE_GRAPH), help="fixture graph of the Neo4j stand-in")
+    parser.add_argument("--output", default=None, help="JSON result file, default ./scripts/output_data/benchmark_ai_service_<timestamp>.json")
+    parser.add_argument("--baseline", default=None, help="JSON result of an earlier run to compare against")
+    args = parser.parse_args()
+
+    install_stub_backends(
+        llm_latency_s=args.llm_latency,
+        tokens_per_s=args.tokens_per_second,
+        embedding_latency_s=args.embedding_latency,
+        neo4j_latency_s=args.neo4j_latency,
+        fixture=load_fixture_graph(Path(args.fixture)),
+    )
+    install_stub_ai_service_client()
+    from ai_service import deployable_ai_service
+    from langgraph_graph_rag.instrumentation import get_metrics_registry
+
+    generate, generate_stream = deployable_ai_service(
+        context=StubRuntimeContext(),
+        url="https://stub.ml.cloud.ibm.com",
+        model_id="stub-model",
+        embedding_model_id="stub-embedding-model",
+        knowledge_graph_description="Galaxium Travels company overview",
+        service_manager_service_url="",
+        secret_id="",
+        async_mode=args.async_mode,
+    )
+    modes = ("generate", "generate_stream") if args.mode == "both" else (args.mode,)
+    functions = {"generate": generate, "generate_stream": generate_stream}
+    if args.async_mode:
+        runner = run_async
+        requests = {"generate": arun_generate, "generate_stream": arun_generate_stream}
+    else:
+        runner = run_sync
+        requests = {"generate": run_generate, "generate_stream": run_generate_stream}
+
+    results = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "modes": {},
+    }
+    for mode in modes:
+        runner(functions[mode], requests[mode], args.warmup, 1)
+        measured, seconds = runner(functions[mode], requests[mode], args.requests, args.concurrency)
+        latencies = [latency for latency, _, _ in measured]
+        ttfts = [ttft for _, ttft, _ in measured if ttft is not None]
+        first_events = [first_event for _, _, first_event in measured if first_event is not None]
+        results["modes"][mode] = {
+            "requests": args.requests,
+            "seconds": seconds,
+            "requests_per_second": args.requests / seconds if seconds else 0.0,
+            "latency": summarize(latencies),
+            "ttft": summarize(ttfts),
+            "first_event": summarize(first_events),
+        }
+    results["node_metrics"] = get_metrics_registry().summary()
+    results["time_to_first_token_metric"] = get_metrics_registry().time_to_first_token_summary()
+
+    print("| mode | requests/s | latency p50 / p95 / p99 in ms | TTFT p50 / p95 / p99 in ms | first event p50 in ms |")
+    print("| --- | --- | --- | --- | --- |")
+    for mode, result in results["modes"].items():
+        latency, ttft = result["latency"], result["ttft"]
+        print(
+            f"| {mode} | {result['requests_per_second']:.1f} "
+            f"| {latency['p50_ms']:.1f} / {latency['p95_ms']:.1f} / {latency['p99_ms']:.1f} "
+            f"| {ttft['p50_ms']:.1f} / {ttft['p95_ms']:.1f} / {ttft['p99_ms']:.1f} "
+            f"| {result['first_event']['p50_ms']:.1f} |"
+        )
+
+    output = Path(args.output or f"./scripts/output_data/benchmark_ai_service_{results['timestamp']}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\n***Log: results saved to {output}")
+
+    if args.baseline:
+        compare(results, json.loads(Path(args.baseline).read_text()))
+
+
+if __name__ == "__main__":
+    main()
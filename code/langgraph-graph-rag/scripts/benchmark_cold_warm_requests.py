@@ -0,0 +1,90 @@
+"""Benchmark cold versus warm request latency of the agent graph.
+
+A cold request is the first request of a process: it creates the graph nodes
+(LLM clients, embeddings, Neo4j connections) and compiles the graph. A warm
+request reuses the shared compiled graph. The watsonx.ai and Neo4j backends are
+replaced with the local stand-ins from `scripts/_stub_backends.py`.
+
+Run from the project root:
+    poetry run python -m scripts.benchmark_cold_warm_requests --requests 20
+"""
+
+import argparse
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from scripts._stub_backends import install_stub_backends
+
+QUESTIONS = (
+    "Which relations does the Galaxium Travels company have?",
+    "Who is the CEO of Galaxium Travels?",
+    "Hi! How are you?",
+)
+
+
+def run_request(get_graph, question: str, system_message: SystemMessage | None) -> float:
+    start = time.perf_counter()
+    agent = get_graph(system_message)
+    agent.invoke({"messages": [HumanMessage(content=question)]})
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20, help="requests per measurement")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="seconds per LLM call")
+    parser.add_argument("--neo4j-latency", type=float, default=0.005, help="seconds per Neo4j query")
+    parser.add_argument("--setup-latency", type=float, default=0.05, help="seconds per client created")
+    args = parser.parse_args()
+
+    install_stub_backends(
+        llm_latency_s=args.llm_latency,
+        embedding_latency_s=args.llm_latency / 4,
+        neo4j_latency_s=args.neo4j_latency,
+        setup_latency_s=args.setup_latency,
+    )
+    from langgraph_graph_rag.agent import get_graph_closure
+    from langgraph_graph_rag.neo4j_pool import close_neo4j_pool
+
+    def new_closure():
+        # A new process starts without a Neo4j connection pool
+        close_neo4j_pool()
+        return get_graph_closure(
+            client=None,
+            model_id="stub-model",
+            embedding_model_id="stub-embedding-model",
+            knowledge_graph_description="Galaxium Travels company overview",
+            service_manager_service_url="",
+            secret_id="",
+        )
+
+    system_message = SystemMessage(content="You are a benchmark assistant.")
+
+    # Cold: every request runs in a fresh closure, as a new worker process would
+    cold = [
+        run_request(new_closure(), QUESTIONS[i % len(QUESTIONS)], system_message)
+        for i in range(args.requests)
+    ]
+
+    # Warm: all requests share one closure after a warm-up request
+    get_graph = new_closure()
+    run_request(get_graph, QUESTIONS[0], None)
+    warm = [
+        run_request(get_graph, QUESTIONS[i % len(QUESTIONS)], system_message)
+        for i in range(args.requests)
+    ]
+
+    print("| request | mean in ms | p50 in ms | max in ms |")
+    print("| --- | --- | --- | --- |")
+    for name, latencies in (("cold", cold), ("warm", warm)):
+        print(
+            f"| {name} | {statistics.mean(latencies) * 1000:.1f} "
+            f"| {statistics.median(latencies) * 1000:.1f} | {max(latencies) * 1000:.1f} |"
+        )
+    print(f"\nwarm speedup: {statistics.mean(cold) / statistics.mean(warm):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark the import time of the agent package with `python -X importtime`.
+
+The import runs in a fresh interpreter, in an empty working directory and with
+FILENAME_AGENT_LOG_OUTPUT pointing to an empty directory, so the benchmark also
+verifies that importing the package writes no files. With `--max-ms` the script
+exits with a non-zero status when the budget is exceeded, to track startup cost in CI.
+
+Run from the project root:
+    poetry run python -m scripts.benchmark_import_time --repeat 5 --max-ms 3000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+
+def parse_importtime(stderr: str) -> list[dict]:
+    """Parse `import time: self [us] | cumulative | imported package` lines."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|", 2)
+        imports.append(
+            {
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip())) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            }
+        )
+    return imports
+
+
+def measure_import(module: str) -> tuple[list[dict], list[str]]:
+    """Import `module` in a fresh interpreter, return the import times and the files written."""
+    with tempfile.TemporaryDirectory() as workdir, tempfile.TemporaryDirectory() as log_dir:
+        env = os.environ | {"FILENAME_AGENT_LOG_OUTPUT": log_dir}
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+        written = [str(path) for directory in (workdir, log_dir) for path in Path(directory).rglob("*")]
+        return parse_importtime(completed.stderr), written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="langgraph_graph_rag.agent", help="module to import")
+    parser.add_argument("--repeat", type=int, default=3, help="number of fresh interpreters, the fastest run is reported")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to show")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the import takes longer")
+    parser.add_argument("--output", default=None, help="write the result as JSON to this file")
+    args = parser.parse_args()
+
+    runs = []
+    files_written = []
+    for _ in range(args.repeat):
+        imports, written = measure_import(args.module)
+        files_written.extend(written)
+        total_us = next(i["cumulative_us"] for i in imports if i["module"] == args.module)
+        runs.append((total_us, imports))
+    total_us, imports = min(runs, key=lambda run: run[0])
+
+    print(f"***Log: import {args.module}: {total_us / 1000:.1f} ms (best of {args.repeat})\n")
+    print("| module | self in ms | cumulative in ms |")
+    print("| --- | --- | --- |")
+    for entry in sorted(imports, key=lambda i: -i["self_us"])[: args.top]:
+        print(f"| {entry['module']} | {entry['self_us'] / 1000:.1f} | {entry['cumulative_us'] / 1000:.1f} |")
+
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(
+                {
+                    "module": args.module,
+                    "total_ms": total_us / 1000,
+                    "runs_ms": [run[0] / 1000 for run in runs],
+                    "files_written": files_written,
+                    "imports": imports,
+                },
+                indent=2,
+            )
+        )
+
+    failed = False
+    if files_written:
+        print(f"\n***Log: importing {args.module} wrote files: {files_written}")
+        failed = True
+    if args.max_ms is not None and total_us / 1000 > args.max_ms:
+        print(f"\n***Log: import time {total_us / 1000:.1f} ms exceeds the budget of {args.max_ms} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
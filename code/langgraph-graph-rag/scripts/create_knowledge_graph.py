@@ -7,8 +7,7 @@ from datetime import datetime
 from langchain_experimental.graph_transformers import LLMGraphTransformer
 from langchain_neo4j.graphs.graph_document import GraphDocument
 from langchain_core.documents import Document
-from langchain_neo4j import Neo4jGraph, Neo4jVector
-from neo4j import GraphDatabase
+from langchain_neo4j import Neo4jGraph
 from neo4j.exceptions import Neo4jError
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.prompts import ChatPromptTemplate
@@ -16,6 +15,17 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_ibm import ChatWatsonx, WatsonxEmbeddings
 from ibm_watsonx_ai import APIClient, Credentials
 
+from langgraph_graph_rag.neo4j_pool import Neo4jConnectionPool, get_neo4j_pool, close_neo4j_pool
+from langgraph_graph_rag.graph_version import new_graph_version, write_graph_version
+from langgraph_graph_rag.graph_snapshot import AdjacencySnapshot
+from langgraph_graph_rag.local_retriever import export_document_embeddings
+
+from _graph_extraction import extract_graph_documents
+from _extraction_cache import ExtractionCache
+from _incremental_ingestion import diff_chunks, delete_removed_documents
+from _graph_loader import LoadStats, load_graph_documents
+from _embedding_pipeline import EmbeddingStats, embed_documents
+
 from dotenv import load_dotenv
 
 ###############################################
@@ -33,6 +43,26 @@ USE_PROMPT=os.environ.get("USE_PROMPT")
 USE_ADDITIONAL_INSTRUCTIONS=os.environ.get("USE_ADDITIONAL_INSTRUCTIONS")
 USE_NODES_RELATION_DEFINITIONS=os.environ.get("USE_NODES_RELATION_DEFINITIONS")
 
+# Concurrent graph extraction (0 disables the rate limits)
+EXTRACTION_MAX_WORKERS=int(os.environ.get("EXTRACTION_MAX_WORKERS", "4"))
+EXTRACTION_REQUESTS_PER_SECOND=float(os.environ.get("EXTRACTION_REQUESTS_PER_SECOND", "2"))
+EXTRACTION_TOKENS_PER_MINUTE=float(os.environ.get("EXTRACTION_TOKENS_PER_MINUTE", "0"))
+EXTRACTION_MAX_RETRIES=int(os.environ.get("EXTRACTION_MAX_RETRIES", "3"))
+# On-disk cache of the extracted graph documents per chunk
+EXTRACTION_CACHE=os.environ.get("EXTRACTION_CACHE", "true")
+EXTRACTION_CACHE_DIR=os.environ.get("EXTRACTION_CACHE_DIR", "./output_data/extraction_cache")
+# full: extract and write all chunks, incremental: only the chunks changed since the last run
+INGESTION_MODE=os.environ.get("INGESTION_MODE", "full")
+# Bulk UNWIND writer instead of `add_graph_documents`, rows per batch and transaction
+GRAPH_BULK_LOADER=os.environ.get("GRAPH_BULK_LOADER", "true")
+GRAPH_WRITE_BATCH_SIZE=int(os.environ.get("GRAPH_WRITE_BATCH_SIZE", "1000"))
+# Embedding of the Document nodes: texts per request, requests in flight, retries per batch
+EMBEDDING_BATCH_SIZE=int(os.environ.get("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_CONCURRENCY=int(os.environ.get("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES=int(os.environ.get("EMBEDDING_MAX_RETRIES", "3"))
+# IVF lists of the exported embeddings for the local vector backend, 0 exports no IVF index
+LOCAL_VECTOR_IVF_LISTS=int(os.environ.get("LOCAL_VECTOR_IVF_LISTS", "0"))
+
 # Define APIClient using env variables
 print(f"***Log: Define APIClient using env variables")
 api_client = APIClient(
@@ -83,39 +113,58 @@ def get_text(filename):
     file.close()
     return content
 
-def create_knowledge_graph(graph_documents: list[GraphDocument]) -> Neo4jGraph:
+def create_knowledge_graph(graph_documents: list[GraphDocument]) -> tuple[Neo4jGraph, LoadStats]:
     # By default, url, username and password are read from env variables   
     print(f"***Log: create_knowledge_graph:\nBy default, url, username and password are read from env variables")
-    graph = Neo4jGraph(refresh_schema=False)
+    pool = get_neo4j_pool()
+    graph = pool.graph
+    if GRAPH_BULK_LOADER.lower() == 'true':
+        # Creates the indexes first, then writes the nodes and relationships in UNWIND batches
+        print(f"***Log: - bulk loader, batch size: {GRAPH_WRITE_BATCH_SIZE}")
+        load_stats = load_graph_documents(pool, graph_documents, batch_size=GRAPH_WRITE_BATCH_SIZE)
+        return graph, load_stats
+
+    start = time.time()
     graph.add_graph_documents(
         graph_documents=graph_documents, baseEntityLabel=True, include_source=True
     )
 
     #  Create full text index for graph traversal
-    graph.query(
+    pool.query(
         "CREATE FULLTEXT INDEX entity IF NOT EXISTS FOR (e:__Entity__) ON EACH [e.id]"
     )
-    return graph
+    load_stats = LoadStats(
+        documents=len({id(el.source) for el in graph_documents}),
+        nodes=sum(len(el.nodes) for el in graph_documents),
+        mentions=sum(len(el.nodes) for el in graph_documents),
+        relationships=sum(len(el.relationships) for el in graph_documents),
+        batches=2 * len(graph_documents),
+        seconds=time.time() - start,
+    )
+    return graph, load_stats
 
 
-def create_vector_index_from_graph(graph: Neo4jGraph) -> None:
-    # make sure the database is empty    
+def create_vector_index_from_graph() -> EmbeddingStats:
+    # Embeds only the Document nodes without embedding or with a changed text
     print(f"***Log: create the vector index")
-    _ = Neo4jVector.from_existing_graph(
-        embedding=embedding_func,
-        search_type="hybrid",
-        node_label="Document",
-        embedding_node_property="embedding",
-        text_node_properties=["text"],
-        graph=graph,
+    embedding_stats = embed_documents(
+        get_neo4j_pool(),
+        embedding_func,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        concurrency=EMBEDDING_CONCURRENCY,
+        max_retries=EMBEDDING_MAX_RETRIES,
     )
+    print(f"***Log: - embedded {embedding_stats.embedded} of {embedding_stats.documents} documents, {embedding_stats.embeddings_per_second:.1f} embeddings/sec")
+    if embedding_stats.backfilled:
+        print(f"***Log: - text_hash written for {embedding_stats.backfilled} documents embedded before, not embedded again")
+    return embedding_stats
 
 def get_timestamp():
     now = datetime.now()
     timestamp = now.strftime("%Y-%m-%d_%H-%M-%S")
     return timestamp
 
-def get_all_relationship_types(graph: GraphDatabase.driver) -> list[str]:
+def get_all_relationship_types(graph: Neo4jConnectionPool) -> list[str]:
     """
     Retrieves a list of all relationship types in the database.
     """
@@ -129,25 +178,15 @@ def get_all_relationship_types(graph: GraphDatabase.driver) -> list[str]:
         relationship_types = [record['relationshipType'] for record in result]
         return relationship_types
 
-def graph_conf():
-    return {
-        "NEO4J_URI" : os.getenv('NEO4J_URI'),
-        "NEO4J_USERNAME" : os.getenv('NEO4J_USERNAME'),
-        "NEO4J_PASSWORD" : os.getenv('NEO4J_PASSWORD'),
-        "NEO4J_DATABASE" : os.getenv('NEO4J_DATABASE')
-    }
-
-def connect_to_neo4j_graph() -> GraphDatabase.driver:
+def connect_to_neo4j_graph() -> Neo4jConnectionPool:
     """
-    Connects to the Neo4j graph database using environment variables.
+    Connects to the Neo4j graph database through the shared connection pool (configured with environment variables).
     """
     print(f"***Log: connect_to_neo4j_graph")
-    URI = graph_conf()['NEO4J_URI'] 
-    AUTH = (graph_conf()['NEO4J_USERNAME'], graph_conf()['NEO4J_PASSWORD'])
     try:
-        graph = GraphDatabase.driver(URI, auth=AUTH)
+        graph = get_neo4j_pool()
         # Verify connectivity (optional)
-        graph.verify_connectivity()
+        graph.driver.verify_connectivity()
         print("Connection established successfully.")
     except Neo4jError as e:
         print(f"An error occurred while connecting to the Neo4j database: {e}")
@@ -155,7 +194,7 @@ def connect_to_neo4j_graph() -> GraphDatabase.driver:
    
     return graph
 
-def get_all_node_names(graph: GraphDatabase.driver) -> list[str]:
+def get_all_node_names(graph: Neo4jConnectionPool) -> list[str]:
     """
     Retrieves all nodes and attempts to return a 'name' or 'title' property.
     Returns a list of dictionaries, including the node's labels and available names/titles.
@@ -196,7 +235,7 @@ def get_all_node_names(graph: GraphDatabase.driver) -> list[str]:
             print(f"An error occurred while retrieving node names: {e}")
             raise e
 
-def get_all_node_labels(graph: GraphDatabase.driver) -> list[str]:
+def get_all_node_labels(graph: Neo4jConnectionPool) -> list[str]:
     """
     Retrieves a list of all node labels in the database.
     """
@@ -254,6 +293,14 @@ if __name__ == "__main__":
     for chunk in chunks:
         print(f"****Log: 2.{i} Chunk:\n***\n{chunk}\n***\n")
         i = i + 1
+
+    # Incremental mode: only chunks without a stored `Document` node are extracted and written
+    extraction_chunks = chunks
+    chunk_diff = None
+    if INGESTION_MODE.lower() == 'incremental':
+        chunk_diff = diff_chunks(get_neo4j_pool(), chunks)
+        extraction_chunks = chunk_diff.new_chunks
+        print(f"***Log: - incremental ingestion: {len(chunk_diff.new_chunks)} new, {len(chunk_diff.unchanged_ids)} unchanged, {len(chunk_diff.removed_ids)} removed chunks\n\n")
     
     # Create a LLMGraphTransformer instance
     # Experimental LLM graph transformer that generates graph documents
@@ -325,20 +372,71 @@ if __name__ == "__main__":
                                               strict_mode=False,
                                              )
     
+    # Everything that changes the extraction result of a chunk is part of the cache key
+    extraction_cache = None
+    if EXTRACTION_CACHE.lower() == 'true':
+        transformer_config = {
+            "use_prompt": USE_PROMPT.lower() == 'true',
+            "use_additional_instructions": USE_ADDITIONAL_INSTRUCTIONS.lower() == 'true',
+            "use_nodes_relation_definitions": USE_NODES_RELATION_DEFINITIONS.lower() == 'true',
+            "prompt": prompt_text,
+            "additional_instructions": additional_instructions_text,
+            "allowed_nodes": allowed_nodes if USE_NODES_RELATION_DEFINITIONS.lower() == 'true' else None,
+            "allowed_relationships": allowed_relationships if USE_NODES_RELATION_DEFINITIONS.lower() == 'true' else None,
+            "strict_mode": False,
+            "temperature": 0,
+        }
+        extraction_cache = ExtractionCache(EXTRACTION_CACHE_DIR, WATSONX_MODEL_ID, transformer_config)
+        print(f"***Log: - extraction cache: {EXTRACTION_CACHE_DIR}")
+
     start = time.time()
-    print(f"***Log: 4. Start convert to graph documents using the chunks: ({len(chunks)})\n\n")
-    graph_documents = llm_transformer.convert_to_graph_documents(chunks)
+    print(f"***Log: 4. Start convert to graph documents using the chunks: ({len(extraction_chunks)})\n\n")
+    print(f"***Log: - workers: {EXTRACTION_MAX_WORKERS}, requests per sec: {EXTRACTION_REQUESTS_PER_SECOND}, tokens per min: {EXTRACTION_TOKENS_PER_MINUTE}, retries: {EXTRACTION_MAX_RETRIES}")
+    graph_documents, chunk_timings = extract_graph_documents(
+        llm_transformer,
+        extraction_chunks,
+        max_workers=EXTRACTION_MAX_WORKERS,
+        requests_per_second=EXTRACTION_REQUESTS_PER_SECOND,
+        tokens_per_minute=EXTRACTION_TOKENS_PER_MINUTE,
+        max_retries=EXTRACTION_MAX_RETRIES,
+        cache=extraction_cache,
+    )
     end = time.time()
     length = end - start
     print(f"***Log: - time to convert in sec: {length} ")   
     print(f"***Log: 5. Create the graph using the grapg documents: ({len(graph_documents)})\n\n")
     i = 1
 
+    # Remove the documents of deleted chunks and the entities only they mentioned
+    deleted_documents, deleted_entities = 0, 0
+    if chunk_diff is not None:
+        deleted_documents, deleted_entities = delete_removed_documents(get_neo4j_pool(), chunk_diff.removed_ids)
+        print(f"***Log: - deleted documents: {deleted_documents}, deleted orphaned entities: {deleted_entities}\n\n")
+
     # Create the knowledge graph in Neo4j
-    neo4j_graph = create_knowledge_graph(graph_documents=graph_documents)
+    neo4j_graph, load_stats = create_knowledge_graph(graph_documents=graph_documents)
+    print(f"***Log: - graph write: {load_stats.nodes_per_second:.1f} nodes/sec, {load_stats.relationships_per_second:.1f} relationships/sec")
     print(f"***Log: 6. graph result:\n{neo4j_graph}\n")
     print(f"***Log: 7. Create the vector index from the graph embedding model:{WATSONX_EMBEDDING_MODEL_ID}\n\n")
-    create_vector_index_from_graph(neo4j_graph)
+    embedding_stats = create_vector_index_from_graph()
+
+    # The version of the new graph, the exports are written under it before it is stamped
+    graph_version = new_graph_version()
+
+    # Export the adjacency snapshot, agents with `ADJACENCY_SNAPSHOT_PATH` expand neighbors in process
+    snapshot_path = "./output_data/graph_snapshot"
+    adjacency_snapshot = AdjacencySnapshot.from_graph(get_neo4j_pool(), version=graph_version)
+    adjacency_snapshot.save(snapshot_path)
+    print(f"***Log: 8. Adjacency snapshot ({len(adjacency_snapshot)} nodes): {snapshot_path}\n\n")
+
+    # Export the document embeddings, agents with `VECTOR_BACKEND=local` search them in process
+    vector_index_path = "./output_data/vector_index"
+    exported_documents = export_document_embeddings(get_neo4j_pool(), vector_index_path, graph_version, ivf_lists=LOCAL_VECTOR_IVF_LISTS)
+    print(f"***Log: 9. Document embeddings ({exported_documents} documents): {vector_index_path}\n\n")
+
+    # Stamp the graph version last, running agents that see it find the matching exports
+    write_graph_version(get_neo4j_pool(), graph_version)
+    print(f"***Log: 10. Graph version stamp: {graph_version}\n\n")
 
     # Save report
     file = open(filename_output,'w') 
@@ -356,6 +454,18 @@ if __name__ == "__main__":
     file.write("| conversion_time in sec | conversion_time in minutes |\n")
     file.write(f"| --- | --- |\n")  
     file.write(f"| {length} | {length/60} |\n\n")
+    file.write(f"Extraction: {EXTRACTION_MAX_WORKERS} workers, {EXTRACTION_REQUESTS_PER_SECOND} requests per sec, {EXTRACTION_TOKENS_PER_MINUTE} tokens per min, {EXTRACTION_MAX_RETRIES} retries\n\n")
+    file.write("| chunk | characters | time in sec | rate limit and retry wait in sec | attempts | nodes | relationships | cached |\n")
+    file.write(f"| --- | --- | --- | --- | --- | --- | --- | --- |\n")
+    for timing in chunk_timings:
+        file.write(f"| {timing.chunk} | {timing.characters} | {timing.seconds:.2f} | {timing.wait_seconds:.2f} | {timing.attempts} | {timing.nodes} | {timing.relationships} | {timing.cached} |\n")
+    file.write("\n")
+    if extraction_cache is not None:
+        cache_stats = extraction_cache.stats()
+        file.write(f"Extraction cache ({EXTRACTION_CACHE_DIR}, prune with `python _extraction_cache.py prune --max-age-days 30`):\n\n")
+        file.write("| entries | hits | misses | writes | hit_rate |\n")
+        file.write(f"| --- | --- | --- | --- | --- |\n")
+        file.write(f"| {cache_stats['entries']} | {cache_stats['hits']} | {cache_stats['misses']} | {cache_stats['writes']} | {cache_stats['hit_rate']:.2f} |\n\n")
  
     file.write(f"\n## 4. Ontology definition\n\n")
     file.write(f"Langchain GraphTransformer configuration:\n")
@@ -373,9 +483,17 @@ if __name__ == "__main__":
     
     file.write(f"\n## 5. Generated Graph Data overview\n")
     file.write(f"generated_graph_documents_count: {len(graph_documents)}\n")
+    file.write(f"graph_version: {graph_version}\n")
+    file.write(f"adjacency_snapshot: {snapshot_path} ({len(adjacency_snapshot)} nodes, {len(adjacency_snapshot.arrays['out_indices'])} relationships)\n")
+    file.write(f"local_vector_index: {vector_index_path} ({exported_documents} documents, {LOCAL_VECTOR_IVF_LISTS} IVF lists)\n")
     file.write(f"| chunk size | chunks | chunk overlap |\n")
     file.write(f"| --- | --- | --- |\n")
     file.write(f"| {chunk_size} | {overlap}| {len(chunks)} |\n\n")
+    file.write(f"ingestion_mode: {INGESTION_MODE}\n")
+    if chunk_diff is not None:
+        file.write("| new chunks | unchanged chunks | removed chunks | deleted documents | deleted orphaned entities |\n")
+        file.write(f"| --- | --- | --- | --- | --- |\n")
+        file.write(f"| {len(chunk_diff.new_chunks)} | {len(chunk_diff.unchanged_ids)} | {len(chunk_diff.removed_ids)} | {deleted_documents} | {deleted_entities} |\n\n")
     
     # Connect to Neo4j graph to get overview data    
     graph = connect_to_neo4j_graph()
@@ -399,7 +517,26 @@ if __name__ == "__main__":
         i = i + 1
         file.write(f"{graph_document}\n\n")
     file.write(f"\n```\n")
+
+    file.write(f"\n## 10. Neo4j connection pool\n")
+    pool_stats = graph.stats()
+    file.write("| max_size | in_use | idle | acquired | timeouts | wait_time_avg in sec | wait_time_max in sec |\n")
+    file.write(f"| --- | --- | --- | --- | --- | --- | --- |\n")
+    file.write(f"| {pool_stats['max_size']} | {pool_stats['in_use']} | {pool_stats['idle']} | {pool_stats['acquired']} | {pool_stats['timeouts']} | {pool_stats['wait_time_avg_s']} | {pool_stats['wait_time_max_s']} |\n\n")
+
+    file.write(f"\n## 11. Graph write throughput\n")
+    file.write(f"bulk_loader: {GRAPH_BULK_LOADER}, batch size: {GRAPH_WRITE_BATCH_SIZE}\n\n")
+    file.write("| documents | nodes | mentions | relationships | batches | write time in sec | nodes per sec | relationships per sec |\n")
+    file.write(f"| --- | --- | --- | --- | --- | --- | --- | --- |\n")
+    file.write(f"| {load_stats.documents} | {load_stats.nodes} | {load_stats.mentions} | {load_stats.relationships} | {load_stats.batches} | {load_stats.seconds:.2f} | {load_stats.nodes_per_second:.1f} | {load_stats.relationships_per_second:.1f} |\n\n")
+
+    file.write(f"\n## 12. Embedding throughput\n")
+    file.write(f"batch size: {EMBEDDING_BATCH_SIZE}, concurrency: {EMBEDDING_CONCURRENCY}, retries: {EMBEDDING_MAX_RETRIES}\n\n")
+    file.write("| documents | embedded | batches | retried requests | embedding time in sec | embeddings per sec |\n")
+    file.write(f"| --- | --- | --- | --- | --- | --- |\n")
+    file.write(f"| {embedding_stats.documents} | {embedding_stats.embedded} | {embedding_stats.batches} | {embedding_stats.retries} | {embedding_stats.seconds:.2f} | {embedding_stats.embeddings_per_second:.1f} |\n\n")
     file.close()
+    close_neo4j_pool()
 
     print(f"***Log: Finished knowledge graph creation successfully. \n\n")
     print(f"***Log: Open Neo4j graph at: http://localhost:7474/ \n\n")
@@ -1,18 +1,34 @@
+import threading
 from typing import Callable
 from functools import partial
 
 from ibm_watsonx_ai import APIClient
 
 from langchain_core.messages import SystemMessage
+from langchain_core.runnables import Runnable, RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.graph import CompiledGraph
 
 
+from .conversation_memory import create_checkpointer
 from .nodes import AgentState, GraphNodes
+from .runtime_context import get_runtime_context
 import logging
 logger = logging.getLogger(__name__)
-#logging.basicConfig(filename='example.log', encoding='utf-8', level=logging.DEBUG)
-logging.basicConfig(encoding='utf-8', level=logging.DEBUG)
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a helpful AI assistant, please respond to the user's query to the best of your ability! "
+    "If relevant, please use knowledge from the provided documents."
+)
+
+def route_after_agent(state: AgentState) -> list[str] | str:
+    """Fan out to both retrievers for the knowledge graph route, otherwise answer directly."""
+    if state["route"] == "graph_knowledge_base":
+        # The speculative retrieval of the agent node already provided the context
+        if state.get("speculated"):
+            return "combine_context"
+        return ["graph_search", "vector_retriever"]
+    return "generate"
 
 def get_graph_closure(
     client: APIClient,
@@ -21,26 +37,27 @@ def get_graph_closure(
     knowledge_graph_description: str,
     service_manager_service_url: str,
     secret_id: str,
+    async_mode: bool = False,
 ) -> Callable:
-    """Graph generator closure."""
+    """Graph generator closure.
 
-    def get_graph(system_message: SystemMessage | None = None) -> CompiledGraph:
-        """Get compiled graph with overwritten system prompt, if provided"""
-        
-        logger.debug(f"***Log: get_graph: system_message {system_message}")
+    `async_mode` tells the closure the graph runs with `ainvoke` and `astream`, the
+    conversation checkpointer has to support them.
+    """
+
+    compiled_graph: CompiledGraph | None = None
+    compiled_graph_lock = threading.Lock()
+
+    def build_graph() -> CompiledGraph:
+        """Build the graph nodes and compile the graph, done once per process"""
+
+        logger.debug("***Log: build_graph: creating graph nodes and compiling the graph")
 
-        if system_message is None:
-            system_message = SystemMessage(
-                content=(
-                    "You are a helpful AI assistant, please respond to the user's query to the best of your ability! "
-                    "If relevant, please use knowledge from the provided documents."
-                )
-            )
         graph_nodes = GraphNodes(
             api_client=client,
             model_id=model_id,
             embedding_model_id=embedding_model_id,
-            system_message=system_message,
+            system_message=SystemMessage(content=DEFAULT_SYSTEM_PROMPT),
             service_manager_service_url=service_manager_service_url,
             secret_id=secret_id,
         )
@@ -49,24 +66,48 @@ def get_graph_closure(
         workflow = StateGraph(AgentState)
 
         # Add Nodes to workflow
+        # The nodes with remote calls have an async variant, used by `ainvoke` and `astream`
 
         # Routing
         workflow.add_node(
             "agent",
-            partial(
-                graph_nodes.agent,
-                knowledge_graph_description=knowledge_graph_description,
+            RunnableLambda(
+                partial(
+                    graph_nodes.agent,
+                    knowledge_graph_description=knowledge_graph_description,
+                ),
+                afunc=partial(
+                    graph_nodes.aagent,
+                    knowledge_graph_description=knowledge_graph_description,
+                ),
+                name="agent",
             ),
         )
 
         # Graph Search
-        workflow.add_node("graph_search", graph_nodes.graph_search)
+        workflow.add_node(
+            "graph_search",
+            RunnableLambda(graph_nodes.graph_search, afunc=graph_nodes.agraph_search, name="graph_search"),
+        )
 
         # Vector Index Retriever
-        workflow.add_node("vector_retriever", graph_nodes.unstructured_retriever)
+        workflow.add_node(
+            "vector_retriever",
+            RunnableLambda(
+                graph_nodes.unstructured_retriever,
+                afunc=graph_nodes.aunstructured_retriever,
+                name="vector_retriever",
+            ),
+        )
+
+        # Join the graph search and vector retriever results
+        workflow.add_node("combine_context", graph_nodes.combine_context)
 
         # Generate final answer
-        workflow.add_node("generate", graph_nodes.generate)
+        workflow.add_node(
+            "generate",
+            RunnableLambda(graph_nodes.generate, afunc=graph_nodes.agenerate, name="generate"),
+        )
 
         workflow.add_edge(START, "agent")
 
@@ -76,21 +117,55 @@ def get_graph_closure(
             # This means these are the edges taken after the `agent` node is called.
             "agent",
             # Next, we pass in the function that will determine which node is called next.
-            lambda state: state["route"],
-            {
-                "graph_knowledge_base": "graph_search",  # If graph knowledge base is in state
-                # Otherwise we finish.
-                "final_answer": "generate",
-            },
+            route_after_agent,
+            ["graph_search", "vector_retriever", "combine_context", "generate"],
         )
-        workflow.add_edge("graph_search", "vector_retriever")
-        workflow.add_edge("vector_retriever", "generate")
-
-        workflow.add_edge("generate", END)
+        # Graph search and vector retriever run in parallel, the join waits for both
+        workflow.add_edge(["graph_search", "vector_retriever"], "combine_context")
+        workflow.add_edge("combine_context", "generate")
+
+        # The checkpointed conversation removes the stale context and the older turns after the answer
+        config = get_runtime_context().config
+        checkpointer = None
+        if config["CONVERSATION_MEMORY"]:
+            checkpointer = create_checkpointer(
+                config["CONVERSATION_CHECKPOINTER"], config["CONVERSATION_SQLITE_PATH"], async_mode=async_mode
+            )
+            workflow.add_node(
+                "compact_history",
+                RunnableLambda(
+                    graph_nodes.compact_history, afunc=graph_nodes.acompact_history, name="compact_history"
+                ),
+            )
+            workflow.add_edge("generate", "compact_history")
+            workflow.add_edge("compact_history", END)
+        else:
+            workflow.add_edge("generate", END)
 
         # Compile
-        graph = workflow.compile()
+        return workflow.compile(checkpointer=checkpointer)
+
+    def get_graph(system_message: SystemMessage | None = None) -> Runnable:
+        """Get the shared compiled graph, bound to the request system prompt, if provided.
+
+        The graph nodes (LLM clients, embeddings and Neo4j connections) and the compiled
+        graph are created on the first call only. A request specific system message is
+        passed to the `generate` node through the `configurable` section of the run config.
+        """
+        nonlocal compiled_graph
 
-        return graph
+        logger.debug(f"***Log: get_graph: system_message {system_message}")
+
+        if compiled_graph is None:
+            with compiled_graph_lock:
+                if compiled_graph is None:
+                    compiled_graph = build_graph()
+
+        if system_message is None:
+            return compiled_graph
+
+        return compiled_graph.with_config(
+            configurable={"system_message": system_message}
+        )
 
     return get_graph
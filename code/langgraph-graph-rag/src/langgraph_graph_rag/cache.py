@@ -0,0 +1,216 @@
+"""In-process caches used by the graph nodes.
+
+numpy is imported by the `SemanticCache` methods that use it, importing the module
+for `LRUTTLCache` does not load it.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Hashable
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def normalize_question(text: str) -> str:
+    """Normalize a question for cache keys: case, whitespace and trailing punctuation."""
+    return re.sub(r"\s+", " ", text).strip().rstrip("?!. ").lower()
+
+
+class LRUTTLCache:
+    """Thread-safe LRU cache with a time-to-live per entry and hit/miss counters.
+
+    Args:
+        max_size (int): Maximum number of entries, the least recently used entry is evicted first
+        ttl (float): Seconds an entry stays valid, 0 disables expiry
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, expires_at: float) -> bool:
+        return self.ttl > 0 and time.monotonic() >= expires_at
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[0]):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def items(self) -> list[tuple[Hashable, Any]]:
+        """Snapshot of the valid entries, does not count as a lookup."""
+        with self._lock:
+            return [
+                (key, value)
+                for key, (expires_at, value) in self._entries.items()
+                if not self._expired(expires_at)
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _unit(vector: list[float]) -> "np.ndarray":
+    import numpy as np
+
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector)) or 1.0
+    return vector / norm
+
+
+class SemanticCache:
+    """Cache keyed by text similarity, a lookup hits the most similar entry above `threshold`.
+
+    Identical questions (after `normalize_question`) are answered without an embedding
+    call, other questions are embedded once and compared by cosine similarity with one
+    product against the matrix of the cached unit embeddings, rebuilt after a `store`.
+
+    Args:
+        embed (Callable[[str], list[float]]): The embedding function, e.g. `Embeddings.embed_query`
+        aembed (Callable[[str], Awaitable[list[float]]] | None): The async embedding function of `alookup`
+        threshold (float): Minimum cosine similarity for a hit
+        max_size (int): Maximum number of entries, least recently used first out
+        ttl (float): Seconds an entry stays valid, 0 disables expiry
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], list[float]],
+        threshold: float = 0.95,
+        max_size: int = 512,
+        ttl: float = 3600.0,
+        aembed: Callable[[str], Awaitable[list[float]]] | None = None,
+    ) -> None:
+        self.embed = embed
+        self.aembed = aembed
+        self.threshold = threshold
+        self._entries = LRUTTLCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        # The keys and the unit embedding matrix of the entries, None until the next lookup
+        self._matrix: "tuple[list[Hashable], np.ndarray] | None" = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def lookup(self, text: str) -> "tuple[Any, np.ndarray | None]":
+        """Find the cached value of `text` or of a similar text.
+
+        Returns:
+            tuple: The cached value (None on a miss) and the embedding of `text`, if it was computed
+        """
+        if (cached := self._lookup_exact(text)) is not None:
+            return cached
+        return self._lookup_similar(_unit(self.embed(text)))
+
+    async def alookup(self, text: str) -> "tuple[Any, np.ndarray | None]":
+        """Async `lookup`, the embedding call does not block the event loop."""
+        if (cached := self._lookup_exact(text)) is not None:
+            return cached
+        if self.aembed is not None:
+            embedding = await self.aembed(text)
+        else:
+            embedding = await asyncio.to_thread(self.embed, text)
+        return self._lookup_similar(_unit(embedding))
+
+    def _lookup_exact(self, text: str) -> "tuple[Any, np.ndarray] | None":
+        entry = self._entries.get(normalize_question(text))
+        if entry is None:
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry[1], entry[0]
+
+    def _embedding_matrix(self) -> "tuple[list[Hashable], np.ndarray]":
+        import numpy as np
+
+        with self._lock:
+            if self._matrix is None:
+                items = self._entries.items()
+                keys = [key for key, _ in items]
+                matrix = np.array([embedding for _, (embedding, _) in items], dtype=np.float32)
+                self._matrix = keys, matrix.reshape(len(keys), -1) if keys else np.zeros((0, 0), dtype=np.float32)
+            return self._matrix
+
+    def _lookup_similar(self, embedding: "np.ndarray") -> "tuple[Any, np.ndarray]":
+        keys, matrix = self._embedding_matrix()
+        best_key = None
+        if keys and matrix.shape[1] == len(embedding):
+            similarities = matrix @ embedding
+            best = int(similarities.argmax())
+            if similarities[best] >= self.threshold:
+                best_key = keys[best]
+
+        if best_key is not None:
+            if (entry := self._entries.get(best_key)) is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.semantic_hits += 1
+                return entry[1], embedding
+            # The entry expired, the matrix is rebuilt from the valid entries
+            with self._lock:
+                self._matrix = None
+
+        with self._lock:
+            self.misses += 1
+        return None, embedding
+
+    def store(self, text: str, value: Any, embedding: "list[float] | np.ndarray | None" = None) -> None:
+        embedding = _unit(embedding) if embedding is not None else _unit(self.embed(text))
+        self._entries.set(normalize_question(text), (embedding, value))
+        with self._lock:
+            self._matrix = None
+
+    def clear(self) -> None:
+        self._entries.clear()
+        with self._lock:
+            self._matrix = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self._entries.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,126 @@
+"""Token budget of the retrieved context sent to the `generate` node.
+
+The graph search returns up to 20 relationship rows per entity, the rows of
+related entities overlap, and the vector retriever adds the full text of every
+document. `ContextAssembler` removes duplicate rows and documents, ranks the rows
+and the documents by their word overlap with the question (ties keep the retrieval
+order) and keeps the best ones that fit into the token budget of the model. The
+rows get a share of the budget, a share the rows or documents do not use is left
+to the other. A budget of 0 only removes the duplicates and keeps the order.
+Tokens are estimated with about 4 characters per token, no tokenizer is loaded.
+"""
+
+import re
+from dataclasses import dataclass
+
+from .text_utils import STOP_WORDS, estimate_tokens
+
+
+def parse_token_budgets(value: str | None) -> dict[str, int]:
+    """Parse `model_id=tokens,model_id=tokens` overrides of the default budget."""
+    budgets = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            model_id, tokens = item.rsplit("=", 1)
+            budgets[model_id.strip()] = int(tokens)
+    return budgets
+
+
+def _words(text: str) -> set[str]:
+    return {word for word in re.findall(r"\w+", text.lower()) if word not in STOP_WORDS}
+
+
+@dataclass
+class ContextBudgetReport:
+    budget: int
+    tokens_before: int
+    tokens_after: int
+    rows_before: int
+    rows_after: int
+    duplicate_rows: int
+    documents_before: int
+    documents_after: int
+    duplicate_documents: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+class ContextAssembler:
+    """Deduplicates, ranks and trims the retrieved context to a token budget.
+
+    Args:
+        token_budget (int): Maximum tokens of the rows and documents, 0 only removes duplicates
+        structured_share (float): Share of the budget reserved for the graph rows
+    """
+
+    def __init__(self, token_budget: int = 0, structured_share: float = 0.4) -> None:
+        self.token_budget = token_budget
+        self.structured_share = structured_share
+
+    @staticmethod
+    def _rank(question: str, items: list[str]) -> list[str]:
+        """The items by the number of question words they contain, best first."""
+        question_words = _words(question)
+        scored = [
+            (-len(question_words & _words(item)), number, item) for number, item in enumerate(items)
+        ]
+        return [item for _, _, item in sorted(scored)]
+
+    @staticmethod
+    def _fit(items: list[str], budget: int) -> tuple[list[str], int]:
+        """The items that fit into `budget` tokens, in their order, and the tokens they use."""
+        kept, used = [], 0
+        for item in items:
+            tokens = estimate_tokens(item)
+            if used + tokens > budget:
+                continue
+            kept.append(item)
+            used += tokens
+        return kept, used
+
+    def assemble(self, question: str, structured_data: str, documents: list[str]) -> tuple[str, list[str], ContextBudgetReport]:
+        """Build the context of a question.
+
+        Args:
+            question (str): The user question
+            structured_data (str): The graph rows of `graph_search`, one row per line
+            documents (list[str]): The documents of `unstructured_retriever`, best first
+
+        Returns:
+            tuple: The kept rows joined by new lines, the kept documents, both best first, and the report
+        """
+        all_rows = [row.strip() for row in structured_data.splitlines() if row.strip()]
+        rows = list(dict.fromkeys(all_rows))
+        unique_documents = list(dict.fromkeys(documents))
+        tokens_before = estimate_tokens(structured_data) + sum(estimate_tokens(document) for document in documents)
+
+        if self.token_budget > 0:
+            ranked_rows = self._rank(question, rows)
+            ranked_documents = self._rank(question, unique_documents)
+            row_budget = int(self.token_budget * self.structured_share)
+            document_tokens = sum(estimate_tokens(document) for document in ranked_documents)
+            # The documents leave the rows what they do not need, and the other way around
+            row_budget = max(row_budget, self.token_budget - document_tokens)
+            kept_rows, row_tokens = self._fit(ranked_rows, row_budget)
+            kept_documents, _ = self._fit(ranked_documents, self.token_budget - row_tokens)
+            if ranked_documents and not kept_documents and not kept_rows:
+                # Nothing fits, the best document is cut to the budget
+                kept_documents = [ranked_documents[0][: self.token_budget * 4]]
+        else:
+            kept_rows, kept_documents = rows, unique_documents
+
+        structured_context = "\n".join(kept_rows) + ("\n" if kept_rows else "")
+        report = ContextBudgetReport(
+            budget=self.token_budget,
+            tokens_before=tokens_before,
+            tokens_after=estimate_tokens(structured_context) + sum(estimate_tokens(document) for document in kept_documents),
+            rows_before=len(all_rows),
+            rows_after=len(kept_rows),
+            duplicate_rows=len(all_rows) - len(rows),
+            documents_before=len(documents),
+            documents_after=len(kept_documents),
+            duplicate_documents=len(documents) - len(unique_documents),
+        )
+        return structured_context, kept_documents, report
@@ -0,0 +1,101 @@
+"""Thread-scoped conversation state of the agent graph.
+
+With `CONVERSATION_MEMORY=true` the graph is compiled with a LangGraph
+checkpointer, the state of a conversation is kept under its conversation id
+(the `thread_id` of the run config) and a client sends only the new messages of
+a turn. The `compact_history` node runs after `generate` and keeps the prompt of
+the next turn bounded:
+
+    - the router tool calls and the retrieved context (`ToolMessage`) of the
+      finished turn are removed, the next turn retrieves its own context
+    - the turns before the last `CONVERSATION_MAX_TURNS` are folded into a running
+      summary, the `generate` node sends the summary instead of these messages
+
+`memory` keeps the checkpoints in process, `sqlite` in a SQLite file, it needs the
+`langgraph-checkpoint-sqlite` package and works with the sync service functions only,
+`create_checkpointer` refuses it for the async ones.
+"""
+
+import sqlite3
+from typing import Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+
+import logging
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You summarize a conversation between a user and an AI assistant. Extend the existing summary "
+    "with the new messages. Keep the facts, names and open questions the assistant may need to answer "
+    "follow-up questions, leave out greetings. Answer with the summary only."
+)
+
+
+def create_checkpointer(backend: str, path: str | None = None, async_mode: bool = False) -> BaseCheckpointSaver:
+    """Create the checkpointer of the conversation state.
+
+    Args:
+        backend (str): `memory` or `sqlite`
+        path (str | None): The SQLite database file of the `sqlite` backend
+        async_mode (bool): The graph runs with `ainvoke` and `astream`
+
+    Returns:
+        BaseCheckpointSaver: The checkpointer passed to `workflow.compile`
+    """
+    if backend == "memory":
+        return MemorySaver()
+    if backend == "sqlite":
+        if async_mode:
+            # SqliteSaver has no async methods, the first `ainvoke` would fail
+            raise ValueError(
+                "CONVERSATION_CHECKPOINTER=sqlite works with the sync service functions only, "
+                "use CONVERSATION_CHECKPOINTER=memory with async_mode"
+            )
+        try:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+        except ImportError as e:
+            raise ImportError(
+                "CONVERSATION_CHECKPOINTER=sqlite needs the `langgraph-checkpoint-sqlite` package"
+            ) from e
+        # The connection is shared by the request threads, SqliteSaver serializes the access
+        checkpointer = SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+        checkpointer.setup()
+        return checkpointer
+    raise ValueError(f"Unknown CONVERSATION_CHECKPOINTER {backend!r}, use 'memory' or 'sqlite'")
+
+
+def is_retrieval_message(message: BaseMessage) -> bool:
+    """The router tool call and the retrieved context of a turn."""
+    return isinstance(message, ToolMessage) or (isinstance(message, AIMessage) and bool(message.tool_calls))
+
+
+def plan_compaction(messages: Sequence[BaseMessage], max_turns: int) -> tuple[list[BaseMessage], list[BaseMessage]]:
+    """Split the messages of a finished turn into the stale and the evicted ones.
+
+    Args:
+        messages (Sequence[BaseMessage]): The messages of the conversation state
+        max_turns (int): The last turns kept verbatim, a turn starts with a user message, the
+            current turn is always kept
+
+    Returns:
+        tuple: The stale retrieval messages and the messages of the older turns, both are removed,
+            the older turns are added to the summary
+    """
+    stale = [message for message in messages if is_retrieval_message(message)]
+    conversation = [message for message in messages if not is_retrieval_message(message)]
+    turn_starts = [number for number, message in enumerate(conversation) if isinstance(message, HumanMessage)]
+    max_turns = max(max_turns, 1)
+    if len(turn_starts) <= max_turns:
+        return stale, []
+    return stale, conversation[: turn_starts[-max_turns]]
+
+
+def transcript(messages: Sequence[BaseMessage]) -> str:
+    """The messages as `User:` and `Assistant:` lines for the summary prompt."""
+    lines = []
+    for message in messages:
+        role = "User" if isinstance(message, HumanMessage) else "Assistant"
+        lines.append(f"{role}: {message.content}")
+    return "\n".join(lines)
@@ -0,0 +1,152 @@
+"""Cache of the query embeddings in front of the embedding model.
+
+The router cache and the hybrid vector retriever embed the same user question.
+`CachedEmbeddings` wraps the embedding model: `embed_query` results are kept in an
+in-process LRU cache with a time-to-live and, optionally, in a sqlite file that
+survives restarts. The key is the embedding model id and the normalized question.
+`embed_queries` embeds the cache misses of a batch of questions with one
+`embed_documents` call. Document embeddings (`embed_documents`) are not cached.
+"""
+
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from .cache import LRUTTLCache, normalize_question
+
+
+class SqliteEmbeddingStore:
+    """Persistent tier of the embedding cache.
+
+    Args:
+        path (str): The sqlite database file, created if it does not exist
+        ttl (float): Seconds an entry stays valid, 0 disables expiry
+    """
+
+    def __init__(self, path: str, ttl: float = 0.0) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings "
+            "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT embedding, created_at FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (self.ttl > 0 and time.time() - row[1] >= self.ttl):
+            return None
+        return array("d", row[0]).tolist()
+
+    def set(self, key: str, embedding: list[float]) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, embedding, created_at) VALUES (?, ?, ?)",
+                (key, array("d", embedding).tobytes(), time.time()),
+            )
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings with cached `embed_query` results.
+
+    Args:
+        embeddings (Embeddings): The embedding model
+        model_id (str): The embedding model id, part of the cache key
+        max_size (int): Maximum number of in-process entries
+        ttl (float): Seconds an entry stays valid, 0 disables expiry
+        path (str | None): Optional sqlite file of the persistent tier
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_id: str,
+        max_size: int = 2048,
+        ttl: float = 86400.0,
+        path: str | None = None,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.memory = LRUTTLCache(max_size=max_size, ttl=ttl)
+        self.disk = SqliteEmbeddingStore(path, ttl=ttl) if path else None
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return f"{self.model_id}\n{normalize_question(text)}"
+
+    def _cached(self, key: str) -> list[float] | None:
+        if (embedding := self.memory.get(key)) is not None:
+            return embedding
+        if self.disk is not None and (embedding := self.disk.get(key)) is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self.memory.set(key, embedding)
+            return embedding
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key: str, embedding: list[float]) -> None:
+        self.memory.set(key, embedding)
+        if self.disk is not None:
+            self.disk.set(key, embedding)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        if (embedding := self._cached(key)) is None:
+            embedding = self.embeddings.embed_query(text)
+            self._store(key, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        if (embedding := self._cached(key)) is None:
+            embedding = await self.embeddings.aembed_query(text)
+            self._store(key, embedding)
+        return embedding
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """`embed_query` of many questions, the cache misses are embedded in one model call."""
+        keys = [self._key(text) for text in texts]
+        embeddings = {key: embedding for key in dict.fromkeys(keys) if (embedding := self._cached(key)) is not None}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in embeddings:
+                missing.setdefault(key, text)
+        if missing:
+            for key, embedding in zip(missing, self.embeddings.embed_documents(list(missing.values()))):
+                self._store(key, embedding)
+                embeddings[key] = embedding
+        return [embeddings[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self) -> dict:
+        memory_stats = self.memory.stats()
+        with self._lock:
+            lookups = memory_stats["hits"] + memory_stats["misses"]
+            hits = memory_stats["hits"] + self.disk_hits
+            return {
+                "size": memory_stats["size"],
+                "memory_hits": memory_stats["hits"],
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": memory_stats["evictions"],
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
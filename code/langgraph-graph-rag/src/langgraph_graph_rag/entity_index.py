@@ -0,0 +1,126 @@
+"""In-process fuzzy index of the knowledge graph entity names.
+
+Resolves entity names extracted from a question to `__Entity__` ids without a
+Neo4j round-trip. It follows the semantics of the full-text query built by
+`GraphNodes._generate_full_text_query`: every word of the name has to match a
+word of the entity id within 2 edits (`word~2 AND ...`). Fuzzy word matches use a
+symmetric deletion index, so a lookup only generates the deletions of the query
+word instead of comparing it with every indexed word.
+"""
+
+import math
+import re
+from collections import defaultdict
+from itertools import combinations
+
+MAX_EDIT_DISTANCE = 2
+
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _max_edits(word: str) -> int:
+    # Like Lucene fuzzy queries, the allowed edits are smaller than the word length
+    return min(MAX_EDIT_DISTANCE, max(len(word) - 1, 0))
+
+
+def _deletions(word: str, max_edits: int) -> set[str]:
+    """All strings that result from deleting up to `max_edits` characters of `word`."""
+    deletions = {word}
+    for edits in range(1, min(max_edits, len(word)) + 1):
+        for positions in combinations(range(len(word)), edits):
+            deletions.add("".join(c for i, c in enumerate(word) if i not in positions))
+    return deletions
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Damerau-Levenshtein (optimal string alignment) distance, capped at `max_distance + 1`."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous: list[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+class EntityIndex:
+    """Symmetric deletion index over the words of the entity ids.
+
+    Args:
+        entity_ids (list[str]): The `id` property of the `__Entity__` nodes
+        version (str | None): The graph version stamp the ids were loaded at
+    """
+
+    def __init__(self, entity_ids: list[str], version: str | None = None) -> None:
+        self.version = version
+        self.entity_ids = list(dict.fromkeys(entity_id for entity_id in entity_ids if entity_id))
+        self._entity_words: list[list[str]] = []
+        self._word_entities: dict[str, set[int]] = defaultdict(set)
+        self._deletion_words: dict[str, set[str]] = defaultdict(set)
+
+        for position, entity_id in enumerate(self.entity_ids):
+            words = _words(entity_id)
+            self._entity_words.append(words)
+            for word in words:
+                if word not in self._word_entities:
+                    for deletion in _deletions(word, MAX_EDIT_DISTANCE):
+                        self._deletion_words[deletion].add(word)
+                self._word_entities[word].add(position)
+
+    def __len__(self) -> int:
+        return len(self.entity_ids)
+
+    def _similar_words(self, word: str) -> dict[str, int]:
+        """Indexed words within the allowed edits of `word`, with their distance."""
+        max_edits = _max_edits(word)
+        candidates = set()
+        for deletion in _deletions(word, max_edits):
+            candidates |= self._deletion_words.get(deletion, set())
+        matches = {}
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, max_edits)
+            if distance <= max_edits:
+                matches[candidate] = distance
+        return matches
+
+    def search(self, name: str, limit: int = 2) -> list[str]:
+        """Resolve an entity name to at most `limit` entity ids, best match first."""
+        words = _words(name)
+        if not words:
+            return []
+
+        scores: dict[int, float] | None = None
+        for word in words:
+            word_scores: dict[int, float] = {}
+            for candidate, distance in self._similar_words(word).items():
+                similarity = 1.0 - distance / max(len(word), len(candidate))
+                for position in self._word_entities[candidate]:
+                    word_scores[position] = max(word_scores.get(position, 0.0), similarity)
+            # All words of the name have to match (AND)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {
+                    position: score + word_scores[position]
+                    for position, score in scores.items()
+                    if position in word_scores
+                }
+            if not scores:
+                return []
+
+        # Entities with fewer unmatched words rank higher, like full-text length normalization
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1] / math.sqrt(len(self._entity_words[item[0]])), item[0]),
+        )
+        return [self.entity_ids[position] for position, _ in ranked[:limit]]
@@ -0,0 +1,70 @@
+"""Versioned export directories read by running agents.
+
+The adjacency snapshot and the document embeddings are exported to disk by
+`create_knowledge_graph.py` and memory-mapped by the agents. An export is never
+rewritten in place: each one is written to a new subdirectory and published by
+replacing the `CURRENT` pointer file with `os.replace`, so an agent reads either
+the previous or the new export, never a partly written one, and the files it has
+memory-mapped are not truncated.
+
+    <path>/CURRENT                  name of the published export directory
+    <path>/export-<version>-<id>/   the files of one export
+"""
+
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import logging
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+EXPORT_PREFIX = "export-"
+
+
+def new_export_directory(path: str | Path, version: str | None) -> Path:
+    """Create an empty export directory below `path`, it is not visible to readers yet."""
+    directory = Path(path) / f"{EXPORT_PREFIX}{version or 'unversioned'}-{uuid.uuid4().hex[:8]}"
+    directory.mkdir(parents=True)
+    return directory
+
+
+def publish_export_directory(path: str | Path, directory: Path) -> None:
+    """Point `CURRENT` to a complete export directory and remove the older exports.
+
+    The previously published export is kept, agents that have not seen the new graph
+    version yet may still open it.
+    """
+    path = Path(path)
+    pointer = path / CURRENT_FILE
+    previous = pointer.read_text().strip() if pointer.exists() else None
+    temporary = path / f".{CURRENT_FILE}.{uuid.uuid4().hex[:8]}"
+    temporary.write_text(directory.name)
+    os.replace(temporary, pointer)
+    for stale in path.glob(f"{EXPORT_PREFIX}*"):
+        if stale.is_dir() and stale.name not in (directory.name, previous):
+            # Files still memory-mapped by an agent stay readable until it unmaps them
+            shutil.rmtree(stale, ignore_errors=True)
+            logger.debug(f"***Log: publish_export_directory: removed {stale}")
+
+
+def current_export_directory(path: str | Path | None, marker: str) -> Path | None:
+    """The published export directory below `path`, None if there is none.
+
+    Args:
+        path (str | Path | None): The export path
+        marker (str): The file that is written last into a complete export
+
+    Returns:
+        Path | None: The directory of the current export, `path` itself for an export
+            written before the exports were versioned
+    """
+    if not path:
+        return None
+    path = Path(path)
+    pointer = path / CURRENT_FILE
+    if pointer.exists():
+        directory = path / pointer.read_text().strip()
+        return directory if (directory / marker).exists() else None
+    return path if (path / marker).exists() else None
@@ -0,0 +1,183 @@
+"""Compact adjacency snapshot of the knowledge graph for in-process traversal.
+
+The snapshot holds the relationships between `__Entity__` nodes, without `MENTIONS`,
+in compressed sparse row (CSR) form: node ids and relationship types are interned
+to integers, outgoing and incoming edges are stored as integer arrays. It is exported
+by `create_knowledge_graph.py` and memory-mapped from disk by the runtime, so the
+one-hop expansion of `graph_search` does not need a Neo4j round-trip.
+
+Files of a snapshot directory:
+    meta.json                                     version, node ids, relationship types
+    out_indptr.npy, out_indices.npy, out_types.npy  outgoing edges
+    in_indptr.npy, in_indices.npy, in_types.npy     incoming edges
+
+Each save writes a new versioned directory below the snapshot path and publishes it
+with `export_directory.publish_export_directory`, the files of a snapshot that is
+memory-mapped by a running agent are never rewritten.
+"""
+
+import json
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from .export_directory import current_export_directory, new_export_directory, publish_export_directory
+
+import logging
+logger = logging.getLogger(__name__)
+
+EXPORT_ENTITY_IDS_QUERY = """
+MATCH (e:__Entity__) RETURN e.id AS id
+"""
+
+EXPORT_RELATIONSHIPS_QUERY = """
+MATCH (source:__Entity__)-[r:!MENTIONS]->(target:__Entity__)
+RETURN source.id AS source, type(r) AS type, target.id AS target
+"""
+
+
+def _csr(sources: np.ndarray, targets: np.ndarray, types: np.ndarray, node_count: int):
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32), types[order].astype(np.int16)
+
+
+class AdjacencySnapshot:
+    """CSR adjacency of the entity graph with interned node ids and relationship types.
+
+    Args:
+        node_ids (list[str]): The entity ids, the position is the interned node number
+        relationship_types (list[str]): The relationship types, the position is the interned type
+        arrays (dict[str, np.ndarray]): The `out_*` and `in_*` CSR arrays
+        version (str | None): The graph version stamp of the snapshot
+    """
+
+    ARRAYS = ("out_indptr", "out_indices", "out_types", "in_indptr", "in_indices", "in_types")
+
+    def __init__(
+        self,
+        node_ids: list[str],
+        relationship_types: list[str],
+        arrays: dict[str, np.ndarray],
+        version: str | None = None,
+    ) -> None:
+        self.node_ids = node_ids
+        self.relationship_types = relationship_types
+        self.arrays = arrays
+        self.version = version
+        self._node_numbers = {node_id: number for number, node_id in enumerate(node_ids)}
+
+    @classmethod
+    def from_edges(
+        cls,
+        node_ids: list[str],
+        edges: list[tuple[str, str, str]],
+        version: str | None = None,
+    ) -> "AdjacencySnapshot":
+        """Build a snapshot from `(source id, relationship type, target id)` edges."""
+        node_ids = list(dict.fromkeys([*node_ids, *(e[0] for e in edges), *(e[2] for e in edges)]))
+        node_numbers = {node_id: number for number, node_id in enumerate(node_ids)}
+        relationship_types = sorted({edge[1] for edge in edges})
+        type_numbers = {rel_type: number for number, rel_type in enumerate(relationship_types)}
+
+        sources = np.array([node_numbers[e[0]] for e in edges], dtype=np.int64)
+        targets = np.array([node_numbers[e[2]] for e in edges], dtype=np.int64)
+        types = np.array([type_numbers[e[1]] for e in edges], dtype=np.int64)
+
+        arrays = {}
+        arrays["out_indptr"], arrays["out_indices"], arrays["out_types"] = _csr(sources, targets, types, len(node_ids))
+        arrays["in_indptr"], arrays["in_indices"], arrays["in_types"] = _csr(targets, sources, types, len(node_ids))
+        return cls(node_ids, relationship_types, arrays, version=version)
+
+    @classmethod
+    def from_graph(cls, neo4j_pool, version: str | None = None) -> "AdjacencySnapshot":
+        """Export the snapshot of the graph behind a connection pool."""
+        node_ids = [el["id"] for el in neo4j_pool.query(EXPORT_ENTITY_IDS_QUERY) if el["id"]]
+        edges = [
+            (el["source"], el["type"], el["target"])
+            for el in neo4j_pool.query(EXPORT_RELATIONSHIPS_QUERY)
+            if el["source"] and el["target"]
+        ]
+        return cls.from_edges(node_ids, edges, version=version)
+
+    def save(self, path: str | Path) -> Path:
+        """Write the snapshot to a new directory below `path` and publish it.
+
+        Returns:
+            Path: The directory of the snapshot
+        """
+        directory = new_export_directory(path, self.version)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", self.arrays[name])
+        # meta.json is written last, a snapshot is complete once it exists
+        (directory / "meta.json").write_text(
+            json.dumps(
+                {
+                    "version": self.version,
+                    "node_ids": self.node_ids,
+                    "relationship_types": self.relationship_types,
+                }
+            )
+        )
+        publish_export_directory(path, directory)
+        return directory
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> "AdjacencySnapshot":
+        """Load the published snapshot, the arrays are memory-mapped read-only by default."""
+        directory = current_export_directory(path, "meta.json")
+        if directory is None:
+            raise FileNotFoundError(f"No adjacency snapshot at {path}")
+        meta = json.loads((directory / "meta.json").read_text())
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode="r" if mmap else None)
+            for name in cls.ARRAYS
+        }
+        return cls(meta["node_ids"], meta["relationship_types"], arrays, version=meta["version"])
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def _edges(self, number: int, direction: str):
+        indptr = self.arrays[f"{direction}_indptr"]
+        start, end = indptr[number], indptr[number + 1]
+        return zip(
+            self.arrays[f"{direction}_indices"][start:end].tolist(),
+            self.arrays[f"{direction}_types"][start:end].tolist(),
+        )
+
+    def _format(self, source: int, rel_type: int, target: int) -> str:
+        return f"{self.node_ids[source]} - {self.relationship_types[rel_type]} -> {self.node_ids[target]}"
+
+    def neighbors(self, entity_ids: list[str], hops: int = 1, limit: int = 20) -> list[str]:
+        """Relationships within `hops` of the given entities, formatted like `graph_search` rows.
+
+        Rows are distinct and at most `limit` are returned, closer relationships first.
+        """
+        frontier = [self._node_numbers[i] for i in entity_ids if i in self._node_numbers]
+        visited = set(frontier)
+        queue = deque((number, 0) for number in frontier)
+        outputs: dict[str, None] = {}
+        while queue and len(outputs) < limit:
+            number, depth = queue.popleft()
+            for direction in ("out", "in"):
+                for other, rel_type in self._edges(number, direction):
+                    if direction == "out":
+                        outputs[self._format(number, rel_type, other)] = None
+                    else:
+                        outputs[self._format(other, rel_type, number)] = None
+                    if depth + 1 < hops and other not in visited:
+                        visited.add(other)
+                        queue.append((other, depth + 1))
+        return list(outputs)[:limit]
+
+
+def load_adjacency_snapshot(path: str | Path) -> AdjacencySnapshot | None:
+    """Load the snapshot at `path`, None if there is none."""
+    if current_export_directory(path, "meta.json") is None:
+        return None
+    snapshot = AdjacencySnapshot.load(path)
+    logger.debug(f"***Log: load_adjacency_snapshot: {len(snapshot)} nodes, version {snapshot.version}")
+    return snapshot
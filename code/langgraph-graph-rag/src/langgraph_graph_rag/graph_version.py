@@ -0,0 +1,81 @@
+"""Version stamp of the knowledge graph.
+
+`create_knowledge_graph.py` writes a new stamp to a `__GraphVersion__` node after
+each ingestion. The runtime reads it to refresh in-process data derived from the
+graph (entity index, caches) when the graph was rebuilt.
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable
+
+import logging
+logger = logging.getLogger(__name__)
+
+READ_GRAPH_VERSION_QUERY = """
+OPTIONAL MATCH (v:__GraphVersion__ {id: 'current'})
+RETURN v.version AS version
+"""
+
+WRITE_GRAPH_VERSION_QUERY = """
+MERGE (v:__GraphVersion__ {id: 'current'})
+SET v.version = $version, v.updated_at = datetime()
+RETURN v.version AS version
+"""
+
+
+def new_graph_version() -> str:
+    return f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{uuid.uuid4().hex[:8]}"
+
+
+def read_graph_version(neo4j_pool) -> str | None:
+    """Read the current version stamp, None if the graph was never stamped."""
+    response = neo4j_pool.query(READ_GRAPH_VERSION_QUERY)
+    return response[0]["version"] if response else None
+
+
+def write_graph_version(neo4j_pool, version: str | None = None) -> str:
+    """Write a new version stamp, to be called after the graph was changed."""
+    version = version or new_graph_version()
+    neo4j_pool.query(WRITE_GRAPH_VERSION_QUERY, {"version": version})
+    return version
+
+
+class GraphVersionWatcher:
+    """Polls the graph version stamp and notifies subscribers when it changes.
+
+    Args:
+        neo4j_pool: The connection pool used to read the stamp
+        check_interval (float): Minimum seconds between two reads of the stamp
+    """
+
+    def __init__(self, neo4j_pool, check_interval: float = 30.0) -> None:
+        self.neo4j_pool = neo4j_pool
+        self.check_interval = check_interval
+        self.version: str | None = None
+        self._checked_at = float("-inf")
+        self._subscribers: list[Callable[[str | None], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[str | None], None]) -> None:
+        """Call `callback(new_version)` whenever the version changes."""
+        self._subscribers.append(callback)
+
+    def check(self, force: bool = False) -> str | None:
+        """Return the current version, reading the stamp if the check interval has passed."""
+        if not force and time.monotonic() - self._checked_at < self.check_interval:
+            return self.version
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.check_interval:
+                return self.version
+            version = read_graph_version(self.neo4j_pool)
+            self._checked_at = time.monotonic()
+            changed = version != self.version
+            self.version = version
+        if changed:
+            logger.debug(f"***Log: GraphVersionWatcher: graph version {version}")
+            for callback in self._subscribers:
+                callback(version)
+        return version
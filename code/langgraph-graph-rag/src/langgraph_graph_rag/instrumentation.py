@@ -0,0 +1,346 @@
+"""Per-node latency and token instrumentation of the agent graph.
+
+Every instrumented `GraphNodes` node records one observation per call into
+Prometheus-style histograms, labelled with the node name:
+
+    graph_node_latency_seconds         wall time of the node
+    graph_node_llm_calls               LLM calls made by the node
+    graph_node_prompt_tokens           prompt tokens reported by the LLM
+    graph_node_completion_tokens       completion tokens reported by the LLM
+    graph_node_neo4j_queries           Neo4j queries sent through the connection pool
+    graph_node_neo4j_rows              rows returned by these queries
+    graph_node_context_bytes           bytes of the retrieved context or the prompt
+    graph_node_context_tokens_saved    tokens removed by the context budget
+
+The streaming entry points of `ai_service.py` add the time to the first answer
+token, labelled with the entry point:
+
+    ai_service_time_to_first_token_seconds
+
+The current node is kept in a context variable, so the LLM callback and the Neo4j
+pool add to the node that made the call, also for concurrent async requests. The
+registry renders the Prometheus text format; `MetricsFileExporter` writes it to a
+file in an interval and at exit, that works offline and in a deployment without a
+scrape endpoint.
+"""
+
+import asyncio
+import atexit
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+import logging
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+TOKEN_BUCKETS = (0, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+ROW_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500, 1000)
+BYTE_BUCKETS = (0, 256, 1024, 4096, 16384, 65536, 262144)
+
+
+class Histogram:
+    """Prometheus histogram with one label, `node` by default.
+
+    Args:
+        name (str): The metric name
+        description (str): The `# HELP` text
+        buckets (tuple): The upper bounds of the buckets, `+Inf` is added
+        label (str): The label name
+    """
+
+    def __init__(self, name: str, description: str, buckets: tuple, label: str = "node") -> None:
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.label = label
+        self._lock = threading.Lock()
+        self._series: dict[str, dict] = {}
+
+    def observe(self, node: str, value: float) -> None:
+        with self._lock:
+            series = self._series.setdefault(
+                node, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            )
+            for number, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][number] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                node: {"counts": list(series["counts"]), "sum": series["sum"], "count": series["count"]}
+                for node, series in self._series.items()
+            }
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for node, series in sorted(self.snapshot().items()):
+            label = f'{self.label}="{node}"'
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{label}}} {series["sum"]}')
+            lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return lines
+
+
+@dataclass
+class NodeRecord:
+    """The measurements of one node call."""
+
+    node: str
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    neo4j_queries: int = 0
+    neo4j_rows: int = 0
+    context_bytes: int = 0
+    context_tokens_saved: int = 0
+
+
+class MetricsRegistry:
+    """The histograms of the graph nodes."""
+
+    def __init__(self) -> None:
+        self.latency = Histogram("graph_node_latency_seconds", "Wall time of a graph node call", LATENCY_BUCKETS)
+        self.llm_calls = Histogram("graph_node_llm_calls", "LLM calls per graph node call", COUNT_BUCKETS)
+        self.prompt_tokens = Histogram("graph_node_prompt_tokens", "Prompt tokens per graph node call", TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(
+            "graph_node_completion_tokens", "Completion tokens per graph node call", TOKEN_BUCKETS
+        )
+        self.neo4j_queries = Histogram("graph_node_neo4j_queries", "Neo4j queries per graph node call", COUNT_BUCKETS)
+        self.neo4j_rows = Histogram("graph_node_neo4j_rows", "Neo4j rows per graph node call", ROW_BUCKETS)
+        self.context_bytes = Histogram(
+            "graph_node_context_bytes", "Retrieved context or prompt bytes per graph node call", BYTE_BUCKETS
+        )
+        self.context_tokens_saved = Histogram(
+            "graph_node_context_tokens_saved", "Context tokens removed by the token budget per graph node call", TOKEN_BUCKETS
+        )
+        self.time_to_first_token = Histogram(
+            "ai_service_time_to_first_token_seconds",
+            "Time from the request to the first streamed answer token",
+            LATENCY_BUCKETS,
+            label="entry_point",
+        )
+
+    @property
+    def histograms(self) -> list[Histogram]:
+        return [
+            self.latency,
+            self.llm_calls,
+            self.prompt_tokens,
+            self.completion_tokens,
+            self.neo4j_queries,
+            self.neo4j_rows,
+            self.context_bytes,
+            self.context_tokens_saved,
+        ]
+
+    def observe(self, record: NodeRecord, seconds: float) -> None:
+        self.latency.observe(record.node, seconds)
+        self.llm_calls.observe(record.node, record.llm_calls)
+        self.prompt_tokens.observe(record.node, record.prompt_tokens)
+        self.completion_tokens.observe(record.node, record.completion_tokens)
+        self.neo4j_queries.observe(record.node, record.neo4j_queries)
+        self.neo4j_rows.observe(record.node, record.neo4j_rows)
+        self.context_bytes.observe(record.node, record.context_bytes)
+        self.context_tokens_saved.observe(record.node, record.context_tokens_saved)
+
+    def render(self) -> str:
+        """The histograms in the Prometheus text exposition format."""
+        lines = []
+        for histogram in [*self.histograms, self.time_to_first_token]:
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, dict]:
+        """Calls and mean values per node, e.g. for benchmark reports."""
+        result: dict[str, dict] = {}
+        for histogram in self.histograms:
+            for node, series in histogram.snapshot().items():
+                mean = series["sum"] / series["count"] if series["count"] else 0.0
+                result.setdefault(node, {"calls": series["count"]})[histogram.name] = mean
+        return result
+
+    def time_to_first_token_summary(self) -> dict[str, dict]:
+        """Streamed requests and mean time to the first token per entry point."""
+        return {
+            entry_point: {
+                "requests": series["count"],
+                "mean_seconds": series["sum"] / series["count"] if series["count"] else 0.0,
+            }
+            for entry_point, series in self.time_to_first_token.snapshot().items()
+        }
+
+
+_registry = MetricsRegistry()
+_current_record: ContextVar[NodeRecord | None] = ContextVar("graph_node_record", default=None)
+_enabled = True
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+def set_metrics_enabled(enabled: bool) -> None:
+    """Switch the node measurements on or off, `METRICS` of the runtime configuration."""
+    global _enabled
+    _enabled = enabled
+
+
+def current_node_record() -> NodeRecord | None:
+    """The record of the node running in the current context, None outside of a node."""
+    return _current_record.get()
+
+
+def record_neo4j_query(rows: int) -> None:
+    if (record := _current_record.get()) is not None:
+        record.neo4j_queries += 1
+        record.neo4j_rows += rows
+
+
+def record_time_to_first_token(entry_point: str, seconds: float) -> None:
+    if _enabled:
+        _registry.time_to_first_token.observe(entry_point, seconds)
+
+
+def record_context_tokens_saved(tokens: int) -> None:
+    if (record := _current_record.get()) is not None:
+        record.context_tokens_saved += tokens
+
+
+def record_context_bytes(text: str) -> None:
+    if (record := _current_record.get()) is not None:
+        record.context_bytes += len(text.encode("utf-8"))
+
+
+@contextmanager
+def node_span(node: str) -> Iterator[NodeRecord]:
+    """Measure a node call, the record is observed when the block exits."""
+    record = NodeRecord(node=node)
+    if not _enabled:
+        yield record
+        return
+    token = _current_record.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        _current_record.reset(token)
+        _registry.observe(record, time.perf_counter() - start)
+
+
+def instrument_node(node: str) -> Callable:
+    """Decorator of a sync or async node method, records one observation per call."""
+
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with node_span(node):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with node_span(node):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    """Adds the LLM calls and the token usage of a response to the current node record."""
+
+    # Runs in the context of the caller, also for async calls, so the node record is found
+    run_inline = True
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        if (record := _current_record.get()) is None:
+            return
+        record.llm_calls += 1
+        prompt_tokens, completion_tokens = 0, 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+        record.prompt_tokens += prompt_tokens
+        record.completion_tokens += completion_tokens
+
+
+class MetricsFileExporter:
+    """Writes the Prometheus text format of the registry to a file in an interval and at exit.
+
+    Args:
+        path (str): The metrics file, replaced atomically on every write
+        interval (float): Seconds between two writes
+        registry (MetricsRegistry | None): The registry, the process wide registry by default
+    """
+
+    def __init__(self, path: str, interval: float = 15.0, registry: MetricsRegistry | None = None) -> None:
+        self.path = path
+        self.interval = interval
+        self.registry = registry or _registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics_file_exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def export(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(self.registry.render())
+        os.replace(tmp_path, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except OSError as e:
+                logger.warning(f"***Log: MetricsFileExporter: writing {self.path} failed: {e}")
+
+    def close(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.interval)
+        self.export()
+
+
+_file_exporter: MetricsFileExporter | None = None
+_file_exporter_lock = threading.Lock()
+
+
+def start_metrics_file_exporter(path: str, interval: float = 15.0) -> MetricsFileExporter:
+    """Start the process wide file exporter, once."""
+    global _file_exporter
+    with _file_exporter_lock:
+        if _file_exporter is None:
+            _file_exporter = MetricsFileExporter(path, interval=interval)
+            logger.debug(f"***Log: start_metrics_file_exporter: {path} every {interval}s")
+        return _file_exporter
@@ -0,0 +1,235 @@
+"""In-process hybrid retriever over an exported copy of the `Document` embeddings.
+
+`create_knowledge_graph.py` exports the `Document` nodes into a directory:
+
+    embeddings.npy                 float32 matrix, one unit-length row per document
+    documents.json                 graph version stamp, document ids and texts
+    ivf_centroids.npy, ivf_indptr.npy, ivf_indices.npy   optional inverted file (IVF) index
+
+Like the adjacency snapshot, each export is written to a new versioned directory
+and published with `export_directory.publish_export_directory`.
+
+`LocalHybridRetriever` memory-maps the matrix and answers `similarity_search` like
+the hybrid `Neo4jVector` retriever: the top-k vector scores (`(1 + cosine) / 2`,
+the Neo4j cosine score) and the top-k BM25 keyword scores are each divided by
+their maximum, a document keeps the larger of its two scores.
+"""
+
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_neo4j.vectorstores.neo4j_vector import remove_lucene_chars
+
+from .embedding_cache import CachedEmbeddings
+from .export_directory import current_export_directory, new_export_directory, publish_export_directory
+from .text_utils import STOP_WORDS
+
+import logging
+logger = logging.getLogger(__name__)
+
+EXPORT_DOCUMENTS_QUERY = """
+MATCH (d:Document) WHERE d.embedding IS NOT NULL
+RETURN d.id AS id, d.text AS text, d.embedding AS embedding
+ORDER BY d.id
+"""
+
+
+def _tokens(text: str) -> list[str]:
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOP_WORDS]
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def build_ivf(matrix: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0) -> dict[str, np.ndarray]:
+    """Spherical k-means of the unit rows, the lists hold the row numbers per centroid."""
+    rng = np.random.default_rng(seed)
+    n_lists = min(n_lists, len(matrix))
+    centroids = matrix[rng.choice(len(matrix), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(matrix @ centroids.T, axis=1)
+        for number in range(n_lists):
+            members = matrix[assignments == number]
+            if len(members):
+                centroids[number] = members.sum(axis=0)
+        centroids = _unit_rows(centroids)
+    assignments = np.argmax(matrix @ centroids.T, axis=1)
+    order = np.argsort(assignments, kind="stable")
+    indptr = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignments, minlength=n_lists), out=indptr[1:])
+    return {
+        "ivf_centroids": centroids.astype(np.float32),
+        "ivf_indptr": indptr,
+        "ivf_indices": order.astype(np.int32),
+    }
+
+
+def export_document_embeddings(neo4j_pool, path: str | Path, version: str | None, ivf_lists: int = 0) -> int:
+    """Export the embedded `Document` nodes for the local retriever.
+
+    Args:
+        neo4j_pool (Neo4jConnectionPool): The connection pool of the graph database
+        path (str | Path): The export path, the export is published in a new directory below it
+        version (str | None): The graph version stamp of the export
+        ivf_lists (int): Number of IVF lists, 0 exports no IVF index
+
+    Returns:
+        int: The number of exported documents
+    """
+    response = neo4j_pool.query(EXPORT_DOCUMENTS_QUERY)
+    directory = new_export_directory(path, version)
+    matrix = _unit_rows(np.array([el["embedding"] for el in response], dtype=np.float32).reshape(len(response), -1))
+    np.save(directory / "embeddings.npy", matrix)
+    if ivf_lists and len(matrix):
+        for name, array in build_ivf(matrix, ivf_lists).items():
+            np.save(directory / f"{name}.npy", array)
+    # documents.json is written last, an export is complete once it exists
+    (directory / "documents.json").write_text(
+        json.dumps(
+            {
+                "version": version,
+                "ids": [el["id"] for el in response],
+                "texts": [el["text"] for el in response],
+            }
+        )
+    )
+    publish_export_directory(path, directory)
+    return len(response)
+
+
+class BM25Index:
+    """Okapi BM25 over the document texts, with the Lucene defaults k1=1.2 and b=0.75."""
+
+    def __init__(self, texts: list[str], k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        lengths = []
+        for number, text in enumerate(texts):
+            tokens = _tokens(text)
+            lengths.append(len(tokens))
+            for token, frequency in Counter(tokens).items():
+                self._postings.setdefault(token, []).append((number, frequency))
+        self._lengths = np.array(lengths, dtype=np.float32)
+        self._average_length = float(self._lengths.mean()) if len(lengths) else 0.0
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self._lengths), dtype=np.float32)
+        count = len(self._lengths)
+        for token in set(_tokens(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            numbers = np.array([number for number, _ in postings])
+            frequencies = np.array([frequency for _, frequency in postings], dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[numbers] / self._average_length)
+            scores[numbers] += idf * frequencies / (frequencies + norm)
+        return scores
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row numbers of the `k` largest positive scores, best first."""
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class LocalHybridRetriever:
+    """Hybrid vector and keyword search over a memory-mapped embedding export.
+
+    Args:
+        path (str | Path): The export path of `export_document_embeddings`
+        embedding (Embeddings): The embedding model of the questions
+        nprobe (int): IVF lists searched per question, 0 searches all documents exactly
+    """
+
+    def __init__(self, path: str | Path, embedding: Embeddings, nprobe: int = 0) -> None:
+        directory = current_export_directory(path, "documents.json")
+        if directory is None:
+            raise FileNotFoundError(f"No document embedding export at {path}")
+        meta = json.loads((directory / "documents.json").read_text())
+        self.version = meta["version"]
+        self.ids = meta["ids"]
+        self.texts = meta["texts"]
+        self.embedding = embedding
+        self.matrix = np.load(directory / "embeddings.npy", mmap_mode="r")
+        self.ivf = None
+        if nprobe and (directory / "ivf_centroids.npy").exists():
+            self.ivf = {
+                name: np.load(directory / f"{name}.npy", mmap_mode="r")
+                for name in ("ivf_centroids", "ivf_indptr", "ivf_indices")
+            }
+        self.nprobe = nprobe
+        self.bm25 = BM25Index(self.texts)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _vector_scores(self, query_vectors: np.ndarray) -> np.ndarray:
+        """Neo4j cosine scores of every document for a batch of questions, 0 where not searched."""
+        query_vectors = _unit_rows(np.asarray(query_vectors, dtype=np.float32))
+        if self.ivf is None:
+            return (1 + query_vectors @ self.matrix.T) / 2
+        scores = np.zeros((len(query_vectors), len(self)), dtype=np.float32)
+        probes = np.argsort(-(query_vectors @ self.ivf["ivf_centroids"].T), axis=1)[:, :self.nprobe]
+        indptr, indices = self.ivf["ivf_indptr"], self.ivf["ivf_indices"]
+        for row, lists in enumerate(probes):
+            rows = np.concatenate([indices[indptr[number]:indptr[number + 1]] for number in lists])
+            scores[row, rows] = (1 + self.matrix[rows] @ query_vectors[row]) / 2
+        return scores
+
+    def _fuse(self, vector_scores: np.ndarray, query: str, k: int) -> list[Document]:
+        fused: dict[int, float] = {}
+        for scores in (vector_scores, self.bm25.scores(remove_lucene_chars(query))):
+            top = _top_k(scores, k)
+            if len(top):
+                max_score = scores[top[0]]
+                for number in top.tolist():
+                    fused[number] = max(fused.get(number, 0.0), float(scores[number] / max_score))
+        ranked = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [
+            Document(page_content=self.texts[number], metadata={"id": self.ids[number], "score": score})
+            for number, score in ranked
+        ]
+
+    def similarity_search(self, query: str, k: int = 4) -> list[Document]:
+        return self.similarity_search_batch([query], k=k)[0]
+
+    async def asimilarity_search(self, query: str, k: int = 4) -> list[Document]:
+        query_vector = await self.embedding.aembed_query(query)
+        if not len(self):
+            return []
+        return self._fuse(self._vector_scores(np.array([query_vector], dtype=np.float32))[0], query, k)
+
+    def similarity_search_batch(self, queries: list[str], k: int = 4) -> list[list[Document]]:
+        """Search many questions with one embedding call and one matrix product."""
+        if not len(self):
+            return [[] for _ in queries]
+        if isinstance(self.embedding, CachedEmbeddings):
+            # Cached questions are not embedded again, the others in one call
+            query_vectors = self.embedding.embed_queries(queries)
+        else:
+            query_vectors = self.embedding.embed_documents(queries)
+        query_vectors = np.array(query_vectors, dtype=np.float32)
+        vector_scores = self._vector_scores(query_vectors)
+        return [self._fuse(scores, query, k) for scores, query in zip(vector_scores, queries)]
+
+
+def load_local_retriever(path: str | Path, embedding: Embeddings, nprobe: int = 0) -> LocalHybridRetriever | None:
+    """Load the local retriever of the export at `path`, None if there is none."""
+    if current_export_directory(path, "documents.json") is None:
+        return None
+    retriever = LocalHybridRetriever(path, embedding, nprobe=nprobe)
+    logger.debug(f"***Log: load_local_retriever: {len(retriever)} documents, version {retriever.version}")
+    return retriever
@@ -0,0 +1,306 @@
+"""Shared, bounded Neo4j connection pool.
+
+The runtime agent (`GraphNodes`) and the ingestion scripts use one driver per
+process instead of creating a new `Neo4jGraph` or driver for every use. The async
+nodes of the agent use an `AsyncDriver` with the same settings and bounds, one per
+event loop; `aclose_async_driver` closes the driver of a loop before the loop ends. The pool
+size, the connection acquisition timeout and the connection lifetime are configured
+with environment variables:
+
+    NEO4J_MAX_CONNECTION_POOL_SIZE          (default 50)
+    NEO4J_CONNECTION_ACQUISITION_TIMEOUT    in seconds (default 60)
+    NEO4J_MAX_CONNECTION_LIFETIME           in seconds (default 3600)
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from langchain_neo4j import Neo4jGraph
+from neo4j import AsyncGraphDatabase
+
+from .instrumentation import record_neo4j_query
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Seconds `close` waits for the async driver of a running event loop to close
+ASYNC_DRIVER_CLOSE_TIMEOUT = 10.0
+
+
+def pool_conf() -> dict:
+    return {
+        "NEO4J_URI": os.getenv("NEO4J_URI"),
+        "NEO4J_USERNAME": os.getenv("NEO4J_USERNAME"),
+        "NEO4J_PASSWORD": os.getenv("NEO4J_PASSWORD"),
+        "NEO4J_DATABASE": os.getenv("NEO4J_DATABASE"),
+        "NEO4J_MAX_CONNECTION_POOL_SIZE": int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "50")),
+        "NEO4J_CONNECTION_ACQUISITION_TIMEOUT": float(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "60")),
+        "NEO4J_MAX_CONNECTION_LIFETIME": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+    }
+
+
+class Neo4jPoolTimeoutError(TimeoutError):
+    """Raised when no connection becomes available within the acquisition timeout."""
+
+
+class Neo4jConnectionPool:
+    """One pool-managed Neo4j driver, shared by all users of a process.
+
+    The driver is owned by a `Neo4jGraph`, so it can be handed to LangChain
+    components (`Neo4jVector`, `add_graph_documents`) as well as used for raw
+    sessions. Work that goes through `query`, `session` or `acquire` is bounded to
+    `max_connection_pool_size` concurrent users and accounted in `stats`; a LangChain
+    component built from `graph` shares the driver and its connection limit, its
+    calls are wrapped in `acquire` to be bounded and accounted as well.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        username: str,
+        password: str,
+        database: str | None = None,
+        max_connection_pool_size: int = 50,
+        connection_acquisition_timeout: float = 60.0,
+        max_connection_lifetime: float = 3600.0,
+    ) -> None:
+        self.url = url
+        self.database = database
+        self.max_connection_pool_size = max_connection_pool_size
+        self.connection_acquisition_timeout = connection_acquisition_timeout
+        self.max_connection_lifetime = max_connection_lifetime
+        self._auth = (username, password)
+        self._driver_config = {
+            "max_connection_pool_size": max_connection_pool_size,
+            "connection_acquisition_timeout": connection_acquisition_timeout,
+            "max_connection_lifetime": max_connection_lifetime,
+        }
+
+        self.graph = Neo4jGraph(
+            url=url,
+            username=username,
+            password=password,
+            database=database,
+            refresh_schema=False,
+            driver_config=self._driver_config,
+        )
+
+        # Async driver and bound per event loop, both belong to the loop they were created in
+        self._async_drivers: dict[asyncio.AbstractEventLoop, tuple[Any, asyncio.Semaphore]] = {}
+
+        self._slots = threading.BoundedSemaphore(max_connection_pool_size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._closed = False
+
+    @property
+    def driver(self):
+        """The underlying `neo4j.Driver`."""
+        return self.graph._driver
+
+    @contextmanager
+    def acquire(self) -> Iterator[None]:
+        """Hold one pooled connection slot, for work on the shared driver outside of `query`."""
+        if self._closed:
+            raise RuntimeError("The Neo4j connection pool has been closed")
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.connection_acquisition_timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise Neo4jPoolTimeoutError(
+                f"No Neo4j connection available within {self.connection_acquisition_timeout}s"
+            )
+        self._account_acquired(time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _account_acquired(self, wait_time: float) -> None:
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+            self._wait_time_total += wait_time
+            self._wait_time_max = max(self._wait_time_max, wait_time)
+
+    def query(self, query: str, params: dict | None = None) -> list[dict[str, Any]]:
+        """Run a Cypher query with a pooled connection."""
+        with self.acquire():
+            response = self.graph.query(query, params or {})
+        record_neo4j_query(len(response))
+        return response
+
+    @contextmanager
+    def session(self, **kwargs: Any) -> Iterator[Any]:
+        """Open a driver session with a pooled connection."""
+        kwargs.setdefault("database", self.database)
+        with self.acquire():
+            with self.driver.session(**kwargs) as session:
+                yield session
+
+    def _async_driver_and_slots(self) -> tuple[Any, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_drivers:
+                # Drivers of closed loops can not be used or closed anymore, only dropped
+                for closed_loop in [other for other in self._async_drivers if other.is_closed()]:
+                    del self._async_drivers[closed_loop]
+                    logger.warning(
+                        "***Log: Neo4jConnectionPool: the async driver of a closed event loop was dropped "
+                        "without closing it, call `aclose_async_driver` before the loop ends"
+                    )
+                self._async_drivers[loop] = (
+                    AsyncGraphDatabase.driver(self.url, auth=self._auth, **self._driver_config),
+                    asyncio.Semaphore(self.max_connection_pool_size),
+                )
+            return self._async_drivers[loop]
+
+    def async_driver(self):
+        """The `neo4j.AsyncDriver` of the running event loop, created on first use."""
+        return self._async_driver_and_slots()[0]
+
+    async def aclose_async_driver(self) -> None:
+        """Close the async driver of the running event loop, a later `aquery` creates a new one."""
+        with self._lock:
+            entry = self._async_drivers.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].close()
+
+    async def aquery(self, query: str, params: dict | None = None) -> list[dict[str, Any]]:
+        """Run a Cypher query with the async driver, bounded like `query`."""
+        if self._closed:
+            raise RuntimeError("The Neo4j connection pool has been closed")
+        # The bound of the loop is kept for the release, also if the driver is replaced meanwhile
+        driver, slots = self._async_driver_and_slots()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.connection_acquisition_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise Neo4jPoolTimeoutError(
+                f"No Neo4j connection available within {self.connection_acquisition_timeout}s"
+            )
+        self._account_acquired(time.perf_counter() - start)
+        try:
+            async with driver.session(database=self.database) as session:
+                result = await session.run(query, params or {})
+                response = await result.data()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            slots.release()
+        record_neo4j_query(len(response))
+        return response
+
+    def stats(self) -> dict:
+        """Pool statistics of the work that goes through the pool: connections in use and idle, acquisitions and wait time.
+
+        `idle` is the number of free slots of the bound, the sync and async users share it.
+        """
+        with self._lock:
+            return {
+                "max_size": self.max_connection_pool_size,
+                "in_use": self._in_use,
+                "idle": max(self.max_connection_pool_size - self._in_use, 0),
+                "acquired": self._acquired,
+                "timeouts": self._timeouts,
+                "wait_time_total_s": self._wait_time_total,
+                "wait_time_avg_s": self._wait_time_total / self._acquired if self._acquired else 0.0,
+                "wait_time_max_s": self._wait_time_max,
+            }
+
+    def close(self) -> None:
+        """Close the driver and all pooled connections."""
+        if self._closed:
+            return
+        self._closed = True
+        logger.debug(f"***Log: Neo4jConnectionPool.close: {self.stats()}")
+        self.graph.close()
+        with self._lock:
+            async_drivers, self._async_drivers = self._async_drivers, {}
+        for loop, (driver, _) in async_drivers.items():
+            # An async driver can only be closed by its own event loop
+            if loop.is_closed():
+                logger.warning("***Log: Neo4jConnectionPool.close: the event loop of an async driver is closed, the driver is dropped")
+            elif not loop.is_running():
+                loop.run_until_complete(driver.close())
+            elif _running_loop() is loop:
+                # Called from a coroutine of that loop, blocking would deadlock it
+                loop.create_task(driver.close())
+                logger.warning("***Log: Neo4jConnectionPool.close: called in the event loop of an async driver, use `aclose_async_driver` to wait for it")
+            else:
+                future = asyncio.run_coroutine_threadsafe(driver.close(), loop)
+                try:
+                    future.result(timeout=ASYNC_DRIVER_CLOSE_TIMEOUT)
+                except TimeoutError:
+                    future.cancel()
+                    logger.warning(f"***Log: Neo4jConnectionPool.close: an async driver did not close within {ASYNC_DRIVER_CLOSE_TIMEOUT}s")
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+_shared_pool: Neo4jConnectionPool | None = None
+_shared_pool_lock = threading.Lock()
+
+
+def neo4j_configured() -> bool:
+    conf = pool_conf()
+    return bool(conf["NEO4J_URI"] and conf["NEO4J_USERNAME"] and conf["NEO4J_PASSWORD"])
+
+
+def get_neo4j_pool() -> Neo4jConnectionPool:
+    """Get the process wide connection pool, created from env variables on first use."""
+    global _shared_pool
+    if _shared_pool is None:
+        with _shared_pool_lock:
+            if _shared_pool is None:
+                conf = pool_conf()
+                if not neo4j_configured():
+                    raise ValueError(
+                        "Neo4j is not configured, please set NEO4J_URI, NEO4J_USERNAME and NEO4J_PASSWORD"
+                    )
+                _shared_pool = Neo4jConnectionPool(
+                    url=conf["NEO4J_URI"],
+                    username=conf["NEO4J_USERNAME"],
+                    password=conf["NEO4J_PASSWORD"],
+                    database=conf["NEO4J_DATABASE"],
+                    max_connection_pool_size=conf["NEO4J_MAX_CONNECTION_POOL_SIZE"],
+                    connection_acquisition_timeout=conf["NEO4J_CONNECTION_ACQUISITION_TIMEOUT"],
+                    max_connection_lifetime=conf["NEO4J_MAX_CONNECTION_LIFETIME"],
+                )
+    return _shared_pool
+
+
+async def aclose_neo4j_async_driver() -> None:
+    """Close the async driver of the running event loop in the process wide pool, if there is one."""
+    if _shared_pool is not None:
+        await _shared_pool.aclose_async_driver()
+
+
+def close_neo4j_pool() -> None:
+    """Close the process wide connection pool, if it was created."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.close()
+            _shared_pool = None
+
+
+atexit.register(close_neo4j_pool)
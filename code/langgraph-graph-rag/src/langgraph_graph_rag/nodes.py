@@ -1,74 +1,159 @@
-from typing import Annotated, Sequence, List, Literal
+import asyncio
+import json
+import re
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Annotated, Awaitable, Callable, Sequence, List, Literal
 from typing_extensions import TypedDict
 from langgraph.graph.message import add_messages
 from langchain_ibm import ChatWatsonx, WatsonxEmbeddings
-from langchain_neo4j import Neo4jGraph, Neo4jVector
+from langchain_neo4j import Neo4jVector
 from langchain_neo4j.vectorstores.neo4j_vector import remove_lucene_chars
 
 from langchain_core.messages import (
+    AIMessage,
     BaseMessage,
     SystemMessage,
     HumanMessage,
+    RemoveMessage,
     ToolMessage,
 )
 
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
 from ibm_watsonx_ai import APIClient
 from pydantic import BaseModel, Field
 
-import logging
-logger = logging.getLogger(__name__)
-#logging.basicConfig(filename='example.log', encoding='utf-8', level=logging.DEBUG)
-logging.basicConfig(encoding='utf-8', level=logging.DEBUG)
+from .cache import LRUTTLCache, SemanticCache, normalize_question
+from .context_budget import ContextAssembler, parse_token_budgets
+from .conversation_memory import SUMMARY_PROMPT, plan_compaction, transcript
+from .embedding_cache import CachedEmbeddings
+from .entity_index import EntityIndex
+from .graph_version import GraphVersionWatcher
+from .instrumentation import (
+    TokenUsageCallbackHandler,
+    instrument_node,
+    record_context_bytes,
+    record_context_tokens_saved,
+    record_neo4j_query,
+    set_metrics_enabled,
+    start_metrics_file_exporter,
+)
+from .neo4j_pool import get_neo4j_pool
+from .runtime_context import get_runtime_context, get_timestamp
+from .speculation import SpeculationStats
 
-# Local configuration for secrets
-from dotenv import load_dotenv
-import os
-from datetime import datetime
+if TYPE_CHECKING:
+    # numpy backed, imported when a snapshot or an embedding export is loaded
+    from .graph_snapshot import AdjacencySnapshot
+    from .local_retriever import LocalHybridRetriever
 
-enviornment_path="../../.env"
-load_dotenv(dotenv_path= enviornment_path)
+import logging
+logger = logging.getLogger(__name__)
 
-filename = os.getenv('NEO4J_URI')
-log_path = os.getenv('FILENAME_AGENT_LOG_OUTPUT')
+def save_runtime_log(message, *args):
+    """Queue a runtime log entry, `message % args` is formatted by the background writer."""
+    get_runtime_context().log(message, *args)
+    return
 
+def graph_conf():
+    config = get_runtime_context().config
+    return {
+        "NEO4J_URI" : config['NEO4J_URI'],
+        "NEO4J_USERNAME" : config['NEO4J_USERNAME'],
+        "NEO4J_PASSWORD" : config['NEO4J_PASSWORD'],
+        "NEO4J_DATABASE" : config['NEO4J_DATABASE']
+    }
 
-def get_timestamp():
-    now = datetime.now()
-    timestamp = now.strftime("%Y-%m-%d_%H-%M-%S")
-    return timestamp
+# Prompt of the entity extraction chain
+ENTITY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        {
+            "role": "system",
+            "content": (
+                "You are a helpful assistant who specializes "
+                "in extracting entities such as people, organizations, or companies from user text. "
+            ),
+        },
+        {
+            "role": "user",
+            "content": "Use a given format to extract information from the user input: {question}",
+        },
+    ]
+)
 
-timestamp = get_timestamp()
+# Ids of all entities of the knowledge graph
+ENTITY_IDS_QUERY = """
+MATCH (e:__Entity__) RETURN e.id AS id
+"""
 
-# Create log file for the agent run
-print(f"***Log {get_timestamp()}: Creating runtime log file for agent execution {log_path}")
-filename_output=f"{log_path}/log_agent_execution_{timestamp}.txt"  
-with open(filename_output, 'w') as file:       
-        file.write(f"************ LangGraph Node - Log experiment agent run {timestamp} **********\n")
-        file.close()
+# Neighbors of the (fuzzy) full-text matches of one entity
+ENTITY_NEIGHBORS_QUERY = """
+CALL db.index.fulltext.queryNodes('entity', $query, {limit:2})
+    YIELD node,score
+    CALL (node) {
+      MATCH (node)-[r:!MENTIONS]->(neighbor)
+      RETURN node.id + ' - ' + type(r) + ' -> ' + neighbor.id AS output
+      UNION
+      MATCH (node)<-[r:!MENTIONS]-(neighbor)
+      RETURN neighbor.id + ' - ' + type(r) + ' -> ' +  node.id AS output
+    }
+    RETURN output LIMIT 20
+"""
 
-def save_runtime_log(filename, message):
-    with open(filename, 'a') as file:       
-        file.write(f"************ LangGraph Node - Log current time {get_timestamp()} **********\n")
-        file.write(f"{message}\n\n")
-        file.close()
-    return
+# Neighbors of entities resolved to ids by the in-process entity index, one round-trip
+ENTITY_ID_NEIGHBORS_QUERY = """
+UNWIND $entities AS entity
+CALL (entity) {
+    MATCH (node:__Entity__) WHERE node.id IN entity.ids
+    CALL (node) {
+      MATCH (node)-[r:!MENTIONS]->(neighbor)
+      RETURN node.id + ' - ' + type(r) + ' -> ' + neighbor.id AS output
+      UNION
+      MATCH (node)<-[r:!MENTIONS]-(neighbor)
+      RETURN neighbor.id + ' - ' + type(r) + ' -> ' +  node.id AS output
+    }
+    WITH DISTINCT output
+    LIMIT 20
+    RETURN collect(output) AS outputs
+}
+RETURN entity.entity AS entity, outputs
+"""
 
-def graph_conf():
-    return {
-        "NEO4J_URI" : os.getenv('NEO4J_URI'),
-        "NEO4J_USERNAME" : os.getenv('NEO4J_USERNAME'),
-        "NEO4J_PASSWORD" : os.getenv('NEO4J_PASSWORD'),
-        "NEO4J_DATABASE" : os.getenv('NEO4J_DATABASE')
+# Neighbors of all entities in one round-trip, distinct rows and at most 20 per entity
+BATCHED_ENTITY_NEIGHBORS_QUERY = """
+UNWIND $queries AS entity_query
+CALL (entity_query) {
+    CALL db.index.fulltext.queryNodes('entity', entity_query.query, {limit:2})
+    YIELD node,score
+    CALL (node) {
+      MATCH (node)-[r:!MENTIONS]->(neighbor)
+      RETURN node.id + ' - ' + type(r) + ' -> ' + neighbor.id AS output
+      UNION
+      MATCH (node)<-[r:!MENTIONS]-(neighbor)
+      RETURN neighbor.id + ' - ' + type(r) + ' -> ' +  node.id AS output
     }
+    WITH DISTINCT output
+    LIMIT 20
+    RETURN collect(output) AS outputs
+}
+RETURN entity_query.entity AS entity, outputs
+"""
 
 class AgentState(TypedDict):
     # The add_messages function defines how an update should be processed
     question: str
     structured_data: str
+    # Entities searched in the graph, reported by the progress events of `generate_stream`
+    entities: List[str]
     unstructured_data: List[str]
     messages: Annotated[Sequence[BaseMessage], add_messages]
     route: Literal["graph_knowledge_base", "final_answer"]
+    # The agent node already retrieved the context, the retrieval nodes are skipped
+    speculated: bool
+    # Summary of the turns evicted by `compact_history`, kept by the checkpointer
+    summary: str
 
 
 # Extract entities from text
@@ -82,6 +167,15 @@ class Entities(BaseModel):
     )
 
 
+class Router(BaseModel):
+    route: Literal["graph_knowledge_base", "final_answer"] = Field(
+        description=(
+            "Literal type that can only take two values 'graph_knowledge_base' or 'final_answer'. "
+            "This field determines the path or the specific operation that the router will handle."
+        )
+    )
+
+
 class GraphNodes:
     def __init__(
         self,
@@ -92,35 +186,51 @@ class GraphNodes:
         service_manager_service_url: str,
         secret_id: str,
     ) -> None:
+        # Loads the env configuration, sets up logging and the runtime log on first use
+        self.runtime = get_runtime_context()
+        config = self.runtime.config
+        # Per-node histograms, the LLM calls and tokens are reported by a callback of the models
+        set_metrics_enabled(config["METRICS"])
+        callbacks = [TokenUsageCallbackHandler()] if config["METRICS"] else None
+        if config["METRICS"] and config["METRICS_EXPORT_PATH"]:
+            start_metrics_file_exporter(config["METRICS_EXPORT_PATH"], interval=config["METRICS_EXPORT_INTERVAL"])
         self.api_client = api_client
-        self.llm = ChatWatsonx(model_id=model_id, watsonx_client=api_client)
+        self.llm = ChatWatsonx(model_id=model_id, watsonx_client=api_client, callbacks=callbacks)
         self.llm_no_stream = ChatWatsonx(
-            model_id=model_id, watsonx_client=api_client, streaming=False
+            model_id=model_id, watsonx_client=api_client, streaming=False, callbacks=callbacks
         )
         self.configured=False
 
         embedding_func = WatsonxEmbeddings(
             model_id=embedding_model_id, watsonx_client=api_client
         )
+        # The router cache and the vector retriever share the cached question embeddings
+        if config["EMBEDDING_CACHE"]:
+            embedding_func = CachedEmbeddings(
+                embedding_func,
+                model_id=embedding_model_id,
+                max_size=config["EMBEDDING_CACHE_MAX_SIZE"],
+                ttl=config["EMBEDDING_CACHE_TTL"],
+                path=config["EMBEDDING_CACHE_PATH"],
+            )
+        self.embedding_func = embedding_func
 
         # Neo4j
-        if os.getenv('NEO4J_URI') and os.getenv('NEO4J_USERNAME') and os.getenv('NEO4J_PASSWORD'):
+        neo4j_conf = graph_conf()
+        if neo4j_conf['NEO4J_URI'] and neo4j_conf['NEO4J_USERNAME'] and neo4j_conf['NEO4J_PASSWORD']:
             self.configured=True
             print(f"***Log {get_timestamp()}: Neo4j configured using env variables")
-            self.graph_url = os.getenv('NEO4J_URI')
-            self.graph_username = os.getenv('NEO4J_USERNAME')
-            self.graph_password = os.getenv('NEO4J_PASSWORD')
-            self.graph_database = os.getenv('NEO4J_DATABASE')
+            self.graph_url = neo4j_conf['NEO4J_URI']
+            self.graph_username = neo4j_conf['NEO4J_USERNAME']
+            self.graph_password = neo4j_conf['NEO4J_PASSWORD']
+            self.graph_database = neo4j_conf['NEO4J_DATABASE']
             print(f"***Log {get_timestamp()}: - url: {self.graph_url}")
             print(f"***Log {get_timestamp()}: - username: {self.graph_username}")
             #print(f"***Log {get_timestamp()}: - password: {self.graph_password}")
             print(f"***Log {get_timestamp()}: - database: {self.graph_database}")  
-            self.graph = Neo4jGraph(
-                    url=self.graph_url,
-                    username=self.graph_username,
-                    password=self.graph_password,
-                    database=self.graph_database,
-            )
+            # Shared and bounded driver, reused by all graph nodes of the process
+            self.neo4j_pool = get_neo4j_pool()
+            self.graph = self.neo4j_pool.graph
             self.vector_index = Neo4jVector.from_existing_index(
                     graph=self.graph,
                     embedding=embedding_func,
@@ -132,12 +242,92 @@ class GraphNodes:
             )
         else:
             self.vector_index = None
+            self.neo4j_pool = None
             self.graph = None
 
+        # Embedding similarity cache of the routing decisions
+        self.router_cache = None
+        if config["ROUTER_CACHE"]:
+            self.router_cache = SemanticCache(
+                embed=embedding_func.embed_query,
+                aembed=embedding_func.aembed_query,
+                threshold=config["ROUTER_CACHE_THRESHOLD"],
+                max_size=config["ROUTER_CACHE_MAX_SIZE"],
+                ttl=config["ROUTER_CACHE_TTL"],
+            )
+
+        # Entity extraction chain, built once, and its memoization by normalized question
+        self.entity_chain = ENTITY_PROMPT | self.llm.with_structured_output(Entities)
+        self.entity_cache = LRUTTLCache(
+            max_size=config["ENTITY_CACHE_MAX_SIZE"], ttl=config["ENTITY_CACHE_TTL"]
+        )
+        # Match the graph entity ids in the question before asking the LLM
+        self.entity_fast_path = config["ENTITY_FAST_PATH"]
+        self._entity_ids: list[str] | None = None
+
+        # Retrieved context per normalized question and graph version
+        self.retrieval_cache = None
+        if config["RETRIEVAL_CACHE"]:
+            self.retrieval_cache = LRUTTLCache(
+                max_size=config["RETRIEVAL_CACHE_MAX_SIZE"], ttl=config["RETRIEVAL_CACHE_TTL"]
+            )
+
+        # Retrieval started together with the router call, see `speculation.py`
+        self.speculative_retrieval = config["SPECULATIVE_RETRIEVAL"]
+        self.speculation_stats = SpeculationStats()
+        self.speculation_executor = None
+        if self.speculative_retrieval:
+            self.speculation_executor = ThreadPoolExecutor(
+                max_workers=config["SPECULATIVE_RETRIEVAL_MAX_WORKERS"], thread_name_prefix="speculative_retrieval"
+            )
+
+        # Deduplicated, ranked and trimmed context for the token budget of the model
+        self.context_assembler = None
+        if config["CONTEXT_BUDGET"]:
+            token_budget = parse_token_budgets(config["CONTEXT_TOKEN_BUDGETS"]).get(
+                model_id, config["CONTEXT_TOKEN_BUDGET"]
+            )
+            self.context_assembler = ContextAssembler(
+                token_budget=token_budget, structured_share=config["CONTEXT_STRUCTURED_SHARE"]
+            )
+
+        # Turns kept verbatim in the conversation state, the older ones are summarized
+        if config["CONVERSATION_MAX_TURNS"] < 1:
+            raise ValueError(
+                f"CONVERSATION_MAX_TURNS must be at least 1, the current turn is kept, got {config['CONVERSATION_MAX_TURNS']}"
+            )
+        self.conversation_max_turns = config["CONVERSATION_MAX_TURNS"]
+        self.conversation_summary = config["CONVERSATION_SUMMARY"]
+
+        # Send all entity lookups of a graph search in one round-trip
+        self.batch_entity_queries = config["GRAPH_SEARCH_BATCHED"]
+
+        # Graph version stamp, in-process data derived from the graph is refreshed when it changes
+        self.graph_version = None
+        self.entity_index = None
+        # Local adjacency snapshot, the neighbor expansion needs no round-trip while it is current
+        self.adjacency_snapshot: "AdjacencySnapshot | None" = None
+        self.graph_search_hops = config["GRAPH_SEARCH_HOPS"]
+        # VECTOR_BACKEND=local answers the hybrid search in process from the exported embeddings
+        self.local_retriever: "LocalHybridRetriever | None" = None
+        if self.neo4j_pool is not None:
+            self.graph_version = GraphVersionWatcher(
+                self.neo4j_pool, check_interval=config["GRAPH_VERSION_CHECK_INTERVAL"]
+            )
+            self.graph_version.check(force=True)
+            if config["ADJACENCY_SNAPSHOT_PATH"]:
+                self._load_adjacency_snapshot(self.graph_version.version)
+            if config["VECTOR_BACKEND"] == "local":
+                self._load_local_retriever(self.graph_version.version)
+            if config["ENTITY_INDEX"] or self.adjacency_snapshot is not None:
+                self._load_entity_index(self.graph_version.version)
+            self.graph_version.subscribe(self._on_graph_version_change)
+
         logger.debug(f"***Log: __init__ self.configured: {self.configured}")
         
         self.system_message = system_message
 
+    @instrument_node("agent")
     def agent(self, state: AgentState, knowledge_graph_description: str) -> dict:
         """
         Invokes the agent model to generate a response based on the current state. Given
@@ -150,15 +340,158 @@ class GraphNodes:
         Returns:
             dict: The updated state with the route
         """
+        user_query = state["messages"][-1].content
 
-        class Router(BaseModel):
-            route: Literal["graph_knowledge_base", "final_answer"] = Field(
-                description=(
-                    "Literal type that can only take two values 'graph_knowledge_base' or 'final_answer'. "
-                    "This field determines the path or the specific operation that the router will handle."
-                )
+        # Repeated (or very similar) questions reuse the cached routing decision
+        route, query_embedding = None, None
+        if self.router_cache is not None:
+            route, query_embedding = self.router_cache.lookup(user_query)
+            logger.debug(f"***Log: agent - router cache {'hit' if route else 'miss'}: {self.router_cache.stats()}")
+
+        if route is not None:
+            return self._route_update(user_query, self._cached_router_response(route))
+
+        speculation = self._start_speculation(user_query) if self.speculative_retrieval else None
+        llm_with_tool = self.llm_no_stream.bind_tools([Router], tool_choice="Router")
+        response = llm_with_tool.invoke(self._router_messages(user_query, knowledge_graph_description))
+        if self.router_cache is not None:
+            self.router_cache.store(
+                user_query, response.tool_calls[0]["args"]["route"], embedding=query_embedding
+            )
+        update_state = self._route_update(user_query, response)
+        if speculation is not None:
+            update_state |= self._finish_speculation(speculation, update_state["route"])
+        return update_state
+
+    @instrument_node("agent")
+    async def aagent(self, state: AgentState, knowledge_graph_description: str) -> dict:
+        """Async `agent` node, the embedding and the routing call do not block the event loop."""
+        user_query = state["messages"][-1].content
+
+        route, query_embedding = None, None
+        if self.router_cache is not None:
+            route, query_embedding = await self.router_cache.alookup(user_query)
+            logger.debug(f"***Log: aagent - router cache {'hit' if route else 'miss'}: {self.router_cache.stats()}")
+
+        if route is not None:
+            return self._route_update(user_query, self._cached_router_response(route))
+
+        speculation = self._astart_speculation(user_query) if self.speculative_retrieval else None
+        llm_with_tool = self.llm_no_stream.bind_tools([Router], tool_choice="Router")
+        try:
+            response = await llm_with_tool.ainvoke(self._router_messages(user_query, knowledge_graph_description))
+        except BaseException:
+            if speculation is not None:
+                await self._acancel_speculation(speculation)
+            raise
+        if self.router_cache is not None:
+            self.router_cache.store(
+                user_query, response.tool_calls[0]["args"]["route"], embedding=query_embedding
             )
+        update_state = self._route_update(user_query, response)
+        if speculation is not None:
+            update_state |= await self._afinish_speculation(speculation, update_state["route"])
+        return update_state
+
+    @staticmethod
+    def _timed(node: Callable[[dict], dict], state: dict) -> tuple[dict, float]:
+        start = time.perf_counter()
+        return node(state), time.perf_counter() - start
+
+    def _start_speculation(self, question: str) -> list[Future]:
+        """Submit the graph search and the vector retrieval of the question to the speculation threads."""
+        self.speculation_stats.record_start()
+        state = {"question": question}
+        return [
+            self.speculation_executor.submit(self._timed, node, state)
+            for node in (self.graph_search, self.unstructured_retriever)
+        ]
+
+    def _record_wasted_speculation(self, future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.speculation_stats.record_wasted(future.result()[1])
+
+    def _finish_speculation(self, speculation: list[Future], route: str) -> dict:
+        """Use the speculative retrieval for the knowledge graph route, discard it otherwise.
+
+        Returns:
+            dict: The state update with the retrieved context, empty if the retrieval nodes have to run
+        """
+        if route != "graph_knowledge_base":
+            self.speculation_stats.record_discarded()
+            for future in speculation:
+                # A running thread can not be stopped, its time is counted once it finished
+                if not future.cancel():
+                    future.add_done_callback(self._record_wasted_speculation)
+            logger.debug(f"***Log: agent - speculation discarded: {self.speculation_stats.stats()}")
+            return {}
+
+        wait_start = time.perf_counter()
+        try:
+            results = [future.result() for future in speculation]
+        except Exception as e:
+            logger.warning(f"***Log: agent - speculative retrieval failed ({e}), the retrieval nodes run")
+            return {}
+        return self._speculation_update(results, time.perf_counter() - wait_start)
+
+    def _astart_speculation(self, question: str) -> list[asyncio.Task]:
+        self.speculation_stats.record_start()
+        state = {"question": question}
+        return [
+            asyncio.create_task(self._atimed(node, state))
+            for node in (self.agraph_search, self.aunstructured_retriever)
+        ]
+
+    async def _atimed(self, node: Callable[[dict], Awaitable[dict]], state: dict) -> tuple[dict, float]:
+        start = time.perf_counter()
+        try:
+            return await node(state), time.perf_counter() - start
+        except asyncio.CancelledError:
+            self.speculation_stats.record_wasted(time.perf_counter() - start)
+            raise
+
+    async def _acancel_speculation(self, speculation: list[asyncio.Task]) -> None:
+        """Cancel the unfinished speculative tasks and wait until they released their connections."""
+        for task in speculation:
+            if task.done():
+                self._record_wasted_speculation(task)
+            else:
+                # `_atimed` counts the time of a cancelled task as wasted
+                task.cancel()
+        await asyncio.gather(*speculation, return_exceptions=True)
 
+    async def _afinish_speculation(self, speculation: list[asyncio.Task], route: str) -> dict:
+        """Async `_finish_speculation`, a discarded or failed speculation is cancelled."""
+        if route != "graph_knowledge_base":
+            self.speculation_stats.record_discarded()
+            await self._acancel_speculation(speculation)
+            logger.debug(f"***Log: aagent - speculation discarded: {self.speculation_stats.stats()}")
+            return {}
+
+        wait_start = time.perf_counter()
+        try:
+            results = await asyncio.gather(*speculation)
+        except Exception as e:
+            # The other task would keep its LLM or Neo4j call running after the failure
+            await self._acancel_speculation(speculation)
+            logger.warning(f"***Log: aagent - speculative retrieval failed ({e}), the retrieval nodes run")
+            return {}
+        except BaseException:
+            await self._acancel_speculation(speculation)
+            raise
+        return self._speculation_update(results, time.perf_counter() - wait_start)
+
+    def _speculation_update(self, results: list[tuple[dict, float]], wait_seconds: float) -> dict:
+        # The retrieval time that was not spent waiting after the router call is saved
+        retrieval_seconds = max(seconds for _, seconds in results)
+        self.speculation_stats.record_hit(retrieval_seconds - wait_seconds)
+        logger.debug(f"***Log: agent - speculation hit: {self.speculation_stats.stats()}")
+        update_state = {"speculated": True}
+        for result, _ in results:
+            update_state |= result
+        return update_state
+
+    def _router_messages(self, user_query: str, knowledge_graph_description: str) -> list[BaseMessage]:
         # Adding knowledge base description will increase the quality of model response
         system_message = SystemMessage(
             content=(
@@ -169,13 +502,13 @@ class GraphNodes:
                 "Otherwise, respond with 'final_answer'."
             )
         )
-        save_runtime_log(filename_output, f"***Log: Agent - system_message including `knowledge_graph_description`:\n{system_message.content}\n")
-        user_query = state["messages"][-1].content
-        human_message = HumanMessage(content=f"User query: {user_query}")
-        llm_with_tool = self.llm_no_stream.bind_tools([Router], tool_choice="Router")
-        response = llm_with_tool.invoke([system_message, human_message])
+        save_runtime_log("***Log: Agent - system_message including `knowledge_graph_description`:\n%s\n", system_message.content)
+        messages = [system_message, HumanMessage(content=f"User query: {user_query}")]
+        record_context_bytes("".join(str(message.content) for message in messages))
+        return messages
 
-        update_state = {"question": user_query}
+    def _route_update(self, user_query: str, response: AIMessage) -> dict:
+        update_state = {"question": user_query, "speculated": False}
         if response.tool_calls[0]["args"]["route"] == "graph_knowledge_base":
             response.response_metadata["finish_reason"] = "tool_calls"
             return update_state | {
@@ -185,28 +518,178 @@ class GraphNodes:
         else:
             return update_state | {"route": "final_answer"}
 
-    def _retrieve_entities(self, question: str) -> list[str]:
-        chat_prompt = ChatPromptTemplate.from_messages(
-            [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful assistant who specializes "
-                        "in extracting entities such as people, organizations, or companies from user text. "
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": "Use a given format to extract information from the user input: {question}",
-                },
-            ]
+    def _cached_router_response(self, route: str) -> AIMessage:
+        """Build the `Router` tool call message for a cached routing decision."""
+        tool_call_id = f"call_{uuid.uuid4().hex}"
+        arguments = {"route": route}
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": "Router", "args": arguments, "id": tool_call_id}],
+            additional_kwargs={
+                "tool_calls": [
+                    {
+                        "id": tool_call_id,
+                        "type": "function",
+                        "function": {"name": "Router", "arguments": json.dumps(arguments)},
+                    }
+                ]
+            },
         )
-        save_runtime_log(filename_output, f"***Log {get_timestamp()}: _retrieve_entities - question:\n{question}\n") 
-        save_runtime_log(filename_output, f"***Log {get_timestamp()}: _retrieve_entities - chat_prompt:\n{chat_prompt}\n")
-        
-        entity_chain = chat_prompt | self.llm.with_structured_output(Entities)
 
-        return entity_chain.invoke({"question": question}).names
+    def _load_entity_index(self, version: str | None) -> None:
+        """Load the in-process entity name index from the `__Entity__` ids of the graph."""
+        if self.adjacency_snapshot is not None:
+            entity_ids = self.adjacency_snapshot.node_ids
+        else:
+            entity_ids = [el["id"] for el in self.neo4j_pool.query(ENTITY_IDS_QUERY)]
+        self.entity_index = EntityIndex(entity_ids, version=version)
+        logger.debug(f"***Log: _load_entity_index: {len(self.entity_index)} entities, graph version {version}")
+
+    def _load_adjacency_snapshot(self, version: str | None) -> None:
+        """Memory-map the adjacency snapshot, it is only used if it matches the graph version."""
+        from .graph_snapshot import load_adjacency_snapshot
+
+        path = self.runtime.config["ADJACENCY_SNAPSHOT_PATH"]
+        snapshot = load_adjacency_snapshot(path)
+        if snapshot is not None and snapshot.version != version:
+            logger.warning(
+                f"***Log: _load_adjacency_snapshot: snapshot version {snapshot.version} does not match "
+                f"graph version {version}, graph_search queries Neo4j"
+            )
+            snapshot = None
+        elif snapshot is None:
+            logger.warning(f"***Log: _load_adjacency_snapshot: no snapshot at {path}, graph_search queries Neo4j")
+        self.adjacency_snapshot = snapshot
+
+    def _load_local_retriever(self, version: str | None) -> None:
+        """Memory-map the exported embeddings, they are only used if they match the graph version."""
+        from .local_retriever import load_local_retriever
+
+        path = self.runtime.config["LOCAL_VECTOR_INDEX_PATH"]
+        retriever = load_local_retriever(path, self.embedding_func, nprobe=self.runtime.config["LOCAL_VECTOR_NPROBE"])
+        if retriever is not None and retriever.version != version:
+            logger.warning(
+                f"***Log: _load_local_retriever: export version {retriever.version} does not match "
+                f"graph version {version}, unstructured_retriever queries Neo4j"
+            )
+            retriever = None
+        elif retriever is None:
+            logger.warning(f"***Log: _load_local_retriever: no export at {path}, unstructured_retriever queries Neo4j")
+        self.local_retriever = retriever
+
+    def _on_graph_version_change(self, version: str | None) -> None:
+        """The knowledge graph was rebuilt, drop the data derived from the previous graph."""
+        self._entity_ids = None
+        self.entity_cache.clear()
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.clear()
+        if self.runtime.config["ADJACENCY_SNAPSHOT_PATH"]:
+            self._load_adjacency_snapshot(version)
+        if self.runtime.config["VECTOR_BACKEND"] == "local":
+            self._load_local_retriever(version)
+        # Same condition as in __init__, the snapshot path needs the index
+        if self.runtime.config["ENTITY_INDEX"] or self.adjacency_snapshot is not None:
+            self._load_entity_index(version)
+        else:
+            self.entity_index = None
+
+    def _known_entity_ids(self) -> list[str]:
+        """The ids of the `__Entity__` nodes of the graph, loaded once."""
+        if self.entity_index is not None:
+            return self.entity_index.entity_ids
+        if self._entity_ids is None:
+            response = self.neo4j_pool.query(ENTITY_IDS_QUERY)
+            self._entity_ids = [el["id"] for el in response if el["id"]]
+        return self._entity_ids
+
+    async def _aknown_entity_ids(self) -> list[str]:
+        if self.entity_index is None and self._entity_ids is None:
+            response = await self.neo4j_pool.aquery(ENTITY_IDS_QUERY)
+            self._entity_ids = [el["id"] for el in response if el["id"]]
+        return self._known_entity_ids()
+
+    def _match_known_entities(self, question: str, entity_ids: list[str]) -> list[str]:
+        """Fast path: the graph entity ids that appear as whole words in the question."""
+        question_words = " " + " ".join(re.findall(r"\w+", question.lower())) + " "
+        matches = []
+        for entity_id in entity_ids:
+            entity_words = " ".join(re.findall(r"\w+", entity_id.lower()))
+            if len(entity_words) >= 3 and f" {entity_words} " in question_words:
+                matches.append(entity_id)
+        return matches
+
+    def _cached_entities(self, question: str) -> list[str] | None:
+        entities = self.entity_cache.get(normalize_question(question))
+        if entities is not None:
+            save_runtime_log("***Log: _retrieve_entities - cached entities for question:\n%s\n%s\n", question, entities)
+        return entities
+
+    def _fast_path_entities(self, question: str, entity_ids: list[str]) -> list[str]:
+        entities = self._match_known_entities(question, entity_ids)
+        if entities:
+            save_runtime_log("***Log: _retrieve_entities - known entities in question:\n%s\n%s\n", question, entities)
+            self.entity_cache.set(normalize_question(question), entities)
+        return entities
+
+    def _retrieve_entities(self, question: str) -> list[str]:
+        if (entities := self._cached_entities(question)) is not None:
+            return entities
+
+        if self.entity_fast_path and self.neo4j_pool is not None:
+            if entities := self._fast_path_entities(question, self._known_entity_ids()):
+                return entities
+
+        save_runtime_log("***Log: _retrieve_entities - question:\n%s\n", question) 
+        save_runtime_log("***Log: _retrieve_entities - chat_prompt:\n%s\n", ENTITY_PROMPT)
+
+        entities = self.entity_chain.invoke({"question": question}).names
+        self.entity_cache.set(normalize_question(question), entities)
+        return entities
+
+    async def _aretrieve_entities(self, question: str) -> list[str]:
+        if (entities := self._cached_entities(question)) is not None:
+            return entities
+
+        if self.entity_fast_path and self.neo4j_pool is not None:
+            if entities := self._fast_path_entities(question, await self._aknown_entity_ids()):
+                return entities
+
+        save_runtime_log("***Log: _aretrieve_entities - question:\n%s\n", question)
+        entities = (await self.entity_chain.ainvoke({"question": question})).names
+        self.entity_cache.set(normalize_question(question), entities)
+        return entities
+
+    def retrieve_entities_batch(self, questions: list[str]) -> list[list[str]]:
+        """Extract the entities of many questions, e.g. for offline evaluation runs.
+
+        Cached questions are answered from the cache, all others with one `batch()` call.
+
+        Args:
+            questions (list[str]): The user questions
+
+        Returns:
+            list[list[str]]: The entities per question, in the order of `questions`
+        """
+        results: list[list[str] | None] = []
+        missing: dict[str, str] = {}
+        for question in questions:
+            key = normalize_question(question)
+            entities = self.entity_cache.get(key)
+            results.append(entities)
+            if entities is None:
+                missing.setdefault(key, question)
+
+        if missing:
+            responses = self.entity_chain.batch(
+                [{"question": question} for question in missing.values()]
+            )
+            for key, response in zip(missing, responses):
+                self.entity_cache.set(key, response.names)
+
+        return [
+            entities if entities is not None else self.entity_cache.get(normalize_question(question), [])
+            for question, entities in zip(questions, results)
+        ]
 
     def _generate_full_text_query(self, input_text: str) -> str:
         """
@@ -220,12 +703,118 @@ class GraphNodes:
         """
         full_text_query = ""
         words = remove_lucene_chars(input_text).split()
+        if not words:
+            return full_text_query
         for word in words[:-1]:
             full_text_query += f" {word}~2 AND"
         full_text_query += f" {words[-1]}~2"
-        save_runtime_log(filename_output, f"***Log {get_timestamp()}: _generate_full_text_query - full_text_query:\n {full_text_query}")
+        save_runtime_log("***Log: _generate_full_text_query - full_text_query:\n %s", full_text_query)
         return full_text_query.strip()
 
+    def _snapshot_entity_neighbors(self, entities: list[str]) -> dict[str, list[str]]:
+        """Resolve the entities with the in-process index and expand them in the adjacency snapshot.
+
+        Args:
+            entities (list[str]): The entity names extracted from the question
+
+        Returns:
+            dict[str, list[str]]: The neighbor rows per entity
+        """
+        results = {}
+        for entity in entities:
+            ids = self.entity_index.search(entity, limit=2)
+            save_runtime_log("***Log: graph_search - %s resolved ids:\n%s", entity, ids)
+            if ids:
+                results[entity] = self.adjacency_snapshot.neighbors(
+                    ids, hops=self.graph_search_hops, limit=20
+                )
+        return results
+
+    def _retrieval_cache_key(self, kind: str, question: str) -> tuple | None:
+        """Cache key of a retrieval result, None if results are not cached."""
+        if self.retrieval_cache is None or self.graph_version is None:
+            return None
+        # A new graph version changes the key, the entries of older versions are cleared
+        return (kind, normalize_question(question), self.graph_version.version)
+
+    def _plan_graph_search(self, entities: list[str]) -> tuple[list[str], dict[str, list[str]], list[tuple]]:
+        """Resolve the entities of a graph search and the Cypher queries that are still needed.
+
+        Args:
+            entities (list[str]): The entity names extracted from the question
+
+        Returns:
+            tuple: The searched entities, the neighbor rows per entity known without a query
+                and the queries as `(entity, query, params)`, entity None for queries of all entities
+        """
+        if self.adjacency_snapshot is not None and self.entity_index is not None:
+            # Fuzzy matching and neighbor expansion in process, no database round-trip
+            searched_entities = list(dict.fromkeys(entities))
+            save_runtime_log("***Log: graph_search - adjacency snapshot, graph version %s", self.adjacency_snapshot.version)
+            return searched_entities, self._snapshot_entity_neighbors(searched_entities), []
+
+        if self.entity_index is not None:
+            # Fuzzy matching in process, Cypher only expands the neighbors by id
+            searched_entities = list(dict.fromkeys(entities))
+            resolved = []
+            for entity in searched_entities:
+                ids = self.entity_index.search(entity, limit=2)
+                save_runtime_log("***Log: graph_search - %s resolved ids:\n%s", entity, ids)
+                if ids:
+                    resolved.append({"entity": entity, "ids": ids})
+            if not resolved:
+                return searched_entities, {}, []
+            save_runtime_log("***Log: graph_search - query:\n%s", ENTITY_ID_NEIGHBORS_QUERY)
+            return searched_entities, {}, [(None, ENTITY_ID_NEIGHBORS_QUERY, {"entities": resolved})]
+
+        entity_queries = []
+        for entity in dict.fromkeys(entities):
+            full_text_query = self._generate_full_text_query(entity)
+            if full_text_query:
+                entity_queries.append({"entity": entity, "query": full_text_query})
+            save_runtime_log("***Log: graph_search - %s query:\n%s", entity, full_text_query)
+        searched_entities = [entity_query["entity"] for entity_query in entity_queries]
+
+        if not entity_queries:
+            return searched_entities, {}, []
+        if self.batch_entity_queries:
+            # Neighbors of all entities in a single round-trip, deduplicated on the server
+            save_runtime_log("***Log: graph_search - query:\n%s", BATCHED_ENTITY_NEIGHBORS_QUERY)
+            return searched_entities, {}, [(None, BATCHED_ENTITY_NEIGHBORS_QUERY, {"queries": entity_queries})]
+        save_runtime_log("***Log: graph_search - query:\n%s", ENTITY_NEIGHBORS_QUERY)
+        return searched_entities, {}, [
+            (entity_query["entity"], ENTITY_NEIGHBORS_QUERY, {"query": entity_query["query"]})
+            for entity_query in entity_queries
+        ]
+
+    @staticmethod
+    def _neighbor_rows(entity: str | None, response: list[dict]) -> dict[str, list[str]]:
+        """The neighbor rows per entity of a planned query response."""
+        if entity is None:
+            return {el["entity"]: el["outputs"] for el in response}
+        return {entity: [el["output"] for el in response]}
+
+    def _graph_search_result(self, cache_key: tuple | None, searched_entities: list[str], neighbors: dict[str, list[str]]) -> dict:
+        result = ""
+        for entity in searched_entities:
+            result += "\n".join(neighbors.get(entity, [])) + "\n"
+        
+        save_runtime_log("***Log: graph_search - result:\n%s", result)
+        record_context_bytes(result)
+        update_state = {
+            "structured_data": result,
+            "entities": searched_entities,
+        }
+        if cache_key is not None:
+            self.retrieval_cache.set(cache_key, update_state)
+        return dict(update_state)
+
+    def _cached_retrieval(self, cache_key: tuple | None):
+        if cache_key is None:
+            return None
+        return self.retrieval_cache.get(cache_key)
+
+    @instrument_node("graph_search")
     def graph_search(self, state: AgentState) -> dict:
         """Graph traversal node.
 
@@ -236,36 +825,45 @@ class GraphNodes:
             dict: The updated Agent state with updated structured data
         """
         question = state["question"]
+        if self.graph_version is not None:
+            self.graph_version.check()
+        cache_key = self._retrieval_cache_key("structured_data", question)
+        if (update_state := self._cached_retrieval(cache_key)) is not None:
+            save_runtime_log("***Log: graph_search - cached result:\n%s", update_state["structured_data"])
+            return dict(update_state)
+
         entities = self._retrieve_entities(question)
-        graph_conf_query="""
-        CALL db.index.fulltext.queryNodes('entity', $query, {limit:2})
-            YIELD node,score
-            CALL () {
-              MATCH (node)-[r:!MENTIONS]->(neighbor)
-              RETURN node.id + ' - ' + type(r) + ' -> ' + neighbor.id AS output
-              UNION
-              MATCH (node)<-[r:!MENTIONS]-(neighbor)
-              RETURN neighbor.id + ' - ' + type(r) + ' -> ' +  node.id AS output
-            }
-            RETURN output LIMIT 20
-        """
-        result = ""
-        save_runtime_log(filename_output, f"***Log {get_timestamp()}: graph_search - query:\n{graph_conf_query}")
-        save_runtime_log(filename_output, f"***Log {get_timestamp()}: graph_search - entities:\n{entities}")
-        for entity in entities:
-            response = self.graph.query(
-                graph_conf_query,
-                {"query": self._generate_full_text_query(entity)},
-            )
-            save_runtime_log(filename_output, f"***Log {get_timestamp()}: graph_search - {entity} query:\n{self._generate_full_text_query(entity)}")
-            result += "\n".join([el["output"] for el in response]) + "\n"
-        
-        save_runtime_log(filename_output, f"***Log {get_timestamp()}: graph_search - result:\n{result}")
-        
-        return {
-            "structured_data": result,
-        }
+        save_runtime_log("***Log: graph_search - entities:\n%s", entities)
+
+        searched_entities, neighbors, queries = self._plan_graph_search(entities)
+        for entity, query, params in queries:
+            neighbors.update(self._neighbor_rows(entity, self.neo4j_pool.query(query, params)))
+        return self._graph_search_result(cache_key, searched_entities, neighbors)
 
+    @instrument_node("graph_search")
+    async def agraph_search(self, state: AgentState) -> dict:
+        """Async `graph_search` node, per-entity queries run concurrently."""
+        question = state["question"]
+        if self.graph_version is not None:
+            # A changed version reloads the snapshot and indexes, that file I/O stays off the event loop
+            await asyncio.to_thread(self.graph_version.check)
+        cache_key = self._retrieval_cache_key("structured_data", question)
+        if (update_state := self._cached_retrieval(cache_key)) is not None:
+            save_runtime_log("***Log: graph_search - cached result:\n%s", update_state["structured_data"])
+            return dict(update_state)
+
+        entities = await self._aretrieve_entities(question)
+        save_runtime_log("***Log: graph_search - entities:\n%s", entities)
+
+        searched_entities, neighbors, queries = self._plan_graph_search(entities)
+        responses = await asyncio.gather(
+            *(self.neo4j_pool.aquery(query, params) for _, query, params in queries)
+        )
+        for (entity, _, _), response in zip(queries, responses):
+            neighbors.update(self._neighbor_rows(entity, response))
+        return self._graph_search_result(cache_key, searched_entities, neighbors)
+
+    @instrument_node("vector_retriever")
     def unstructured_retriever(self, state: AgentState) -> dict:
         """Vector retriever node.
 
@@ -276,9 +874,78 @@ class GraphNodes:
             dict: The updated Agent state with updated unstructured_data
         """
         question = state["question"]
-        unstructured_data = [
-            el.page_content for el in self.vector_index.similarity_search(question)
-        ]
+        if self.graph_version is not None:
+            self.graph_version.check()
+        cache_key = self._retrieval_cache_key("unstructured_data", question)
+        if (unstructured_data := self._cached_retrieval(cache_key)) is not None:
+            save_runtime_log("***Log: unstructured_retriever - cached documents: %s", len(unstructured_data))
+            return {
+                "unstructured_data": unstructured_data,
+            }
+
+        if self.local_retriever is not None:
+            documents = self.local_retriever.similarity_search(question)
+        else:
+            documents = self._neo4j_vector_search(question)
+        return self._unstructured_result(cache_key, documents)
+
+    @instrument_node("vector_retriever")
+    async def aunstructured_retriever(self, state: AgentState) -> dict:
+        """Async `unstructured_retriever` node."""
+        question = state["question"]
+        if self.graph_version is not None:
+            await asyncio.to_thread(self.graph_version.check)
+        cache_key = self._retrieval_cache_key("unstructured_data", question)
+        if (unstructured_data := self._cached_retrieval(cache_key)) is not None:
+            save_runtime_log("***Log: unstructured_retriever - cached documents: %s", len(unstructured_data))
+            return {
+                "unstructured_data": unstructured_data,
+            }
+
+        if self.local_retriever is not None:
+            documents = await self.local_retriever.asimilarity_search(question)
+        else:
+            # `Neo4jVector` has no native async search, the sync search runs in a thread
+            documents = await asyncio.to_thread(self._neo4j_vector_search, question)
+        return self._unstructured_result(cache_key, documents)
+
+    def _neo4j_vector_search(self, question: str) -> list:
+        # The index uses the driver of the pool, the search is bounded and accounted by the pool
+        with self.neo4j_pool.acquire():
+            documents = self.vector_index.similarity_search(question)
+        record_neo4j_query(len(documents))
+        return documents
+
+    def _unstructured_result(self, cache_key: tuple | None, documents: list) -> dict:
+        unstructured_data = [el.page_content for el in documents]
+        save_runtime_log("***Log: unstructured_retriever - documents: %s", len(unstructured_data))
+        record_context_bytes("".join(unstructured_data))
+        if cache_key is not None:
+            self.retrieval_cache.set(cache_key, unstructured_data)
+        if isinstance(self.embedding_func, CachedEmbeddings):
+            logger.debug(f"***Log: unstructured_retriever - embedding cache: {self.embedding_func.stats()}")
+        return {
+            "unstructured_data": unstructured_data,
+        }
+
+    @instrument_node("combine_context")
+    def combine_context(self, state: AgentState) -> dict:
+        """Join node, waits for the graph search and the vector retriever.
+
+        Args:
+            state (AgentState): The current Agent state
+
+        Returns:
+            dict: The updated Agent state with the retrieved context as tool message
+        """
+        structured_data, unstructured_data = state["structured_data"], state["unstructured_data"]
+        if self.context_assembler is not None:
+            structured_data, unstructured_data, report = self.context_assembler.assemble(
+                state["question"], structured_data, unstructured_data
+            )
+            save_runtime_log("***Log: combine_context - context budget:\n %s", report)
+            logger.debug(f"***Log: combine_context - {report.tokens_saved} of {report.tokens_before} context tokens saved")
+            record_context_tokens_saved(report.tokens_saved)
 
         unstructured_context = "\n".join(
             map(
@@ -287,12 +954,12 @@ class GraphNodes:
             )
         )
         context_prompt = f"""Structured data:
-{state["structured_data"]}
+{structured_data}
 Unstructured data:\n{unstructured_context}
 """
-        save_runtime_log(filename_output, f"***Log {get_timestamp()}: unstructured_retriever - context_prompt:\n {context_prompt}")
+        save_runtime_log("***Log: combine_context - context_prompt:\n %s", context_prompt)
+        record_context_bytes(context_prompt)
         return {
-            "unstructured_data": unstructured_data,
             "messages": [
                 ToolMessage(
                     content=context_prompt,
@@ -302,16 +969,31 @@ Unstructured data:\n{unstructured_context}
             ],
         }
 
-    def generate(self, state: AgentState) -> dict:
+    @instrument_node("generate")
+    def generate(self, state: AgentState, config: RunnableConfig) -> dict:
         """Generate node.
 
         Args:
             state (AgentState): The current Agent state
+            config (RunnableConfig): The run config, `configurable.system_message` overwrites the default system prompt
 
         Returns:
             dict: The updated state with final AI assistant response
         """
-        if state.get("structured_data"):
+        response = self.llm.invoke(self._generate_messages(state, config))
+        save_runtime_log("***Log: generate - response:\n %s", response.content)
+        return {"messages": [response]}
+
+    @instrument_node("generate")
+    async def agenerate(self, state: AgentState, config: RunnableConfig) -> dict:
+        """Async `generate` node, the tokens are streamed by `astream` like by `stream`."""
+        response = await self.llm.ainvoke(self._generate_messages(state, config))
+        save_runtime_log("***Log: generate - response:\n %s", response.content)
+        return {"messages": [response]}
+
+    def _generate_messages(self, state: AgentState, config: RunnableConfig) -> list[BaseMessage]:
+        # The retrieved data of an earlier turn stays in a checkpointed state, the route is per turn
+        if state.get("route") == "graph_knowledge_base" and state.get("structured_data"):
             user_prompt = f"""Answer the question based only on the context retrieved from graph knowledge graph.
 
 Question: {state["question"]}
@@ -323,12 +1005,59 @@ Question: {state["question"]}
     """
             # user_prompt = state["messages"][-2].content
 
-        response = self.llm.invoke(
-            [
-                self.system_message,
-                *state["messages"],
-                HumanMessage(content=user_prompt),
-            ]
+        system_message = config.get("configurable", {}).get(
+            "system_message", self.system_message
         )
-        save_runtime_log(filename_output, f"***Log {get_timestamp()}: generate - response:\n {response.content}")
-        return {"messages": [response]}
+
+        summary_messages = []
+        if summary := state.get("summary"):
+            summary_messages = [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")]
+
+        messages = [
+            system_message,
+            *summary_messages,
+            *state["messages"],
+            HumanMessage(content=user_prompt),
+        ]
+        record_context_bytes("".join(str(message.content) for message in messages))
+        return messages
+
+    @instrument_node("compact_history")
+    def compact_history(self, state: AgentState) -> dict:
+        """Compaction node of the checkpointed conversation, runs after `generate`.
+
+        Args:
+            state (AgentState): The current Agent state
+
+        Returns:
+            dict: The state update removing the stale context and the older turns, with the extended summary
+        """
+        stale, evicted = plan_compaction(state["messages"], self.conversation_max_turns)
+        update_state = self._compaction_update(stale, evicted)
+        if evicted and self.conversation_summary:
+            response = self.llm_no_stream.invoke(self._summary_messages(state.get("summary"), evicted))
+            update_state["summary"] = response.content
+        return update_state
+
+    @instrument_node("compact_history")
+    async def acompact_history(self, state: AgentState) -> dict:
+        """Async `compact_history` node."""
+        stale, evicted = plan_compaction(state["messages"], self.conversation_max_turns)
+        update_state = self._compaction_update(stale, evicted)
+        if evicted and self.conversation_summary:
+            response = await self.llm_no_stream.ainvoke(self._summary_messages(state.get("summary"), evicted))
+            update_state["summary"] = response.content
+        return update_state
+
+    def _compaction_update(self, stale: list[BaseMessage], evicted: list[BaseMessage]) -> dict:
+        logger.debug(f"***Log: compact_history - {len(stale)} context messages and {len(evicted)} turn messages removed")
+        return {"messages": [RemoveMessage(id=message.id) for message in [*stale, *evicted]]}
+
+    def _summary_messages(self, summary: str | None, evicted: list[BaseMessage]) -> list[BaseMessage]:
+        messages = [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript(evicted)}"),
+        ]
+        save_runtime_log("***Log: compact_history - summary prompt:\n %s", messages[1].content)
+        record_context_bytes("".join(str(message.content) for message in messages))
+        return messages
@@ -0,0 +1,165 @@
+"""Lazily initialized runtime context of the agent.
+
+Importing the package has no side effects: the `.env` file is loaded, logging is
+configured and the runtime log file is created only when `get_runtime_context()`
+is called for the first time, which happens when the graph nodes are built or a
+request logs its first entry.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from .runtime_log import RuntimeLogWriter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENVIRONMENT_PATH = "../../.env"
+
+
+def get_timestamp():
+    now = datetime.now()
+    timestamp = now.strftime("%Y-%m-%d_%H-%M-%S")
+    return timestamp
+
+
+def _getenv_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+def load_runtime_config() -> dict:
+    """Read the agent runtime configuration from env variables."""
+    return {
+        "NEO4J_URI": os.getenv("NEO4J_URI"),
+        "NEO4J_USERNAME": os.getenv("NEO4J_USERNAME"),
+        "NEO4J_PASSWORD": os.getenv("NEO4J_PASSWORD"),
+        "NEO4J_DATABASE": os.getenv("NEO4J_DATABASE"),
+        "AGENT_LOG_LEVEL": os.getenv("AGENT_LOG_LEVEL", "INFO").upper(),
+        "FILENAME_AGENT_LOG_OUTPUT": os.getenv("FILENAME_AGENT_LOG_OUTPUT"),
+        "AGENT_RUNTIME_LOG": _getenv_bool("AGENT_RUNTIME_LOG", "true"),
+        "AGENT_RUNTIME_LOG_QUEUE_SIZE": int(os.getenv("AGENT_RUNTIME_LOG_QUEUE_SIZE", "10000")),
+        "AGENT_RUNTIME_LOG_MAX_BYTES": int(os.getenv("AGENT_RUNTIME_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        "AGENT_RUNTIME_LOG_BACKUP_COUNT": int(os.getenv("AGENT_RUNTIME_LOG_BACKUP_COUNT", "3")),
+        "GRAPH_SEARCH_BATCHED": _getenv_bool("GRAPH_SEARCH_BATCHED", "true"),
+        "ROUTER_CACHE": _getenv_bool("ROUTER_CACHE", "false"),
+        "ROUTER_CACHE_THRESHOLD": float(os.getenv("ROUTER_CACHE_THRESHOLD", "0.95")),
+        "ROUTER_CACHE_MAX_SIZE": int(os.getenv("ROUTER_CACHE_MAX_SIZE", "512")),
+        "ROUTER_CACHE_TTL": float(os.getenv("ROUTER_CACHE_TTL", "3600")),
+        "ENTITY_CACHE_MAX_SIZE": int(os.getenv("ENTITY_CACHE_MAX_SIZE", "1024")),
+        "ENTITY_CACHE_TTL": float(os.getenv("ENTITY_CACHE_TTL", "3600")),
+        "ENTITY_FAST_PATH": _getenv_bool("ENTITY_FAST_PATH", "false"),
+        "ENTITY_INDEX": _getenv_bool("ENTITY_INDEX", "false"),
+        "GRAPH_VERSION_CHECK_INTERVAL": float(os.getenv("GRAPH_VERSION_CHECK_INTERVAL", "30")),
+        "ADJACENCY_SNAPSHOT_PATH": os.getenv("ADJACENCY_SNAPSHOT_PATH"),
+        "GRAPH_SEARCH_HOPS": int(os.getenv("GRAPH_SEARCH_HOPS", "1")),
+        "EMBEDDING_CACHE": _getenv_bool("EMBEDDING_CACHE", "true"),
+        "EMBEDDING_CACHE_MAX_SIZE": int(os.getenv("EMBEDDING_CACHE_MAX_SIZE", "2048")),
+        "EMBEDDING_CACHE_TTL": float(os.getenv("EMBEDDING_CACHE_TTL", "86400")),
+        "EMBEDDING_CACHE_PATH": os.getenv("EMBEDDING_CACHE_PATH"),
+        "VECTOR_BACKEND": os.getenv("VECTOR_BACKEND", "neo4j").lower(),
+        "LOCAL_VECTOR_INDEX_PATH": os.getenv("LOCAL_VECTOR_INDEX_PATH"),
+        "LOCAL_VECTOR_NPROBE": int(os.getenv("LOCAL_VECTOR_NPROBE", "0")),
+        "RETRIEVAL_CACHE": _getenv_bool("RETRIEVAL_CACHE", "true"),
+        "RETRIEVAL_CACHE_MAX_SIZE": int(os.getenv("RETRIEVAL_CACHE_MAX_SIZE", "1024")),
+        "RETRIEVAL_CACHE_TTL": float(os.getenv("RETRIEVAL_CACHE_TTL", "3600")),
+        "SPECULATIVE_RETRIEVAL": _getenv_bool("SPECULATIVE_RETRIEVAL", "false"),
+        "SPECULATIVE_RETRIEVAL_MAX_WORKERS": int(os.getenv("SPECULATIVE_RETRIEVAL_MAX_WORKERS", "8")),
+        "CONTEXT_BUDGET": _getenv_bool("CONTEXT_BUDGET", "true"),
+        "CONTEXT_TOKEN_BUDGET": int(os.getenv("CONTEXT_TOKEN_BUDGET", "0")),
+        "CONTEXT_TOKEN_BUDGETS": os.getenv("CONTEXT_TOKEN_BUDGETS"),
+        "CONTEXT_STRUCTURED_SHARE": float(os.getenv("CONTEXT_STRUCTURED_SHARE", "0.4")),
+        "CONVERSATION_MEMORY": _getenv_bool("CONVERSATION_MEMORY", "false"),
+        "CONVERSATION_CHECKPOINTER": os.getenv("CONVERSATION_CHECKPOINTER", "memory"),
+        "CONVERSATION_SQLITE_PATH": os.getenv("CONVERSATION_SQLITE_PATH", "./conversations.sqlite"),
+        "CONVERSATION_MAX_TURNS": int(os.getenv("CONVERSATION_MAX_TURNS", "4")),
+        "CONVERSATION_SUMMARY": _getenv_bool("CONVERSATION_SUMMARY", "true"),
+        "METRICS": _getenv_bool("METRICS", "true"),
+        "METRICS_EXPORT_PATH": os.getenv("METRICS_EXPORT_PATH"),
+        "METRICS_EXPORT_INTERVAL": float(os.getenv("METRICS_EXPORT_INTERVAL", "15")),
+    }
+
+
+class AgentRuntimeContext:
+    """Owns the configuration, the logging setup and the runtime log of an agent process.
+
+    Args:
+        environment_path (str): The `.env` file loaded into the environment, existing variables are kept
+    """
+
+    def __init__(self, environment_path: str = DEFAULT_ENVIRONMENT_PATH) -> None:
+        load_dotenv(dotenv_path=environment_path)
+        self.config = load_runtime_config()
+        self.timestamp = get_timestamp()
+        self._configure_logging()
+
+        self._log_writer: RuntimeLogWriter | None = None
+        self._log_writer_lock = threading.Lock()
+
+    def _configure_logging(self) -> None:
+        # Only the package logger is configured, the root logger is left to the application
+        package_logger = logging.getLogger(__package__)
+        package_logger.setLevel(self.config["AGENT_LOG_LEVEL"])
+        if not package_logger.handlers and not logging.getLogger().handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+            package_logger.addHandler(handler)
+
+    @property
+    def log_filename(self) -> str | None:
+        log_path = self.config["FILENAME_AGENT_LOG_OUTPUT"]
+        if not log_path:
+            return None
+        return f"{log_path}/log_agent_execution_{self.timestamp}.txt"
+
+    def _create_log_writer(self) -> RuntimeLogWriter:
+        filename = self.log_filename
+        enabled = self.config["AGENT_RUNTIME_LOG"] and filename is not None
+        if self.config["AGENT_RUNTIME_LOG"] and filename is None:
+            logger.warning("***Log: FILENAME_AGENT_LOG_OUTPUT is not set, the runtime log is disabled")
+        if enabled:
+            # Create log file for the agent run
+            print(f"***Log {get_timestamp()}: Creating runtime log file for agent execution {filename}")
+            with open(filename, 'w') as file:
+                file.write(f"************ LangGraph Node - Log experiment agent run {self.timestamp} **********\n")
+        writer = RuntimeLogWriter(
+            filename or os.devnull,
+            enabled=enabled,
+            max_queue_size=self.config["AGENT_RUNTIME_LOG_QUEUE_SIZE"],
+            max_bytes=self.config["AGENT_RUNTIME_LOG_MAX_BYTES"],
+            backup_count=self.config["AGENT_RUNTIME_LOG_BACKUP_COUNT"],
+        )
+        atexit.register(writer.close)
+        return writer
+
+    @property
+    def log_writer(self) -> RuntimeLogWriter:
+        """The runtime log writer, the log file is created on first use."""
+        if self._log_writer is None:
+            with self._log_writer_lock:
+                if self._log_writer is None:
+                    self._log_writer = self._create_log_writer()
+        return self._log_writer
+
+    def log(self, message: str, *args) -> None:
+        """Queue a runtime log entry, `message % args` is formatted by the background writer."""
+        if not self.config["AGENT_RUNTIME_LOG"]:
+            return
+        self.log_writer.write(message, *args)
+
+
+_runtime_context: AgentRuntimeContext | None = None
+_runtime_context_lock = threading.Lock()
+
+
+def get_runtime_context() -> AgentRuntimeContext:
+    """Get the process wide runtime context, created on first use."""
+    global _runtime_context
+    if _runtime_context is None:
+        with _runtime_context_lock:
+            if _runtime_context is None:
+                _runtime_context = AgentRuntimeContext()
+    return _runtime_context
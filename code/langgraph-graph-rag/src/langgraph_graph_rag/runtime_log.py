@@ -0,0 +1,167 @@
+"""Buffered runtime log writer for the agent execution log.
+
+Log entries are put on a bounded queue and written by a background thread, so the
+request path does not open, write and close the log file for every entry. Messages
+are formatted lazily, logging style (`writer.write("graph_search - %s", entities)`),
+by the background thread and only if the writer is enabled.
+"""
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any
+
+import logging
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class RuntimeLogWriter:
+    """Background thread log sink with batching, flushing, rotation and drop accounting.
+
+    Args:
+        filename (str): The log file, entries are appended
+        enabled (bool): If False, `write` returns immediately without formatting the message
+        max_queue_size (int): Bound of the queue, entries are dropped (and counted) when it is full
+        batch_size (int): Number of entries after which a batch is written
+        flush_interval (float): Seconds after which a partial batch is written
+        max_bytes (int): Rotate the file once it exceeds this size, 0 disables rotation
+        backup_count (int): Number of rotated files (`<filename>.1` ... `<filename>.<n>`) to keep
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        enabled: bool = True,
+        max_queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 3,
+    ) -> None:
+        self.filename = filename
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0
+        self._rotations = 0
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"runtime-log-writer-{os.path.basename(filename)}", daemon=True
+        )
+        if self.enabled:
+            self._thread.start()
+
+    def write(self, message: str, *args: Any) -> bool:
+        """Queue a log entry, `message % args` is evaluated by the writer thread.
+
+        Returns:
+            bool: False if the entry was dropped or the writer is disabled
+        """
+        if not self.enabled or self._closed:
+            return False
+        try:
+            self._queue.put_nowait((time.time(), message, args))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+
+    def _format(self, entry: tuple) -> str:
+        created, message, args = entry
+        timestamp = datetime.fromtimestamp(created).strftime("%Y-%m-%d_%H-%M-%S")
+        try:
+            text = message % args if args else message
+        except (TypeError, ValueError) as e:
+            text = f"{message} {args} (formatting failed: {e})"
+        return f"************ LangGraph Node - Log current time {timestamp} **********\n{text}\n\n"
+
+    def _rotate(self, file):
+        file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.filename}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.filename}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            os.remove(self.filename)
+        with self._lock:
+            self._rotations += 1
+        return open(self.filename, "a", encoding="utf-8")
+
+    def _write_batch(self, file, batch: list[tuple]):
+        file.write("".join(self._format(entry) for entry in batch))
+        file.flush()
+        with self._lock:
+            self._written += len(batch)
+        if self.max_bytes and file.tell() >= self.max_bytes:
+            file = self._rotate(file)
+        return file
+
+    def _run(self) -> None:
+        file = open(self.filename, "a", encoding="utf-8")
+        batch: list[tuple] = []
+        flush_events: list[threading.Event] = []
+        deadline = time.monotonic() + self.flush_interval
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.0))
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    flush_events.append(item)
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            if batch and (stop or flush_events or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                try:
+                    file = self._write_batch(file, batch)
+                except OSError as e:
+                    logger.warning(f"***Log: RuntimeLogWriter: failed to write {len(batch)} entries: {e}")
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+            for event in flush_events:
+                event.set()
+            flush_events = []
+        file.close()
+
+    def flush(self, timeout: float | None = 5.0) -> bool:
+        """Block until all entries queued so far are written."""
+        if not self.enabled or self._closed:
+            return True
+        event = threading.Event()
+        self._queue.put(event)
+        return event.wait(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "written": self._written,
+                "dropped": self._dropped,
+                "queued": self._queue.qsize(),
+                "rotations": self._rotations,
+            }
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        """Write the pending entries and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
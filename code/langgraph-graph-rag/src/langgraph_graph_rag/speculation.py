@@ -0,0 +1,52 @@
+"""Counters of the speculative retrieval.
+
+With `SPECULATIVE_RETRIEVAL=true` the `agent` node starts the graph search and the
+vector retrieval at the same time as the router call. A speculation is a hit when
+the router picks `graph_knowledge_base`, otherwise the retrieval is cancelled (async)
+or its result is discarded (sync) and the time it ran is counted as wasted work.
+"""
+
+import threading
+
+
+class SpeculationStats:
+    """Thread-safe hit, discard, wasted-work and saved-time counters."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.discarded = 0
+        self.wasted_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def record_start(self) -> None:
+        with self._lock:
+            self.started += 1
+
+    def record_hit(self, saved_seconds: float) -> None:
+        """The speculation was used, `saved_seconds` of retrieval overlapped the router call."""
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += max(0.0, saved_seconds)
+
+    def record_discarded(self) -> None:
+        with self._lock:
+            self.discarded += 1
+
+    def record_wasted(self, seconds: float) -> None:
+        """Retrieval time spent on a discarded speculation, reported when the work ended."""
+        with self._lock:
+            self.wasted_seconds += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            decided = self.hits + self.discarded
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "discarded": self.discarded,
+                "hit_rate": self.hits / decided if decided else 0.0,
+                "wasted_seconds": self.wasted_seconds,
+                "saved_seconds": self.saved_seconds,
+            }
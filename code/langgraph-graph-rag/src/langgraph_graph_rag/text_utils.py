@@ -0,0 +1,12 @@
+"""Text helpers without dependencies, shared by the runtime and the ingestion scripts."""
+
+# Stop words of the Lucene standard (english) analyzer used by the `keyword` full-text index
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such that the "
+    "their then there these they this to was will with".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text, about 4 characters per token."""
+    return (len(text) + 3) // 4
@@ -0,0 +1,12 @@
+import json
+from pathlib import Path
+
+import pytest
+
+FIXTURE_GRAPH = Path(__file__).resolve().parents[1] / "scripts" / "benchmark_fixtures" / "galaxium_graph.json"
+
+
+@pytest.fixture(scope="session")
+def fixture_graph() -> dict:
+    """The Galaxium Travels fixture graph of the offline benchmarks."""
+    return json.loads(FIXTURE_GRAPH.read_text())
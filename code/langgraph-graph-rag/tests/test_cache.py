@@ -0,0 +1,121 @@
+"""`LRUTTLCache` eviction and expiry, `SemanticCache` hits and the invalidation of its matrix."""
+
+import asyncio
+
+import pytest
+
+from langgraph_graph_rag import cache
+from langgraph_graph_rag.cache import LRUTTLCache, SemanticCache, normalize_question
+
+EMBEDDINGS = {
+    "who is the ceo of galaxium travels": [1.0, 0.0, 0.0],
+    "who runs galaxium travels": [0.99, 0.14, 0.0],
+    "where is the spaceport": [0.0, 1.0, 0.0],
+    "what does a mars trip cost": [0.0, 0.0, 1.0],
+}
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock.monotonic)
+    return clock
+
+
+class CountingEmbed:
+    def __init__(self) -> None:
+        self.texts = []
+
+    def __call__(self, text: str) -> list[float]:
+        self.texts.append(text)
+        return EMBEDDINGS[normalize_question(text)]
+
+
+def test_normalize_question():
+    assert normalize_question("  Who is the CEO\nof Galaxium Travels?! ") == "who is the ceo of galaxium travels"
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    entries = LRUTTLCache(max_size=2, ttl=0)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    assert entries.get("a") == 1
+    entries.set("c", 3)
+    assert entries.get("b") is None
+    assert entries.get("a") == 1
+    assert entries.get("c") == 3
+    assert entries.stats() | {"hit_rate": None} == {"size": 2, "hits": 3, "misses": 1, "evictions": 1, "hit_rate": None}
+
+
+def test_lru_entries_expire(clock):
+    entries = LRUTTLCache(max_size=2, ttl=10)
+    entries.set("a", 1)
+    clock.now = 9.9
+    assert entries.get("a") == 1
+    assert entries.items() == [("a", 1)]
+    clock.now = 10.0
+    assert entries.items() == []
+    assert entries.get("a", "expired") == "expired"
+    assert len(entries) == 0
+
+
+def test_semantic_cache_exact_and_similar_hits():
+    embed = CountingEmbed()
+    semantic = SemanticCache(embed, threshold=0.95)
+    assert semantic.lookup("Who is the CEO of Galaxium Travels?")[0] is None
+    semantic.store("Who is the CEO of Galaxium Travels?", "graph_search")
+
+    # Identical after normalization, no embedding call
+    assert semantic.lookup("who is the CEO of galaxium travels")[0] == "graph_search"
+    calls = len(embed.texts)
+    # Similar, one embedding call
+    assert semantic.lookup("Who runs Galaxium Travels?")[0] == "graph_search"
+    assert len(embed.texts) == calls + 1
+    assert semantic.lookup("Where is the spaceport?")[0] is None
+    assert semantic.stats()["semantic_hits"] == 1
+    assert semantic.stats()["hits"] == 2
+    assert semantic.stats()["misses"] == 2
+
+
+def test_semantic_cache_store_rebuilds_the_matrix():
+    semantic = SemanticCache(CountingEmbed(), threshold=0.95)
+    semantic.store("Who is the CEO of Galaxium Travels?", "graph_search")
+    assert semantic.lookup("Where is the spaceport?")[0] is None
+    semantic.store("Where is the spaceport?", "vector")
+    assert semantic.lookup("where is the spaceport")[0] == "vector"
+    assert len(semantic._embedding_matrix()[0]) == 2
+
+    semantic.clear()
+    assert semantic.lookup("Who runs Galaxium Travels?")[0] is None
+    assert semantic._embedding_matrix()[0] == []
+
+
+def test_semantic_cache_expired_match_is_a_miss(clock):
+    semantic = SemanticCache(CountingEmbed(), threshold=0.95, ttl=10)
+    semantic.store("Who is the CEO of Galaxium Travels?", "graph_search")
+    assert semantic.lookup("Who runs Galaxium Travels?")[0] == "graph_search"
+    clock.now = 10.0
+    assert semantic.lookup("Who runs Galaxium Travels?")[0] is None
+    # The matrix was rebuilt without the expired entry
+    assert semantic._embedding_matrix()[0] == []
+
+
+def test_semantic_cache_async_lookup_uses_the_async_embedding():
+    embed = CountingEmbed()
+
+    async def aembed(text: str) -> list[float]:
+        return embed(text)
+
+    semantic = SemanticCache(lambda text: pytest.fail("sync embedding called"), threshold=0.95, aembed=aembed)
+    semantic.store("Who is the CEO of Galaxium Travels?", "graph_search", embedding=EMBEDDINGS["who is the ceo of galaxium travels"])
+    value, embedding = asyncio.run(semantic.alookup("Who runs Galaxium Travels?"))
+    assert value == "graph_search"
+    assert embedding is not None
@@ -0,0 +1,59 @@
+"""`ContextAssembler` deduplication, ranking and trimming to the token budget."""
+
+from langgraph_graph_rag.context_budget import ContextAssembler, parse_token_budgets
+from langgraph_graph_rag.text_utils import estimate_tokens
+
+QUESTION = "Who is the CEO of Galaxium Travels?"
+ROWS = [
+    "Spaceport Alpha - LOCATED_IN -> Mojave Desert",
+    "Galaxium Travels - LOCATED_IN -> Spaceport Alpha",
+    "Dr. Alexander Nova - CEO_OF -> Galaxium Travels",
+    "Spaceport Alpha - LOCATED_IN -> Mojave Desert",
+]
+DOCUMENTS = [
+    "Spaceport Alpha is located in the Mojave Desert. " * 4,
+    "Dr. Alexander Nova is the CEO of Galaxium Travels. " * 4,
+    "Spaceport Alpha is located in the Mojave Desert. " * 4,
+]
+
+
+def test_parse_token_budgets():
+    assert parse_token_budgets("ibm/granite=3000, meta-llama/llama-3=6000,") == {
+        "ibm/granite": 3000,
+        "meta-llama/llama-3": 6000,
+    }
+    assert parse_token_budgets(None) == {}
+
+
+def test_zero_budget_only_removes_duplicates():
+    structured, documents, report = ContextAssembler(token_budget=0).assemble(QUESTION, "\n".join(ROWS), DOCUMENTS)
+    assert structured.splitlines() == ROWS[:3]
+    assert documents == DOCUMENTS[:2]
+    assert (report.duplicate_rows, report.duplicate_documents) == (1, 1)
+    assert report.tokens_saved > 0
+
+
+def test_budget_keeps_the_best_rows_and_documents():
+    assembler = ContextAssembler(token_budget=80, structured_share=0.4)
+    structured, documents, report = assembler.assemble(QUESTION, "\n".join(ROWS), DOCUMENTS)
+    # Rows with question words first, equal rows in retrieval order
+    assert structured.splitlines() == [ROWS[1], ROWS[2]]
+    assert documents == [DOCUMENTS[1]]
+    assert report.tokens_after <= 80
+    assert report.tokens_after == estimate_tokens(structured) + sum(estimate_tokens(document) for document in documents)
+
+
+def test_unused_document_budget_is_left_to_the_rows():
+    structured, documents, report = ContextAssembler(token_budget=40, structured_share=0.1).assemble(
+        QUESTION, "\n".join(ROWS), []
+    )
+    assert structured.splitlines() == [ROWS[1], ROWS[2], ROWS[0]]
+    assert documents == []
+    assert report.rows_after == 3
+
+
+def test_a_document_larger_than_the_budget_is_cut():
+    structured, documents, report = ContextAssembler(token_budget=10).assemble(QUESTION, "", [DOCUMENTS[1]])
+    assert structured == ""
+    assert documents == [DOCUMENTS[1][:40]]
+    assert report.tokens_after == 10
@@ -0,0 +1,73 @@
+"""Compaction of the checkpointed conversation state."""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph.message import add_messages
+
+from langgraph_graph_rag.conversation_memory import (
+    create_checkpointer,
+    is_retrieval_message,
+    plan_compaction,
+    transcript,
+)
+
+
+def turn(number: int, with_retrieval: bool = True) -> list:
+    """The messages of one turn: question, router tool call, retrieved context, answer."""
+    messages = [HumanMessage(content=f"question {number}", id=f"h{number}")]
+    if with_retrieval:
+        messages += [
+            AIMessage(
+                content="",
+                id=f"r{number}",
+                tool_calls=[{"name": "Router", "args": {"route": "graph_knowledge_base"}, "id": f"call{number}"}],
+            ),
+            ToolMessage(content=f"context {number}", tool_call_id=f"call{number}", id=f"t{number}"),
+        ]
+    return messages + [AIMessage(content=f"answer {number}", id=f"a{number}")]
+
+
+def test_retrieval_messages():
+    question, route, context, answer = turn(1)
+    assert [is_retrieval_message(message) for message in (question, route, context, answer)] == [False, True, True, False]
+
+
+def test_the_retrieval_of_a_finished_turn_is_stale():
+    stale, evicted = plan_compaction(turn(1), max_turns=3)
+    assert [message.id for message in stale] == ["r1", "t1"]
+    assert evicted == []
+
+
+def test_the_turns_before_the_last_max_turns_are_evicted():
+    messages = turn(1, with_retrieval=False) + turn(2, with_retrieval=False) + turn(3)
+    stale, evicted = plan_compaction(messages, max_turns=2)
+    assert [message.id for message in stale] == ["r3", "t3"]
+    assert [message.id for message in evicted] == ["h1", "a1"]
+
+
+@pytest.mark.parametrize("max_turns", [0, -1])
+def test_the_current_turn_is_always_kept(max_turns):
+    messages = turn(1, with_retrieval=False) + turn(2, with_retrieval=False)
+    _, evicted = plan_compaction(messages, max_turns=max_turns)
+    assert [message.id for message in evicted] == ["h1", "a1"]
+
+
+def test_the_compaction_update_leaves_the_kept_turns():
+    messages = add_messages([], turn(1, with_retrieval=False) + turn(2))
+    stale, evicted = plan_compaction(messages, max_turns=1)
+    compacted = add_messages(messages, [RemoveMessage(id=message.id) for message in [*stale, *evicted]])
+    assert [message.id for message in compacted] == ["h2", "a2"]
+
+
+def test_transcript():
+    assert transcript(turn(1, with_retrieval=False)) == "User: question 1\nAssistant: answer 1"
+
+
+def test_checkpointers():
+    assert isinstance(create_checkpointer("memory"), MemorySaver)
+    assert isinstance(create_checkpointer("memory", async_mode=True), MemorySaver)
+    with pytest.raises(ValueError, match="sync service functions only"):
+        create_checkpointer("sqlite", ":memory:", async_mode=True)
+    with pytest.raises(ValueError, match="Unknown CONVERSATION_CHECKPOINTER"):
+        create_checkpointer("redis")
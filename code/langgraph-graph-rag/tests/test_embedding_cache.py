@@ -0,0 +1,73 @@
+"""`CachedEmbeddings` memory and sqlite tiers."""
+
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from langgraph_graph_rag.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self) -> None:
+        self.queries = []
+        self.documents = []
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return [float(len(text)), 1.0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.documents.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_queries_are_embedded_once_per_normalized_question():
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, model_id="granite")
+    first = cached.embed_query("Who is the CEO?")
+    assert cached.embed_query("who is the CEO") == first
+    assert asyncio.run(cached.aembed_query("  Who is the  CEO? ")) == first
+    assert model.queries == ["Who is the CEO?"]
+    assert cached.stats()["memory_hits"] == 2
+    assert cached.stats()["misses"] == 1
+
+
+def test_the_model_id_is_part_of_the_key(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    model = CountingEmbeddings()
+    CachedEmbeddings(model, model_id="granite", path=path).embed_query("question")
+    CachedEmbeddings(model, model_id="slate", path=path).embed_query("question")
+    assert model.queries == ["question", "question"]
+
+
+def test_embed_queries_embeds_the_misses_in_one_call():
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, model_id="granite")
+    cached.embed_query("first")
+    embeddings = cached.embed_queries(["first", "second question", "Second question?", "third"])
+    assert model.documents == [["second question", "third"]]
+    assert embeddings[1] == embeddings[2] == [15.0, 1.0]
+    assert embeddings[0] == [5.0, 1.0]
+
+
+def test_the_sqlite_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    model = CountingEmbeddings()
+    CachedEmbeddings(model, model_id="granite", path=path).embed_query("question")
+
+    restarted = CachedEmbeddings(model, model_id="granite", path=path)
+    assert restarted.embed_query("Question?") == [8.0, 1.0]
+    assert model.queries == ["question"]
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_documents_are_not_cached():
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, model_id="granite")
+    cached.embed_documents(["a", "b"])
+    cached.embed_documents(["a", "b"])
+    assert model.documents == [["a", "b"], ["a", "b"]]
+    assert len(cached.memory) == 0
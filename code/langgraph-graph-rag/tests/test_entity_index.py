@@ -0,0 +1,75 @@
+"""`EntityIndex` against the fuzzy full-text query of `GraphNodes._generate_full_text_query`."""
+
+import random
+import re
+
+from langgraph_graph_rag.entity_index import EntityIndex, _max_edits, edit_distance
+
+
+def osa_distance(a: str, b: str) -> int:
+    """Uncapped optimal string alignment distance, the reference of `edit_distance`."""
+    d = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        d[i][0] = i
+    for j in range(len(b) + 1):
+        d[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[len(a)][len(b)]
+
+
+def full_text_matches(name: str, entity_ids: list[str]) -> set[str]:
+    """Entities of the query `word~2 AND ...`: every word matches a word of the id within its edits."""
+    words = re.findall(r"\w+", name.lower())
+    return {
+        entity_id
+        for entity_id in entity_ids
+        if all(
+            any(osa_distance(word, candidate) <= _max_edits(word) for candidate in re.findall(r"\w+", entity_id.lower()))
+            for word in words
+        )
+    }
+
+
+def test_edit_distance_matches_reference():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        assert edit_distance(a, b, 2) == min(osa_distance(a, b), 3), (a, b)
+
+
+def test_edit_distance_counts_a_transposition_as_one_edit():
+    assert edit_distance("galaxium", "galaxuim", 2) == 1
+    assert edit_distance("nova", "nvoa", 2) == 1
+    assert edit_distance("travels", "travel", 2) == 1
+    assert edit_distance("lunar", "solar", 2) == 3
+
+
+def test_search_matches_the_full_text_query(fixture_graph):
+    entity_ids = [entity["id"] for entity in fixture_graph["entities"]]
+    index = EntityIndex(entity_ids)
+    names = [
+        *entity_ids,
+        "Galaxum Travles",
+        "galaxium",
+        "Alexandr Nova",
+        "Spaceport",
+        "Travels",
+        "Galaxium Nonexistent",
+        "xyz",
+    ]
+    for name in names:
+        assert set(index.search(name, limit=len(entity_ids))) == full_text_matches(name, entity_ids), name
+
+
+def test_search_ranks_the_closest_entity_first(fixture_graph):
+    index = EntityIndex([entity["id"] for entity in fixture_graph["entities"]])
+    assert index.search("Galaxium Travels")[0] == "Galaxium Travels"
+    assert index.search("Galaxum Travles")[0] == "Galaxium Travels"
+    assert index.search("Dr. Alexander Nova", limit=1) == ["Dr. Alexander Nova"]
+    assert index.search("") == []
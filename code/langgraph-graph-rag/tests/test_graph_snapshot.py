@@ -0,0 +1,93 @@
+"""`AdjacencySnapshot.neighbors` against the neighbor rows of `ENTITY_ID_NEIGHBORS_QUERY`."""
+
+import pytest
+
+from langgraph_graph_rag.graph_snapshot import AdjacencySnapshot, load_adjacency_snapshot
+
+
+def cypher_neighbor_rows(edges: list[tuple[str, str, str]], entity_ids: list[str]) -> set[str]:
+    """The rows of `(node)-[r]->(neighbor)` UNION `(node)<-[r]-(neighbor)` of the matched nodes."""
+    rows = set()
+    for source, rel_type, target in edges:
+        if source in entity_ids or target in entity_ids:
+            rows.add(f"{source} - {rel_type} -> {target}")
+    return rows
+
+
+def within_hops(edges: list[tuple[str, str, str]], entity_ids: list[str], hops: int) -> list[str]:
+    """The nodes at most `hops - 1` undirected steps from the entities, their edges are expanded."""
+    nodes, frontier = set(entity_ids), set(entity_ids)
+    for _ in range(hops - 1):
+        frontier = {
+            other
+            for source, _, target in edges
+            for node, other in ((source, target), (target, source))
+            if node in frontier and other not in nodes
+        }
+        nodes |= frontier
+    return sorted(nodes)
+
+
+@pytest.fixture
+def edges(fixture_graph) -> list[tuple[str, str, str]]:
+    return [tuple(relationship) for relationship in fixture_graph["relationships"]]
+
+
+@pytest.fixture
+def snapshot(fixture_graph, edges) -> AdjacencySnapshot:
+    return AdjacencySnapshot.from_edges([entity["id"] for entity in fixture_graph["entities"]], edges, version="v1")
+
+
+@pytest.mark.parametrize(
+    "entity_ids",
+    [["Galaxium Travels"], ["Spaceport Alpha"], ["Mojave Desert"], ["Dr. Alexander Nova", "Spaceport Alpha"], ["Unknown"]],
+)
+def test_neighbors_match_the_cypher_rows(snapshot, edges, entity_ids):
+    rows = snapshot.neighbors(entity_ids, hops=1, limit=100)
+    assert len(rows) == len(set(rows))
+    assert set(rows) == cypher_neighbor_rows(edges, entity_ids)
+
+
+def test_neighbors_are_limited_like_the_query(snapshot, edges):
+    rows = snapshot.neighbors(["Galaxium Travels"], hops=1, limit=5)
+    assert len(rows) == 5
+    assert set(rows) <= cypher_neighbor_rows(edges, ["Galaxium Travels"])
+
+
+def test_neighbors_of_two_hops(snapshot, edges):
+    rows = snapshot.neighbors(["Mojave Desert"], hops=2, limit=100)
+    assert set(rows) == cypher_neighbor_rows(edges, within_hops(edges, ["Mojave Desert"], 2))
+    # Closer relationships first
+    assert rows[0] == "Spaceport Alpha - LOCATED_IN -> Mojave Desert"
+
+
+def test_save_and_load_round_trip(snapshot, tmp_path):
+    snapshot.save(tmp_path)
+    loaded = AdjacencySnapshot.load(tmp_path)
+    assert loaded.version == "v1"
+    assert loaded.node_ids == snapshot.node_ids
+    for entity_id in snapshot.node_ids:
+        assert loaded.neighbors([entity_id], limit=100) == snapshot.neighbors([entity_id], limit=100)
+
+
+def test_save_publishes_a_new_directory_and_keeps_the_mapped_one(snapshot, fixture_graph, edges, tmp_path):
+    snapshot.save(tmp_path)
+    mapped = AdjacencySnapshot.load(tmp_path)
+    rows = mapped.neighbors(["Spaceport Alpha"], limit=100)
+
+    AdjacencySnapshot.from_edges(mapped.node_ids, edges[:1], version="v2").save(tmp_path)
+    AdjacencySnapshot.from_edges(mapped.node_ids, edges[:2], version="v3").save(tmp_path)
+
+    # The arrays mapped by a running agent are not rewritten by later saves
+    assert mapped.neighbors(["Spaceport Alpha"], limit=100) == rows
+    assert AdjacencySnapshot.load(tmp_path).version == "v3"
+    # The published and the previous snapshot are kept
+    assert len([directory for directory in tmp_path.iterdir() if directory.is_dir()]) == 2
+
+
+def test_load_reads_an_unversioned_snapshot_directory(snapshot, tmp_path):
+    directory = snapshot.save(tmp_path / "versioned")
+    for file in directory.iterdir():
+        (tmp_path / file.name).write_bytes(file.read_bytes())
+    assert load_adjacency_snapshot(tmp_path).version == "v1"
+    assert load_adjacency_snapshot(tmp_path / "missing") is None
@@ -0,0 +1,99 @@
+"""`GraphNodes._on_graph_version_change` drops and reloads the data derived from the graph."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from langgraph_graph_rag.cache import LRUTTLCache
+from langgraph_graph_rag.graph_snapshot import AdjacencySnapshot
+from langgraph_graph_rag.nodes import GraphNodes
+
+
+class FixtureEntityPool:
+    """Answers the entity id query of the graph nodes from the fixture graph."""
+
+    def __init__(self, fixture_graph: dict) -> None:
+        self.entity_ids = [entity["id"] for entity in fixture_graph["entities"]]
+
+    def query(self, query: str, params: dict | None = None) -> list[dict]:
+        return [{"id": entity_id} for entity_id in self.entity_ids]
+
+
+def graph_nodes(config: dict, neo4j_pool) -> GraphNodes:
+    """Graph nodes with only the state the version change handler touches, no model clients."""
+    nodes = GraphNodes.__new__(GraphNodes)
+    nodes.runtime = SimpleNamespace(config={"VECTOR_BACKEND": "neo4j", **config})
+    nodes.neo4j_pool = neo4j_pool
+    nodes.entity_cache = LRUTTLCache(max_size=8, ttl=60)
+    nodes.retrieval_cache = LRUTTLCache(max_size=8, ttl=60)
+    nodes._entity_ids = None
+    nodes.entity_index = None
+    nodes.adjacency_snapshot = None
+    nodes.local_retriever = None
+    nodes.graph_search_hops = 1
+    return nodes
+
+
+@pytest.fixture
+def snapshot_path(fixture_graph, tmp_path):
+    edges = [tuple(relationship) for relationship in fixture_graph["relationships"]]
+    snapshot = AdjacencySnapshot.from_edges([entity["id"] for entity in fixture_graph["entities"]], edges, version="v2")
+    snapshot.save(tmp_path / "snapshot")
+    return tmp_path / "snapshot"
+
+
+def test_version_change_clears_the_caches(fixture_graph):
+    nodes = graph_nodes({"ADJACENCY_SNAPSHOT_PATH": "", "ENTITY_INDEX": False}, FixtureEntityPool(fixture_graph))
+    nodes._entity_ids = ["stale"]
+    nodes.entity_cache.set("question", ["stale"])
+    nodes.retrieval_cache.set("question", "stale")
+
+    nodes._on_graph_version_change("v2")
+
+    assert nodes._entity_ids is None
+    assert nodes.entity_cache.get("question") is None
+    assert nodes.retrieval_cache.get("question") is None
+    assert nodes.entity_index is None
+
+
+def test_matching_snapshot_after_a_version_change_builds_the_entity_index(fixture_graph, snapshot_path):
+    # ENTITY_INDEX=false and the snapshot at startup did not match the graph version
+    nodes = graph_nodes(
+        {"ADJACENCY_SNAPSHOT_PATH": str(snapshot_path), "ENTITY_INDEX": False}, FixtureEntityPool(fixture_graph)
+    )
+
+    nodes._on_graph_version_change("v2")
+
+    assert nodes.adjacency_snapshot is not None
+    assert nodes.entity_index is not None
+    assert nodes.entity_index.version == "v2"
+    searched, rows, queries = nodes._plan_graph_search(["Spaceport Alpha"])
+    assert searched == ["Spaceport Alpha"]
+    assert rows["Spaceport Alpha"]
+    assert queries == []
+
+
+def test_stale_snapshot_after_a_version_change_falls_back_to_neo4j(fixture_graph, snapshot_path):
+    nodes = graph_nodes(
+        {"ADJACENCY_SNAPSHOT_PATH": str(snapshot_path), "ENTITY_INDEX": False}, FixtureEntityPool(fixture_graph)
+    )
+    nodes._on_graph_version_change("v2")
+
+    nodes._on_graph_version_change("v3")
+
+    assert nodes.adjacency_snapshot is None
+    assert nodes.entity_index is None
+    nodes.batch_entity_queries = True
+    _, rows, queries = nodes._plan_graph_search(["Spaceport Alpha"])
+    assert rows == {}
+    assert len(queries) == 1
+
+
+def test_entity_index_is_rebuilt_from_neo4j_without_a_snapshot(fixture_graph):
+    nodes = graph_nodes({"ADJACENCY_SNAPSHOT_PATH": "", "ENTITY_INDEX": True}, FixtureEntityPool(fixture_graph))
+
+    nodes._on_graph_version_change("v2")
+
+    assert nodes.entity_index is not None
+    assert nodes.entity_index.version == "v2"
+    assert sorted(nodes.entity_index.entity_ids) == sorted(FixtureEntityPool(fixture_graph).entity_ids)
@@ -0,0 +1,208 @@
+"""`LocalHybridRetriever` against the hybrid search query of `Neo4jVector`.
+
+The reference follows the Cypher of the hybrid search: the top-k of the vector index
+(score `(1 + cosine) / 2`) and of the full-text index (Lucene BM25) are each divided
+by their maximum, a node keeps its larger score, ordered by score and limited to k.
+"""
+
+import asyncio
+import math
+import re
+from hashlib import md5
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from langgraph_graph_rag.embedding_cache import CachedEmbeddings
+from langgraph_graph_rag.local_retriever import (
+    BM25Index,
+    export_document_embeddings,
+    load_local_retriever,
+)
+from langgraph_graph_rag.text_utils import STOP_WORDS
+
+QUERIES = (
+    "Who is the CEO of Galaxium Travels?",
+    "luxury space travel experience",
+    "Where is the spaceport located?",
+    "Mars expeditions and Venus flyby tours",
+    "unrelated words only",
+)
+
+
+class HashedTrigramEmbeddings(Embeddings):
+    """Character trigrams hashed into a small vector, similar texts get similar vectors."""
+
+    dimensions = 256
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        text = f" {text.lower()} "
+        for start in range(len(text) - 2):
+            vector[int(md5(text[start:start + 3].encode()).hexdigest(), 16) % self.dimensions] += 1.0
+        return vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+class FixtureDocumentPool:
+    """Answers the `Document` export query of `export_document_embeddings` with the fixture documents."""
+
+    def __init__(self, texts: list[str], embedding: Embeddings) -> None:
+        self.rows = [
+            {"id": f"doc-{number}", "text": text, "embedding": embedding.embed_query(text)}
+            for number, text in enumerate(texts)
+        ]
+
+    def query(self, query: str, params: dict | None = None) -> list[dict]:
+        return self.rows
+
+
+def lucene_tokens(text: str) -> list[str]:
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOP_WORDS]
+
+
+def bm25_reference(texts: list[str], query: str, k1: float = 1.2, b: float = 0.75) -> list[float]:
+    documents = [lucene_tokens(text) for text in texts]
+    average_length = sum(len(document) for document in documents) / len(documents)
+    scores = []
+    for document in documents:
+        score = 0.0
+        for word in set(lucene_tokens(query)):
+            containing = sum(1 for other in documents if word in other)
+            frequency = document.count(word)
+            if not containing or not frequency:
+                continue
+            idf = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+            score += idf * frequency / (frequency + k1 * (1 - b + b * len(document) / average_length))
+        scores.append(score)
+    return scores
+
+
+def hybrid_reference(texts: list[str], embedding: Embeddings, query: str, k: int) -> list[tuple[str, float]]:
+    query_vector = np.array(embedding.embed_query(query))
+    vector_scores = []
+    for text in texts:
+        document_vector = np.array(embedding.embed_query(text))
+        cosine = query_vector @ document_vector / (np.linalg.norm(query_vector) * np.linalg.norm(document_vector))
+        vector_scores.append((1 + cosine) / 2)
+    fused: dict[int, float] = {}
+    for scores in (vector_scores, bm25_reference(texts, query)):
+        top = sorted((number for number, score in enumerate(scores) if score > 0), key=lambda n: (-scores[n], n))[:k]
+        for number in top:
+            fused[number] = max(fused.get(number, 0.0), scores[number] / scores[top[0]])
+    # The query leaves the order of equal scores open, the local retriever keeps the document order
+    ranked = sorted(fused.items(), key=lambda item: (-round(item[1], 6), item[0]))[:k]
+    return [(f"doc-{number}", score) for number, score in ranked]
+
+
+@pytest.fixture
+def texts(fixture_graph) -> list[str]:
+    return [document["text"] for document in fixture_graph["documents"]]
+
+
+@pytest.fixture
+def export(tmp_path, texts):
+    embedding = HashedTrigramEmbeddings()
+    exported = export_document_embeddings(FixtureDocumentPool(texts, embedding), tmp_path, "v1", ivf_lists=2)
+    assert exported == len(texts)
+    return tmp_path, embedding
+
+
+def test_bm25_matches_the_reference(texts):
+    index = BM25Index(texts)
+    for query in QUERIES:
+        np.testing.assert_allclose(index.scores(query), bm25_reference(texts, query), rtol=1e-5)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("k", [1, 4])
+def test_top_k_matches_the_hybrid_query(export, texts, query, k):
+    path, embedding = export
+    retriever = load_local_retriever(path, embedding)
+    documents = retriever.similarity_search(query, k=k)
+    expected = hybrid_reference(texts, embedding, query, k)
+    assert [document.metadata["id"] for document in documents] == [document_id for document_id, _ in expected]
+    np.testing.assert_allclose([document.metadata["score"] for document in documents], [score for _, score in expected], rtol=1e-5)
+    assert [document.page_content for document in documents] == [texts[int(document_id[4:])] for document_id, _ in expected]
+
+
+def test_ivf_probing_all_lists_is_exact(export):
+    path, embedding = export
+    exact = load_local_retriever(path, embedding)
+    probed = load_local_retriever(path, embedding, nprobe=2)
+    assert probed.ivf is not None
+    for query in QUERIES:
+        assert [d.metadata["id"] for d in probed.similarity_search(query)] == [d.metadata["id"] for d in exact.similarity_search(query)]
+
+
+def ranking(documents) -> list[tuple[str, float]]:
+    return [(document.metadata["id"], round(document.metadata["score"], 5)) for document in documents]
+
+
+def test_batch_and_async_search_match_the_single_search(export):
+    path, embedding = export
+    retriever = load_local_retriever(path, embedding)
+    single = [ranking(retriever.similarity_search(query)) for query in QUERIES]
+    assert [ranking(documents) for documents in retriever.similarity_search_batch(list(QUERIES))] == single
+    assert [ranking(asyncio.run(retriever.asimilarity_search(query))) for query in QUERIES] == single
+
+
+def test_missing_export_loads_no_retriever(tmp_path):
+    assert load_local_retriever(tmp_path / "missing", HashedTrigramEmbeddings()) is None
+
+
+def test_new_export_keeps_the_mapped_embeddings(export, texts):
+    path, embedding = export
+    mapped = load_local_retriever(path, embedding)
+    single = [ranking(mapped.similarity_search(query)) for query in QUERIES]
+
+    exported = export_document_embeddings(FixtureDocumentPool(texts[:3], embedding), path, "v2")
+
+    # The running retriever still reads the files of its own export
+    assert [ranking(mapped.similarity_search(query)) for query in QUERIES] == single
+    reloaded = load_local_retriever(path, embedding)
+    assert reloaded.version == "v2"
+    assert len(reloaded) == exported == 3
+    assert load_local_retriever(path, embedding, nprobe=2).ivf is None
+
+
+class CountingEmbeddings(HashedTrigramEmbeddings):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = []
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls.append([text])
+        return super().embed_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(list(texts))
+        return [super(CountingEmbeddings, self).embed_query(text) for text in texts]
+
+
+def test_batch_search_embeds_the_questions_in_one_call(export):
+    path, embedding = export
+    counting = CountingEmbeddings()
+    retriever = load_local_retriever(path, counting)
+    batch = retriever.similarity_search_batch(list(QUERIES))
+    assert counting.calls == [list(QUERIES)]
+    assert [ranking(documents) for documents in batch] == [
+        ranking(load_local_retriever(path, embedding).similarity_search(query)) for query in QUERIES
+    ]
+
+
+def test_batch_search_embeds_only_the_cache_misses(export):
+    path, _ = export
+    counting = CountingEmbeddings()
+    cached = CachedEmbeddings(counting, model_id="trigrams")
+    cached.embed_query(QUERIES[0])
+    retriever = load_local_retriever(path, cached)
+
+    retriever.similarity_search_batch([*QUERIES, QUERIES[1].upper()])
+
+    assert counting.calls == [[QUERIES[0]], list(QUERIES[1:])]
+    retriever.similarity_search_batch(list(QUERIES))
+    assert len(counting.calls) == 2
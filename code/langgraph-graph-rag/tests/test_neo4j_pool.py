@@ -0,0 +1,157 @@
+"""Bound, statistics and shutdown of `Neo4jConnectionPool`, with in-process drivers."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from langgraph_graph_rag import neo4j_pool
+from langgraph_graph_rag.neo4j_pool import Neo4jConnectionPool, Neo4jPoolTimeoutError
+
+
+class SlowGraph:
+    """Stands in for `Neo4jGraph`, counts the concurrent queries."""
+
+    def __init__(self, **kwargs) -> None:
+        self.running = 0
+        self.max_running = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def query(self, query: str, params: dict) -> list[dict]:
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self._lock:
+            self.running -= 1
+        return [{"query": query}]
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class AsyncSession:
+    def __init__(self, driver: "AsyncDriver") -> None:
+        self.driver = driver
+
+    async def __aenter__(self) -> "AsyncSession":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    async def run(self, query: str, params: dict) -> "AsyncSession":
+        self.driver.running += 1
+        self.driver.max_running = max(self.driver.max_running, self.driver.running)
+        await asyncio.sleep(0.01)
+        self.driver.running -= 1
+        return self
+
+    async def data(self) -> list[dict]:
+        return [{"row": 1}]
+
+
+class AsyncDriver:
+    """Stands in for `neo4j.AsyncDriver`."""
+
+    instances: list["AsyncDriver"] = []
+
+    def __init__(self) -> None:
+        self.running = 0
+        self.max_running = 0
+        self.closed = False
+        AsyncDriver.instances.append(self)
+
+    def session(self, **kwargs) -> AsyncSession:
+        return AsyncSession(self)
+
+    async def close(self) -> None:
+        await asyncio.sleep(0.01)
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(neo4j_pool, "Neo4jGraph", SlowGraph)
+    monkeypatch.setattr(neo4j_pool.AsyncGraphDatabase, "driver", lambda *args, **kwargs: AsyncDriver())
+    AsyncDriver.instances = []
+    pool = Neo4jConnectionPool("bolt://localhost", "neo4j", "secret", max_connection_pool_size=2, connection_acquisition_timeout=1.0)
+    yield pool
+    pool.close()
+
+
+def test_queries_are_bounded_and_accounted(pool):
+    threads = [threading.Thread(target=pool.query, args=("RETURN 1",)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pool.graph.max_running == 2
+    stats = pool.stats()
+    assert stats["max_size"] == 2
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 2
+    assert stats["acquired"] == 6
+    assert stats["timeouts"] == 0
+    # At least four of the queries waited for a slot
+    assert stats["wait_time_max_s"] > 0.0
+    assert stats["wait_time_avg_s"] == pytest.approx(stats["wait_time_total_s"] / 6)
+
+
+def test_acquire_counts_the_slot_in_use(pool):
+    with pool.acquire():
+        assert pool.stats()["in_use"] == 1
+        assert pool.stats()["idle"] == 1
+    assert pool.stats()["in_use"] == 0
+
+
+def test_acquisition_timeout(pool):
+    pool.connection_acquisition_timeout = 0.05
+    with pool.acquire(), pool.acquire():
+        with pytest.raises(Neo4jPoolTimeoutError):
+            pool.query("RETURN 1")
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["in_use"] == 0
+
+
+def test_async_queries_are_bounded_per_event_loop(pool):
+    async def queries():
+        responses = await asyncio.gather(*(pool.aquery("RETURN 1") for _ in range(6)))
+        await pool.aclose_async_driver()
+        return responses
+
+    assert asyncio.run(queries()) == [[{"row": 1}]] * 6
+    asyncio.run(queries())
+
+    # One driver per event loop, closed before the loop ended
+    assert len(AsyncDriver.instances) == 2
+    assert all(driver.closed and driver.max_running == 2 for driver in AsyncDriver.instances)
+    assert pool.stats()["acquired"] == 12
+    assert pool.stats()["in_use"] == 0
+
+
+def test_close_waits_for_the_async_driver_of_a_running_loop(pool):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(pool.aquery("RETURN 1"), loop).result(timeout=5)
+        pool.close()
+        # The driver is closed when `close` returns, not later
+        assert AsyncDriver.instances[0].closed
+        assert pool.graph.closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_closed_pool_refuses_queries(pool):
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.query("RETURN 1")
+    with pytest.raises(RuntimeError):
+        asyncio.run(pool.aquery("RETURN 1"))
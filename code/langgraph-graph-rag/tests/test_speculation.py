@@ -0,0 +1,130 @@
+"""Speculative retrieval of the `agent` node: hits, discards and failures."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langgraph_graph_rag.nodes import GraphNodes
+from langgraph_graph_rag.speculation import SpeculationStats
+
+
+class Retrieval:
+    """A retrieval node that records whether it ran to its end or was cancelled."""
+
+    def __init__(self, key: str, seconds: float = 0.0, error: Exception | None = None) -> None:
+        self.key = key
+        self.seconds = seconds
+        self.error = error
+        self.finished = False
+        self.cancelled = False
+
+    async def __call__(self, state: dict) -> dict:
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        self.finished = True
+        return {self.key: f"{self.key} of {state['question']}"}
+
+
+def graph_nodes(graph_search: Retrieval, unstructured_retriever: Retrieval) -> GraphNodes:
+    """Graph nodes with only the speculation state, the retrieval nodes are replaced."""
+    nodes = GraphNodes.__new__(GraphNodes)
+    nodes.speculation_stats = SpeculationStats()
+    nodes.agraph_search = graph_search
+    nodes.aunstructured_retriever = unstructured_retriever
+    return nodes
+
+
+async def speculate(nodes: GraphNodes, route: str, router_seconds: float = 0.0) -> dict:
+    speculation = nodes._astart_speculation("question")
+    await asyncio.sleep(router_seconds)
+    return await nodes._afinish_speculation(speculation, route)
+
+
+def test_hit_uses_both_results():
+    nodes = graph_nodes(Retrieval("structured_data", 0.01), Retrieval("unstructured_data", 0.02))
+    update = asyncio.run(speculate(nodes, "graph_knowledge_base"))
+    assert update == {
+        "speculated": True,
+        "structured_data": "structured_data of question",
+        "unstructured_data": "unstructured_data of question",
+    }
+    stats = nodes.speculation_stats.stats()
+    assert (stats["started"], stats["hits"], stats["discarded"]) == (1, 1, 0)
+
+
+def test_discard_cancels_the_running_retrieval():
+    graph_search, retriever = Retrieval("structured_data", 0.0), Retrieval("unstructured_data", 5.0)
+    nodes = graph_nodes(graph_search, retriever)
+    assert asyncio.run(speculate(nodes, "final_answer", router_seconds=0.01)) == {}
+    assert graph_search.finished
+    assert retriever.cancelled and not retriever.finished
+    stats = nodes.speculation_stats.stats()
+    assert (stats["hits"], stats["discarded"]) == (0, 1)
+    assert stats["wasted_seconds"] > 0.0
+
+
+def test_failure_cancels_the_sibling_and_falls_back_to_the_retrieval_nodes():
+    graph_search = Retrieval("structured_data", 0.0, error=RuntimeError("Neo4j unavailable"))
+    retriever = Retrieval("unstructured_data", 5.0)
+    nodes = graph_nodes(graph_search, retriever)
+    assert asyncio.run(speculate(nodes, "graph_knowledge_base")) == {}
+    assert retriever.cancelled
+
+
+def test_router_failure_cancels_the_speculation():
+    graph_search, retriever = Retrieval("structured_data", 5.0), Retrieval("unstructured_data", 5.0)
+    nodes = graph_nodes(graph_search, retriever)
+
+    async def failed_router():
+        speculation = nodes._astart_speculation("question")
+        await asyncio.sleep(0)
+        await nodes._acancel_speculation(speculation)
+        return speculation
+
+    speculation = asyncio.run(failed_router())
+    assert all(task.cancelled() for task in speculation)
+    assert graph_search.cancelled and retriever.cancelled
+
+
+def sync_graph_nodes(seconds: float = 0.0) -> GraphNodes:
+    def retrieval(key: str):
+        def node(state: dict) -> dict:
+            time.sleep(seconds)
+            return {key: f"{key} of {state['question']}"}
+        return node
+
+    nodes = GraphNodes.__new__(GraphNodes)
+    nodes.speculation_stats = SpeculationStats()
+    nodes.graph_search = retrieval("structured_data")
+    nodes.unstructured_retriever = retrieval("unstructured_data")
+    return nodes
+
+
+def test_sync_discard_counts_the_wasted_time_when_the_retrieval_ends():
+    nodes = sync_graph_nodes(seconds=0.05)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        nodes.speculation_executor = executor
+        speculation = nodes._start_speculation("question")
+        assert nodes._finish_speculation(speculation, "final_answer") == {}
+        assert nodes.speculation_stats.stats()["wasted_seconds"] == 0.0
+    # The running threads could not be stopped, their time is counted once they ended
+    assert nodes.speculation_stats.stats()["discarded"] == 1
+    assert nodes.speculation_stats.stats()["wasted_seconds"] >= 0.1
+
+
+def test_sync_hit():
+    nodes = sync_graph_nodes()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        nodes.speculation_executor = executor
+        update = nodes._finish_speculation(nodes._start_speculation("question"), "graph_knowledge_base")
+    assert update == {
+        "speculated": True,
+        "structured_data": "structured_data of question",
+        "unstructured_data": "unstructured_data of question",
+    }
+    assert nodes.speculation_stats.stats()["hits"] == 1